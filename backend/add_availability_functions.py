@@ -60,7 +60,7 @@ def check_roll_availability(roll_id):
         for roll_ingredient in roll_ingredients:
             available, message = check_ingredient_availability(
                 roll_ingredient.ingredient_id, 
-                roll_ingredient.quantity
+                roll_ingredient.amount_per_roll
             )
             if not available:
                 ingredient = Ingredient.query.get(roll_ingredient.ingredient_id)
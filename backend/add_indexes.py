@@ -0,0 +1,67 @@
+import sqlite3
+import os
+
+from models import db
+
+def model_indexes():
+    """[(имя, таблица, [колонки])] — все индексы, объявленные в models.py"""
+    indexes = []
+    for table in db.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            indexes.append((index.name, table.name, [column.name for column in index.columns]))
+    return indexes
+
+def existing_indexes(cursor, table):
+    """{(колонки,): имя} для индексов таблицы в базе"""
+    result = {}
+    cursor.execute(f'PRAGMA index_list({table})')
+    for row in cursor.fetchall():
+        name = row[1]
+        cursor.execute(f'PRAGMA index_info({name})')
+        columns = tuple(info[2] for info in sorted(cursor.fetchall()))
+        result[columns] = name
+    return result
+
+def add_indexes():
+    """Создаёт в существующей базе индексы из models.py, которых в ней ещё нет"""
+
+    db_path = 'sushi_express.db'
+    if not os.path.exists(db_path):
+        db_path = 'instance/sushi_express.db'
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("🔧 Проверяю индексы...")
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+
+        created = 0
+        for name, table, columns in model_indexes():
+            if table not in tables:
+                print(f"⏭️  {name}: таблицы {table} нет (нужна миграция таблицы)")
+                continue
+            existing = existing_indexes(cursor, table)
+            if tuple(columns) in existing:
+                print(f"✅ {name}: уже есть ({existing[tuple(columns)]})")
+                continue
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})')
+            created += 1
+            print(f"➕ {name} на {table} ({', '.join(columns)})")
+
+        conn.commit()
+        # Статистика для планировщика запросов
+        cursor.execute('ANALYZE')
+        conn.commit()
+        print(f"\n✅ Создано индексов: {created}")
+
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    add_indexes()
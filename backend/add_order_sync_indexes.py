@@ -0,0 +1,38 @@
+import sqlite3
+import os
+
+INDEXES = [
+    ('ix_orders_created_at_id', 'orders (created_at, id)'),
+    ('ix_orders_updated_at_id', 'orders (updated_at, id)'),
+]
+
+def add_order_sync_indexes():
+    """Добавляет индексы для постраничной выдачи и синхронизации заказов"""
+
+    db_path = 'sushi_express.db'
+    if not os.path.exists(db_path):
+        db_path = 'instance/sushi_express.db'
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("🔧 Добавляю индексы заказов...")
+
+        for name, target in INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+            print(f"✅ Индекс {name} на {target}")
+
+        conn.commit()
+        cursor.execute('ANALYZE orders')
+        conn.commit()
+        print("\n✅ Индексы добавлены!")
+
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    add_order_sync_indexes()
@@ -0,0 +1,39 @@
+import sqlite3
+import os
+
+def add_stock_reservations():
+    """Создаёт таблицу stock_reservations для резерва ингредиентов под заказы"""
+
+    db_path = 'sushi_express.db'
+    if not os.path.exists(db_path):
+        db_path = 'instance/sushi_express.db'
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("🔧 Создаю таблицу stock_reservations...")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_reservations (
+                id INTEGER PRIMARY KEY,
+                order_id INTEGER NOT NULL REFERENCES orders (id),
+                ingredient_id INTEGER NOT NULL REFERENCES ingredients (id),
+                amount FLOAT NOT NULL,
+                created_at DATETIME
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_stock_reservations_order_id ON stock_reservations (order_id)')
+
+        conn.commit()
+        print("✅ Таблица stock_reservations готова")
+        print("ℹ️  Заказы, созданные раньше, склад не резервировали — при их отмене возвращать нечего")
+
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    add_stock_reservations()
@@ -0,0 +1,195 @@
+"""Статистика для админ-панели (/api/admin/stats).
+
+Заказы не загружаются в Python — всё считается агрегатами в SQLite:
+- счётчики пользователей и каталога — один SELECT со скалярными подзапросами;
+- заказы по статусам — GROUP BY status (количество и сумма);
+- выручка по дням за REVENUE_DAYS дней — GROUP BY date(created_at)
+  по индексу ix_orders_created_at_id;
+- популярность роллов — GROUP BY по позициям-роллам неотменённых заказов.
+
+Выручка и средний чек считаются по неотменённым заказам (CANCELLED_STATUSES).
+
+Снимок хранится TTL_SECONDS. create_order, update_order_status и
+cancel_order дополняют его через order_created() и status_changed(),
+поэтому между пересчётами цифры не отстают от заказов этого процесса;
+TTL ограничивает расхождение для изменений в обход хуков (другой процесс,
+скрипты, новые пользователи).
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, User, Roll, Set, Ingredient, Order, OrderItem
+from stock_reservation import ROLL_ITEM_TYPES, CANCELLED_STATUSES
+
+TTL_SECONDS = 60
+REVENUE_DAYS = 30
+TOP_ROLLS = 10
+
+
+class StatsSnapshot:
+    def __init__(self):
+        self.totals = {}  # total_users, total_rolls, ...
+        self.by_status = {}  # статус -> [заказов, сумма]
+        self.by_day = {}  # 'YYYY-MM-DD' -> [заказов, выручка], без отменённых
+        self.rolls = {}  # id ролла -> [название, продано штук]
+        self.built_at = 0.0
+
+
+def _day(created_at):
+    if isinstance(created_at, datetime):
+        return created_at.strftime('%Y-%m-%d')
+    return str(created_at)[:10]
+
+
+def _first_day(today=None):
+    today = today or datetime.utcnow().date()
+    return today - timedelta(days=REVENUE_DAYS - 1)
+
+
+def build_snapshot():
+    """Снимок статистики по текущему состоянию базы"""
+    snapshot = StatsSnapshot()
+
+    totals = db.session.query(
+        db.session.query(func.count(User.id)).scalar_subquery(),
+        db.session.query(func.count(Roll.id)).scalar_subquery(),
+        db.session.query(func.count(Set.id)).scalar_subquery(),
+        db.session.query(func.count(Ingredient.id)).scalar_subquery(),
+    ).one()
+    snapshot.totals = dict(zip(('total_users', 'total_rolls', 'total_sets', 'total_ingredients'), totals))
+
+    status_rows = db.session.query(
+        Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total_price), 0.0)
+    ).group_by(Order.status)
+    snapshot.by_status = {status: [count, revenue] for status, count, revenue in status_rows}
+
+    day = func.date(Order.created_at)
+    day_rows = db.session.query(
+        day, func.count(Order.id), func.coalesce(func.sum(Order.total_price), 0.0)
+    ).filter(
+        Order.created_at >= _first_day().isoformat(),
+        Order.status.notin_(CANCELLED_STATUSES),
+    ).group_by(day)
+    snapshot.by_day = {d: [count, revenue] for d, count, revenue in day_rows}
+
+    sold = db.session.query(
+        OrderItem.item_id.label('roll_id'), func.sum(OrderItem.quantity).label('quantity')
+    ).join(Order, Order.id == OrderItem.order_id).filter(
+        OrderItem.item_type.in_(ROLL_ITEM_TYPES),
+        Order.status.notin_(CANCELLED_STATUSES),
+    ).group_by(OrderItem.item_id).subquery()
+    roll_rows = db.session.query(Roll.id, Roll.name, func.coalesce(sold.c.quantity, 0)).outerjoin(
+        sold, sold.c.roll_id == Roll.id
+    )
+    snapshot.rolls = {roll_id: [name, quantity] for roll_id, name, quantity in roll_rows}
+
+    snapshot.built_at = time.monotonic()
+    return snapshot
+
+
+def snapshot_to_dict(snapshot):
+    totals = dict(snapshot.totals)
+    paid_orders = sum(count for status, (count, _) in snapshot.by_status.items()
+                      if status not in CANCELLED_STATUSES)
+    revenue = sum(total for status, (_, total) in snapshot.by_status.items()
+                  if status not in CANCELLED_STATUSES)
+
+    first_day = _first_day()
+    revenue_by_day = []
+    for offset in range(REVENUE_DAYS):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        count, total = snapshot.by_day.get(day, (0, 0.0))
+        revenue_by_day.append({'date': day, 'orders': count, 'revenue': round(total, 2)})
+
+    top_rolls = sorted(
+        ((roll_id, name, quantity) for roll_id, (name, quantity) in snapshot.rolls.items() if quantity > 0),
+        key=lambda row: (-row[2], row[0])
+    )[:TOP_ROLLS]
+
+    totals.update({
+        'total_orders': sum(count for count, _ in snapshot.by_status.values()),
+        'orders_by_status': {status: count for status, (count, _) in snapshot.by_status.items()},
+        'revenue_by_status': {status: round(total, 2) for status, (_, total) in snapshot.by_status.items()},
+        'total_revenue': round(revenue, 2),
+        'average_order_value': round(revenue / paid_orders, 2) if paid_orders else 0.0,
+        'revenue_by_day': revenue_by_day,
+        'top_rolls': [{'id': roll_id, 'name': name, 'quantity': quantity}
+                      for roll_id, name, quantity in top_rolls],
+    })
+    return totals
+
+
+class AdminStats:
+    def __init__(self, ttl=TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._changes = 0  # счётчик хуков: снимок, построенный во время хука, не сохраняем
+
+    def stats(self):
+        """Словарь статистики для ответа API"""
+        with self._lock:
+            snapshot = self._snapshot
+            changes = self._changes
+            if snapshot is not None and time.monotonic() - snapshot.built_at < self.ttl:
+                return snapshot_to_dict(snapshot)
+        snapshot = build_snapshot()
+        with self._lock:
+            if self._changes == changes:
+                self._snapshot = snapshot
+            return snapshot_to_dict(snapshot)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._changes += 1
+
+    def _apply(self, order, sign):
+        """Учесть (sign=1) или убрать (sign=-1) заказ в выручке по дням и роллах"""
+        snapshot = self._snapshot
+        day = _day(order.get('created_at'))
+        if day >= _first_day().isoformat():
+            row = snapshot.by_day.setdefault(day, [0, 0.0])
+            row[0] += sign
+            row[1] += sign * (order.get('total_price') or 0)
+        for item in order.get('items', []):
+            if item.get('item_type') in ROLL_ITEM_TYPES:
+                roll = snapshot.rolls.setdefault(item.get('item_id'), [item.get('item_name'), 0])
+                roll[1] += sign * (item.get('quantity') or 0)
+
+    def _move(self, status, order, sign):
+        row = self._snapshot.by_status.setdefault(status, [0, 0.0])
+        row[0] += sign
+        row[1] += sign * (order.get('total_price') or 0)
+        if row[0] <= 0:
+            del self._snapshot.by_status[status]
+
+    def order_created(self, order):
+        """Хук после commit нового заказа (словарь order_to_dict)"""
+        with self._lock:
+            self._changes += 1
+            if self._snapshot is None:
+                return
+            self._move(order.get('status'), order, 1)
+            if order.get('status') not in CANCELLED_STATUSES:
+                self._apply(order, 1)
+
+    def status_changed(self, order, old_status):
+        """Хук после commit смены статуса; order — уже с новым статусом"""
+        new_status = order.get('status')
+        with self._lock:
+            self._changes += 1
+            if self._snapshot is None or old_status == new_status:
+                return
+            self._move(old_status, order, -1)
+            self._move(new_status, order, 1)
+            was_cancelled = old_status in CANCELLED_STATUSES
+            is_cancelled = new_status in CANCELLED_STATUSES
+            if was_cancelled != is_cancelled:
+                self._apply(order, -1 if is_cancelled else 1)
+
+
+admin_stats = AdminStats()
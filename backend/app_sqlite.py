@@ -1,30 +1,59 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from flask_cors import CORS
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 import json
 from datetime import datetime, timedelta
+import sqlite_profile
 
 # Создаем Flask приложение
 app = Flask(__name__)
 
 # Конфигурация для SQLite
 app.config['SECRET_KEY'] = 'your-super-secret-key-change-this-in-production'
-db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sushi_express.db')
+db_path = os.environ.get('SUSHI_DB_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sushi_express.db')
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_profile.engine_options()
 
 # Инициализация расширений
-from models import db, User, Ingredient, Roll, RollIngredient, Set, SetRoll, Order, OrderItem, OtherItem, LoyaltyCard, LoyaltyRoll, LoyaltyCardUsage, ReferralUsage
+from models import db, User, CartItem, FavoriteItem, Ingredient, Roll, RollIngredient, Set, SetRoll, Order, OrderItem, OtherItem, LoyaltyCard, LoyaltyRoll, LoyaltyCardUsage, ReferralUsage
+from catalog_loader import load_rolls, load_sets, ids_by_type, orders_query, orders_to_dicts, order_to_dict
+from order_sync import page_orders
+from order_events import order_events
+from catalog_cache import catalog_cache
+from availability import availability
+from pricing import PricingError, resolve_cart
+from stock_reservation import (InsufficientStock, CANCELLED_STATUSES, PRE_PRODUCTION_STATUSES, ingredient_requirements,
+                               reserve, cancel_reservation, reserve_order)
+from admin_stats import admin_stats
+from cost_recalc import CostChanges, recalculate_costs
+from loyalty_redemption import RedemptionError, redeemable_cards, redeem, refund
+from request_metrics import request_metrics
 db.init_app(app)
+with app.app_context():
+    sqlite_profile.install(db.engine)
+    request_metrics.install(app, db.engine)
 
 jwt = JWTManager()
 jwt.init_app(app)
 
+def metrics_admin():
+    """/metrics без токена сборщика — только администратору"""
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        return False
+    user = User.query.get(get_jwt_identity())
+    return bool(user and user.is_admin)
+
+request_metrics.authorize = metrics_admin
+
 CORS(app)
 
 # Маршруты API
@@ -111,56 +140,64 @@ def login():
 @app.route('/api/rolls', methods=['GET'])
 def get_rolls():
     try:
-        rolls = Roll.query.all()
-        rolls_data = []
-        
-        for roll in rolls:
-            roll_data = {
-                'id': roll.id,
-                'name': roll.name,
-                'description': roll.description,
-                'price': roll.sale_price,  # Добавляем поле price
-                'sale_price': roll.sale_price,
-                'image_url': roll.image_url,
-                'category': 'roll',
-                'is_available': True
-            }
-            rolls_data.append(roll_data)
-        
-        return jsonify({
-            'rolls': rolls_data,
-            'total': len(rolls_data)
-        }), 200
+        return catalog_cache.response('rolls', _rolls_payload)
         
     except Exception as e:
         return jsonify({'error': f'Ошибка получения роллов: {str(e)}'}), 500
 
+def _rolls_payload():
+    rolls = Roll.query.all()
+    rolls_data = []
+    portions = availability.roll_portions()
+    
+    for roll in rolls:
+        roll_data = {
+            'id': roll.id,
+            'name': roll.name,
+            'description': roll.description,
+            'price': roll.sale_price,  # Добавляем поле price
+            'sale_price': roll.sale_price,
+            'image_url': roll.image_url,
+            'category': 'roll',
+            'is_available': portions.get(roll.id, 1) > 0
+        }
+        rolls_data.append(roll_data)
+    
+    return {
+        'rolls': rolls_data,
+        'total': len(rolls_data)
+    }
+
 @app.route('/api/sets', methods=['GET'])
 def get_sets():
     try:
-        sets = Set.query.all()
-        sets_data = []
-        
-        for set_item in sets:
-            set_data = {
-                'id': set_item.id,
-                'name': set_item.name,
-                'description': set_item.description,
-                'price': set_item.set_price,  # Добавляем поле price
-                'set_price': set_item.set_price,
-                'image_url': set_item.image_url,
-                'is_available': True
-            }
-            sets_data.append(set_data)
-        
-        return jsonify({
-            'sets': sets_data,
-            'total': len(sets_data)
-        }), 200
+        return catalog_cache.response('sets', _sets_payload)
         
     except Exception as e:
         return jsonify({'error': f'Ошибка получения сетов: {str(e)}'}), 500
 
+def _sets_payload():
+    sets = Set.query.all()
+    sets_data = []
+    portions = availability.set_portions()
+    
+    for set_item in sets:
+        set_data = {
+            'id': set_item.id,
+            'name': set_item.name,
+            'description': set_item.description,
+            'price': set_item.set_price,  # Добавляем поле price
+            'set_price': set_item.set_price,
+            'image_url': set_item.image_url,
+            'is_available': portions.get(set_item.id, 1) > 0
+        }
+        sets_data.append(set_data)
+    
+    return {
+        'sets': sets_data,
+        'total': len(sets_data)
+    }
+
 @app.route('/api/orders', methods=['POST'])
 @jwt_required()
 def create_order():
@@ -174,7 +211,7 @@ def create_order():
         data = request.get_json()
         
         # Получаем данные из корзины пользователя или из запроса
-        cart = json.loads(user.cart) if user.cart else []
+        cart = [cart_item.to_dict() for cart_item in CartItem.query.filter_by(user_id=user.id).all()]
         
         # Если корзина пуста, проверяем, есть ли данные в запросе
         if not cart and not data.get('items'):
@@ -190,54 +227,14 @@ def create_order():
         payment_method = data.get('payment_method', 'cash')
         comment = data.get('comment', '')
         
-        # Вычисляем общую стоимость
-        total_price = 0
-        has_paid_items = False
-        
-        # Если есть данные в запросе, используем их для расчета
-        if data.get('items'):
-            for item in data.get('items', []):
-                item_type = item.get('item_type', 'roll')
-                quantity = item.get('quantity', 1)
-                unit_price = item.get('price', 0)
-                
-                if unit_price > 0:
-                    has_paid_items = True
-                total_price += unit_price * quantity
-        else:
-            # Иначе используем корзину пользователя
-            for cart_item in cart:
-                item_type = cart_item['item_type']
-                item_id = cart_item['item_id']
-                quantity = cart_item['quantity']
-                
-                unit_price = 0
-                if item_type == 'roll':
-                    roll = Roll.query.get(item_id)
-                    if roll:
-                        unit_price = roll.sale_price
-                        has_paid_items = True
-                elif item_type == 'set':
-                    set_item = Set.query.get(item_id)
-                    if set_item:
-                        unit_price = set_item.set_price
-                        has_paid_items = True
-                elif item_type == 'loyalty_roll':
-                    unit_price = 0.0
-                elif item_type == 'bonus_points':
-                    unit_price = cart_item.get('price', 0)
-                
-                total_price += unit_price * quantity
+        # Стоимость считается только по ценам каталога
+        priced = resolve_cart(cart, user.bonus_points or 0, len(redeemable_cards(user.id)))
         
         # Если нет платных товаров, не позволяем оформить заказ
-        if not has_paid_items:
+        if not priced.has_paid_items:
             return jsonify({'error': 'В заказе нет платных товаров'}), 400
         
-        # Используем переданную сумму если она больше 0
-        if data.get('total_amount', 0) > 0:
-            total_price = data.get('total_amount', 0)
-        elif data.get('total_price', 0) > 0:
-            total_price = data.get('total_price', 0)
+        total_price = priced.total
         
         # Валидация отрицательных сумм
         if total_price < 0:
@@ -260,53 +257,47 @@ def create_order():
         db.session.flush()
         
         # Добавляем элементы заказа
-        items_to_process = data.get('items', []) if data.get('items') else cart
-        
-        for item in items_to_process:
-            item_type = item['item_type']
-            item_id = item['item_id']
-            quantity = item['quantity']
-            
-            unit_price = 0
-            if data.get('items'):
-                unit_price = item.get('price', 0)
-            else:
-                if item_type == 'roll':
-                    roll = Roll.query.get(item_id)
-                    if roll:
-                        unit_price = roll.sale_price
-                elif item_type == 'set':
-                    set_item = Set.query.get(item_id)
-                    if set_item:
-                        unit_price = set_item.set_price
-                elif item_type == 'loyalty_roll':
-                    unit_price = 0.0
-                elif item_type == 'bonus_points':
-                    continue
-            
-            total_item_price = unit_price * quantity
-            
+        for line in priced.lines:
             order_item = OrderItem(
                 order_id=order.id,
-                item_type=item_type,
-                item_id=item_id,
-                quantity=quantity,
-                unit_price=unit_price,
-                total_price=total_item_price
+                item_type=line.item_type,
+                item_id=line.item_id,
+                quantity=line.quantity,
+                unit_price=line.unit_price,
+                total_price=line.total_price
             )
             db.session.add(order_item)
         
+        # Списываем баллы, карты и ингредиенты со склада в той же транзакции
+        redeem(order, priced.discount)
+        reserve(order.id, ingredient_requirements(
+            (line.item_type, line.item_id, line.quantity) for line in priced.lines
+        ))
+        
         # Очищаем корзину после создания заказа
-        user.cart = '[]'
+        CartItem.query.filter_by(user_id=user.id).delete()
         
         db.session.commit()
         
+        order_data = order_to_dict(order)
+        order_events.publish('order_created', order_data)
+        admin_stats.order_created(order_data)
+        
         return jsonify({
             'success': True,
             'message': 'Заказ успешно создан',
-            'order': order.to_dict()
+            'order': order_data
         }), 201
         
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'ingredient_id': e.ingredient_id}), 409
+    except RedemptionError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except PricingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Ошибка создания заказа: {str(e)}'}), 500
@@ -316,14 +307,17 @@ def create_order():
 def get_user_orders():
     try:
         user_id = get_jwt_identity()
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
+        orders, paging = page_orders(orders_query().filter_by(user_id=user_id), request.args)
         
         return jsonify({
             'success': True,
-            'orders': [order.to_dict() for order in orders],
-            'total': len(orders)
+            'orders': orders_to_dicts(orders),
+            'total': len(orders),
+            **paging
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Ошибка при получении заказов: {str(e)}'}), 500
 
@@ -337,14 +331,17 @@ def get_all_orders():
         if not user or not user.is_admin:
             return jsonify({'error': 'Доступ запрещен'}), 403
         
-        orders = Order.query.order_by(Order.created_at.desc()).all()
+        orders, paging = page_orders(orders_query(), request.args)
         
         return jsonify({
             'success': True,
-            'orders': [order.to_dict() for order in orders],
-            'total': len(orders)
+            'orders': orders_to_dicts(orders),
+            'total': len(orders),
+            **paging
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Ошибка при получении всех заказов: {str(e)}'}), 500
 
@@ -362,7 +359,12 @@ def get_cart():
         if not user:
             return jsonify({'error': 'Пользователь не найден'}), 404
         
-        cart = json.loads(user.cart) if user.cart else []
+        cart = [cart_item.to_dict() for cart_item in CartItem.query.filter_by(user_id=user.id).order_by(CartItem.id).all()]
+        
+        # Все товары корзины загружаются одним запросом на тип
+        ids = ids_by_type(cart)
+        rolls = load_rolls(ids.get('roll', ()), with_ingredients=True)
+        sets = load_sets(ids.get('set', ()), with_rolls=True)
         
         # Добавляем цены к товарам в корзине
         cart_with_prices = []
@@ -370,63 +372,56 @@ def get_cart():
             item_type = item.get('item_type')
             item_id = item.get('item_id')
             quantity = item.get('quantity', 1)
+            try:
+                key = int(item_id)
+            except (TypeError, ValueError):
+                continue
             
-            # Получаем цену товара
-            price = 0
-            name = 'Неизвестный товар'
-            image_url = ''
-            
+            # Создаем объект товара для поля item
             if item_type == 'roll':
-                roll = Roll.query.get(item_id)
-                if roll:
-                    price = roll.sale_price
-                    name = roll.name
-                    image_url = roll.image_url or ''
-                else:
+                roll = rolls.get(key)
+                if not roll:
                     # Если ролл не найден, пропускаем этот товар
                     continue
+                price = roll.sale_price
+                name = roll.name
+                image_url = roll.image_url or ''
+                item_data = {
+                    'id': roll.id,
+                    'name': roll.name,
+                    'description': roll.description,
+                    'sale_price': roll.sale_price,
+                    'image_url': roll.image_url or '',
+                    'is_popular': roll.is_popular,
+                    'is_new': roll.is_new,
+                    'ingredients': [ri.to_dict() for ri in roll.ingredients]
+                }
             elif item_type == 'set':
-                set_item = Set.query.get(item_id)
-                if set_item:
-                    price = set_item.set_price
-                    name = set_item.name
-                    image_url = set_item.image_url or ''
-                else:
+                set_item = sets.get(key)
+                if not set_item:
                     # Если сет не найден, пропускаем этот товар
                     continue
+                price = set_item.set_price
+                name = set_item.name
+                image_url = set_item.image_url or ''
+                item_data = {
+                    'id': set_item.id,
+                    'name': set_item.name,
+                    'description': set_item.description,
+                    'set_price': set_item.set_price,
+                    'image_url': set_item.image_url or '',
+                    'is_popular': set_item.is_popular,
+                    'is_new': set_item.is_new,
+                    'composition': [{
+                        'roll_id': sr.roll_id,
+                        'roll_name': sr.roll.name if sr.roll else None,
+                        'quantity': sr.quantity
+                    } for sr in set_item.rolls]
+                }
             else:
                 # Для других типов товаров пропускаем
                 continue
             
-            # Создаем объект товара для поля item
-            item_data = {}
-            if item_type == 'roll':
-                roll = Roll.query.get(item_id)
-                if roll:
-                    item_data = {
-                        'id': roll.id,
-                        'name': roll.name,
-                        'description': roll.description,
-                        'sale_price': roll.sale_price,
-                        'image_url': roll.image_url or '',
-                        'is_popular': roll.is_popular,
-                        'is_new': roll.is_new,
-                        'ingredients': [ri.to_dict() for ri in roll.ingredients]
-                    }
-            elif item_type == 'set':
-                set_item = Set.query.get(item_id)
-                if set_item:
-                    item_data = {
-                        'id': set_item.id,
-                        'name': set_item.name,
-                        'description': set_item.description,
-                        'set_price': set_item.set_price,
-                        'image_url': set_item.image_url or '',
-                        'is_popular': set_item.is_popular,
-                        'is_new': set_item.is_new,
-                        'composition': set_item.composition
-                    }
-            
             # Создаем объект с ценой
             cart_item = {
                 'id': item_id,
@@ -465,30 +460,22 @@ def add_to_cart():
         item_id = data.get('item_id')
         quantity = data.get('quantity', 1)
         
-        # Получаем текущую корзину
-        cart = json.loads(user.cart) if user.cart else []
-        
-        # Проверяем, есть ли уже такой товар в корзине
-        existing_item_index = None
-        for i, cart_item in enumerate(cart):
-            if cart_item['item_type'] == item_type and cart_item['item_id'] == item_id:
-                existing_item_index = i
-                break
-        
-        if existing_item_index is not None:
-            # Обновляем количество существующего товара
-            cart[existing_item_index]['quantity'] += quantity
-        else:
-            # Добавляем новый товар в корзину
-            cart_item = {
-                'item_type': item_type,
-                'item_id': item_id,
-                'quantity': quantity
-            }
-            cart.append(cart_item)
+        if not item_type or not isinstance(item_id, int) or not isinstance(quantity, int):
+            return jsonify({'error': 'Неверные данные товара'}), 400
         
-        # Сохраняем обновленную корзину
-        user.cart = json.dumps(cart)
+        # Одна строка на товар: новый добавляется, у существующего растёт количество
+        stmt = sqlite_insert(CartItem).values(
+            user_id=user.id,
+            item_type=item_type,
+            item_id=item_id,
+            quantity=quantity,
+            added_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'item_type', 'item_id'],
+            set_={'quantity': CartItem.quantity + stmt.excluded.quantity}
+        )
+        db.session.execute(stmt)
         db.session.commit()
         
         return jsonify({'success': True}), 200
@@ -506,12 +493,8 @@ def remove_from_cart(item_id):
         if not user:
             return jsonify({'error': 'Пользователь не найден'}), 404
         
-        cart = json.loads(user.cart) if user.cart else []
-        
         # Удаляем товар из корзины
-        cart = [item for item in cart if item['item_id'] != item_id]
-        
-        user.cart = json.dumps(cart)
+        CartItem.query.filter_by(user_id=user.id, item_id=item_id).delete()
         db.session.commit()
         
         return jsonify({'success': True}), 200
@@ -529,7 +512,7 @@ def clear_cart():
         if not user:
             return jsonify({'error': 'Пользователь не найден'}), 404
         
-        user.cart = '[]'
+        CartItem.query.filter_by(user_id=user.id).delete()
         db.session.commit()
         
         return jsonify({'success': True}), 200
@@ -549,9 +532,10 @@ def get_favorites():
         if not user:
             return jsonify({'error': 'Пользователь не найден'}), 404
         
-        favorites = json.loads(user.favorites) if user.favorites and user.favorites.strip() and user.favorites != 'null' and user.favorites != 'None' else []
+        favorites = [fav.to_dict() for fav in FavoriteItem.query.filter_by(user_id=user.id).order_by(FavoriteItem.id).all()]
         
         return jsonify({
+            'success': True,
             'favorites': favorites,
             'total_items': len(favorites)
         }), 200
@@ -573,47 +557,18 @@ def add_to_favorites():
         item_type = data.get('item_type')
         item_id = data.get('item_id')
         
-        # Получаем избранное и приводим к правильному формату
-        if user.favorites and user.favorites.strip() and user.favorites != 'null' and user.favorites != 'None':
-            try:
-                favorites_data = json.loads(user.favorites)
-                # Если это словарь с ключами 'roll', 'set' и т.д.
-                if isinstance(favorites_data, dict):
-                    favorites = []
-                    for item_type_key, item_ids in favorites_data.items():
-                        if isinstance(item_ids, list):
-                            for item_id_val in item_ids:
-                                favorites.append({
-                                    'item_type': item_type_key,
-                                    'item_id': item_id_val
-                                })
-                # Если это уже список
-                elif isinstance(favorites_data, list):
-                    favorites = favorites_data
-                else:
-                    favorites = []
-            except:
-                favorites = []
-        else:
-            favorites = []
-        
-        # Проверяем, есть ли уже такой товар в избранном
-        if not any(fav['item_type'] == item_type and fav['item_id'] == item_id for fav in favorites):
-            favorites.append({
-                'item_type': item_type,
-                'item_id': item_id
-            })
-            
-            # Сохраняем в формате словаря для совместимости
-            favorites_dict = {}
-            for fav in favorites:
-                if fav['item_type'] not in favorites_dict:
-                    favorites_dict[fav['item_type']] = []
-                if fav['item_id'] not in favorites_dict[fav['item_type']]:
-                    favorites_dict[fav['item_type']].append(fav['item_id'])
-            
-            user.favorites = json.dumps(favorites_dict)
-            db.session.commit()
+        if not item_type or not isinstance(item_id, int):
+            return jsonify({'error': 'Неверные данные товара'}), 400
+        
+        # Повторное добавление того же товара ничего не меняет
+        stmt = sqlite_insert(FavoriteItem).values(
+            user_id=user.id,
+            item_type=item_type,
+            item_id=item_id,
+            added_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=['user_id', 'item_type', 'item_id'])
+        db.session.execute(stmt)
+        db.session.commit()
         
         return jsonify({'success': True}), 200
         
@@ -630,12 +585,8 @@ def remove_from_favorites(item_id):
         if not user:
             return jsonify({'error': 'Пользователь не найден'}), 404
         
-        favorites = json.loads(user.favorites) if user.favorites and user.favorites.strip() and user.favorites != 'null' and user.favorites != 'None' else []
-        
         # Удаляем товар из избранного
-        favorites = [fav for fav in favorites if fav['item_id'] != item_id]
-        
-        user.favorites = json.dumps(favorites)
+        FavoriteItem.query.filter_by(user_id=user.id, item_id=item_id).delete()
         db.session.commit()
         
         return jsonify({'success': True}), 200
@@ -665,20 +616,86 @@ def update_order_status(order_id):
         if not new_status:
             return jsonify({'error': 'Статус обязателен'}), 400
         
+        # Отмена закрывает резерв склада, возврат из отмены резервирует заново
+        old_status = order.status
+        was_cancelled = old_status in CANCELLED_STATUSES
+        if new_status in CANCELLED_STATUSES and not was_cancelled:
+            cancel_reservation(order.id, old_status)
+            refund(order)
+        elif was_cancelled and new_status not in CANCELLED_STATUSES:
+            redeem(order)
+            reserve_order(order)
+        
         # Обновляем статус
         order.status = new_status
         order.updated_at = datetime.utcnow()
         db.session.commit()
         
+        order_data = order_to_dict(order)
+        order_events.publish('order_status', order_data)
+        admin_stats.status_changed(order_data, old_status)
+        
         return jsonify({
             'success': True,
             'message': f'Статус заказа обновлен на {new_status}',
-            'order': order.to_dict()
+            'order': order_data
         }), 200
         
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'ingredient_id': e.ingredient_id}), 409
+    except RedemptionError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Ошибка при обновлении статуса заказа: {str(e)}'}), 500
 
+@app.route('/api/orders/<int:order_id>/cancel', methods=['PUT'])
+@jwt_required()
+def cancel_order(order_id):
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Пользователь не найден'}), 404
+        
+        order = Order.query.get(order_id)
+        if not order:
+            return jsonify({'error': 'Заказ не найден'}), 404
+        
+        if not user.is_admin and order.user_id != user.id:
+            return jsonify({'error': 'Доступ запрещен'}), 403
+        
+        if order.status in CANCELLED_STATUSES:
+            return jsonify({'error': 'Заказ уже отменен'}), 400
+        
+        # Клиент может отменить заказ только до начала приготовления
+        if not user.is_admin and order.status not in PRE_PRODUCTION_STATUSES:
+            return jsonify({'error': f'Заказ в статусе «{order.status}» уже нельзя отменить'}), 409
+        
+        old_status = order.status
+        cancel_reservation(order.id, old_status)
+        refund(order)
+        order.status = 'Отменен'
+        order.updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        order_data = order_to_dict(order)
+        order_events.publish('order_status', order_data)
+        admin_stats.status_changed(order_data, old_status)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Заказ отменен',
+            'order': order_data
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка отмены заказа: {str(e)}'}), 500
+
 @app.route('/api/orders/<int:order_id>', methods=['GET'])
 @jwt_required()
 def get_order(order_id):
@@ -699,12 +716,76 @@ def get_order(order_id):
         
         return jsonify({
             'success': True,
-            'order': order.to_dict()
+            'order': order_to_dict(order)
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Ошибка при получении заказа: {str(e)}'}), 500
 
+def _order_events_filter(user):
+    """Админ видит все заказы, пользователь — только свои"""
+    if user.is_admin:
+        return None
+    return lambda event: event['user_id'] == user.id
+
+def _order_events_since():
+    """Номер последнего полученного события: ?since= или Last-Event-ID (переподключение SSE)"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', type=int)
+    return order_events.version if since is None else since
+
+@app.route('/api/orders/events', methods=['GET'])
+@jwt_required()
+def get_order_events():
+    """Long-poll: ответ сразу, если есть события новее since, иначе ждём до timeout секунд"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Пользователь не найден'}), 404
+        
+        user_filter = _order_events_filter(user)
+        since = _order_events_since()
+        timeout = min(max(request.args.get('timeout', 25, type=float), 0), 60)
+        # Соединение с БД не держим, пока ждём событий
+        db.session.remove()
+        
+        events, reset, version = order_events.wait(since, timeout, user_filter)
+        
+        return jsonify({
+            'success': True,
+            'version': version,
+            'reset': reset,
+            'events': events
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении событий заказов: {str(e)}'}), 500
+
+@app.route('/api/orders/stream', methods=['GET'])
+@jwt_required()
+def stream_order_events():
+    """Server-Sent Events: одно соединение вместо периодического опроса"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Пользователь не найден'}), 404
+        
+        user_filter = _order_events_filter(user)
+        since = _order_events_since()
+        db.session.remove()
+        
+        return Response(stream_with_context(order_events.stream(since, user_filter)),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при подключении к событиям заказов: {str(e)}'}), 500
+
 
 # ===== ДОПОЛНИТЕЛЬНЫЕ ЭНДПОИНТЫ =====
 
@@ -723,7 +804,7 @@ def get_roll_details(roll_id):
             'sale_price': roll.sale_price,
             'image_url': roll.image_url,
             'category': 'roll',
-            'is_available': True,
+            'is_available': availability.roll_available(roll.id),
             'ingredients': [ing.to_dict() for ing in roll.ingredients]
         }
         
@@ -749,7 +830,7 @@ def get_set_details(set_id):
             'price': set_item.set_price,
             'set_price': set_item.set_price,
             'image_url': set_item.image_url,
-            'is_available': True,
+            'is_available': availability.set_available(set_item.id),
             'rolls': [sr.to_dict() for sr in set_item.rolls]
         }
         
@@ -784,6 +865,90 @@ def get_admin_ingredients():
     except Exception as e:
         return jsonify({'error': f'Ошибка получения ингредиентов: {str(e)}'}), 500
 
+INGREDIENT_NUMBER_FIELDS = ('cost_per_unit', 'price_per_unit', 'stock_quantity')
+
+@app.route('/api/admin/ingredients/<int:ingredient_id>', methods=['PUT'])
+@jwt_required()
+def update_admin_ingredient(ingredient_id):
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_admin:
+            return jsonify({'error': 'Доступ запрещен'}), 403
+        
+        ingredient = Ingredient.query.get(ingredient_id)
+        if not ingredient:
+            return jsonify({'error': 'Ингредиент не найден'}), 404
+        
+        data = request.get_json() or {}
+        values = {}
+        for field in INGREDIENT_NUMBER_FIELDS:
+            if field in data:
+                try:
+                    values[field] = float(data[field])
+                except (TypeError, ValueError):
+                    return jsonify({'error': f'Неверное значение {field}'}), 400
+                if values[field] < 0:
+                    return jsonify({'error': f'{field} не может быть отрицательным'}), 400
+        for field in ('name', 'unit'):
+            if field in data:
+                if not str(data[field] or '').strip():
+                    return jsonify({'error': f'Поле {field} обязательно'}), 400
+                values[field] = str(data[field]).strip()
+        
+        previous_cost = ingredient.cost_per_unit
+        cost_changed = 'cost_per_unit' in values and values['cost_per_unit'] != previous_cost
+        for field, value in values.items():
+            setattr(ingredient, field, value)
+        
+        # Себестоимость роллов и сетов с этим ингредиентом — в той же транзакции.
+        # Заданная вручную (не совпадающая с рецептом) не перезаписывается
+        changes = recalculate_costs([ingredient.id], {ingredient.id: previous_cost or 0.0}) if cost_changed else None
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'ingredient': ingredient.to_dict(),
+            'recalculated': (changes or CostChanges()).to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка обновления ингредиента: {str(e)}'}), 500
+
+@app.route('/api/admin/costs/recalculate', methods=['POST'])
+@jwt_required()
+def recalculate_admin_costs():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_admin:
+            return jsonify({'error': 'Доступ запрещен'}), 403
+        
+        # Без ingredient_ids — полный пересчёт (например, после загрузки каталога).
+        # Перезаписывает и заданную вручную себестоимость — только после сверки рецептов
+        data = request.get_json(silent=True) or {}
+        ingredient_ids = data.get('ingredient_ids')
+        if ingredient_ids is not None:
+            try:
+                ingredient_ids = [int(ingredient_id) for ingredient_id in ingredient_ids]
+            except (TypeError, ValueError):
+                return jsonify({'error': 'ingredient_ids должен быть списком id'}), 400
+        
+        changes = recalculate_costs(ingredient_ids)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'recalculated': changes.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка пересчёта себестоимости: {str(e)}'}), 500
+
 @app.route('/api/admin/users', methods=['GET'])
 @jwt_required()
 def get_admin_users():
@@ -815,29 +980,10 @@ def get_admin_stats():
         if not user or not user.is_admin:
             return jsonify({'error': 'Доступ запрещен'}), 403
         
-        # Получаем статистику
-        total_users = User.query.count()
-        total_orders = Order.query.count()
-        total_rolls = Roll.query.count()
-        total_sets = Set.query.count()
-        total_ingredients = Ingredient.query.count()
-        
-        # Статистика по заказам
-        orders_by_status = {}
-        for order in Order.query.all():
-            status = order.status
-            orders_by_status[status] = orders_by_status.get(status, 0) + 1
-        
+        # Агрегаты по заказам и каталогу (см. admin_stats.py)
         return jsonify({
             'success': True,
-            'stats': {
-                'total_users': total_users,
-                'total_orders': total_orders,
-                'total_rolls': total_rolls,
-                'total_sets': total_sets,
-                'total_ingredients': total_ingredients,
-                'orders_by_status': orders_by_status
-            }
+            'stats': admin_stats.stats()
         }), 200
         
     except Exception as e:
@@ -874,17 +1020,19 @@ def get_roll_recipe(roll_id):
 @app.route('/api/other-items', methods=['GET'])
 def get_other_items():
     try:
-        other_items = OtherItem.query.all()
-        
-        return jsonify({
-            'success': True,
-            'other_items': [item.to_dict() for item in other_items],
-            'total': len(other_items)
-        }), 200
+        return catalog_cache.response('other_items', _other_items_payload)
         
     except Exception as e:
         return jsonify({'error': f'Ошибка получения дополнительных товаров: {str(e)}'}), 500
 
+def _other_items_payload():
+    other_items = OtherItem.query.all()
+    return {
+        'success': True,
+        'other_items': [item.to_dict() for item in other_items],
+        'total': len(other_items)
+    }
+
 
 # ===== ЭНДПОИНТЫ ДЛЯ НАКОПИТЕЛЬНЫХ КАРТ =====
 
@@ -1053,6 +1201,7 @@ def get_referral_history():
 if __name__ == '__main__':
     with app.app_context():
         print('✅ База данных SQLite подключена!')
+        sqlite_profile.self_check(db.engine)
         print(f'📁 Файл: sushi_express.db')
         print('📊 Доступные таблицы:')
         print('   - users')
@@ -0,0 +1,86 @@
+"""Наличие роллов и сетов по остаткам ингредиентов.
+
+Для каждого ролла и сета считается, сколько порций можно приготовить из
+текущих остатков: минимум по ингредиентам stock_quantity / расход на порцию.
+Для сета расход ингредиента суммируется по всем роллам состава с учётом
+количества, так что общий ингредиент нескольких роллов учитывается один раз.
+
+Весь расчёт — два агрегирующих запроса (роллы и сеты). Результат хранится
+до изменения каталога или остатков: в этом процессе (catalog_cache.state)
+или в другом (db_fingerprint ингредиентов и составов), но не дольше
+MAX_AGE_SECONDS — на случай записи в обход updated_at. 1e-9 в запросах
+гасит ошибку округления вроде 0.3 / 0.1 = 2.9999999999999996.
+"""
+import threading
+import time
+
+from sqlalchemy import text
+
+from models import db, Ingredient, RollIngredient, SetRoll
+from catalog_cache import catalog_cache, db_fingerprint, MAX_AGE_SECONDS
+
+ROLL_PORTIONS_SQL = text('''
+    SELECT ri.roll_id,
+           MIN(CAST(COALESCE(i.stock_quantity, 0) / ri.amount_per_roll + 1e-9 AS INTEGER))
+    FROM roll_ingredients ri
+    LEFT JOIN ingredients i ON i.id = ri.ingredient_id
+    WHERE ri.amount_per_roll > 0
+    GROUP BY ri.roll_id
+''')
+
+SET_PORTIONS_SQL = text('''
+    SELECT demand.set_id,
+           MIN(CAST(COALESCE(i.stock_quantity, 0) / demand.amount + 1e-9 AS INTEGER))
+    FROM (
+        SELECT sr.set_id, ri.ingredient_id,
+               SUM(COALESCE(sr.quantity, 1) * ri.amount_per_roll) AS amount
+        FROM set_rolls sr
+        JOIN roll_ingredients ri ON ri.roll_id = sr.roll_id
+        WHERE ri.amount_per_roll > 0
+        GROUP BY sr.set_id, ri.ingredient_id
+    ) demand
+    LEFT JOIN ingredients i ON i.id = demand.ingredient_id
+    GROUP BY demand.set_id
+''')
+
+
+class AvailabilityEngine:
+    def __init__(self, cache, max_age=MAX_AGE_SECONDS):
+        self.cache = cache
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0
+        self._rolls = {}
+        self._sets = {}
+
+    def _load(self):
+        version = (self.cache.state, db_fingerprint(Ingredient, RollIngredient, SetRoll))
+        with self._lock:
+            if self._version == version and time.monotonic() - self._built_at < self.max_age:
+                return self._rolls, self._sets
+        built_at = time.monotonic()
+        rolls = {roll_id: max(portions, 0) for roll_id, portions in db.session.execute(ROLL_PORTIONS_SQL)}
+        sets = {set_id: max(portions, 0) for set_id, portions in db.session.execute(SET_PORTIONS_SQL)}
+        with self._lock:
+            # Остатки могли измениться во время расчёта — тогда пересчитаем в следующий раз
+            if self.cache.state == version[0]:
+                self._version, self._built_at, self._rolls, self._sets = version, built_at, rolls, sets
+        return rolls, sets
+
+    def roll_portions(self):
+        """{roll_id: порций}; роллов без рецепта в словаре нет — их количество не ограничено"""
+        return self._load()[0]
+
+    def set_portions(self):
+        """{set_id: порций}; сетов без роллов с рецептами в словаре нет"""
+        return self._load()[1]
+
+    def roll_available(self, roll_id):
+        return self.roll_portions().get(roll_id, 1) > 0
+
+    def set_available(self, set_id):
+        return self.set_portions().get(set_id, 1) > 0
+
+
+availability = AvailabilityEngine(catalog_cache)
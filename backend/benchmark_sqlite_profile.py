@@ -0,0 +1,142 @@
+"""Сравнение пропускной способности API с профилем SQLite и без него.
+
+Для каждого режима берётся отдельная копия sushi_express.db, приложение
+запускается в отдельном процессе (SUSHI_SQLITE_PROFILE=off|on,
+SUSHI_DB_PATH=копия), и несколько потоков одновременно читают заказы и
+меняют их статусы через Flask test client. Рабочая база не меняется.
+
+    python benchmark_sqlite_profile.py [--threads 8] [--seconds 10] [--writes 0.3]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_worker(threads, seconds, writes):
+    """Нагрузка внутри одного процесса; результат — JSON в stdout"""
+    sys.path.insert(0, HERE)
+    import app_sqlite
+    from flask_jwt_extended import create_access_token
+    from models import User, Order
+
+    with app_sqlite.app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+        order_ids = [order_id for (order_id,) in app_sqlite.db.session.query(Order.id).limit(200)]
+        user_ids = [user_id for (user_id,) in app_sqlite.db.session.query(Order.user_id).distinct().limit(20)]
+        admin_token = create_access_token(identity=str(admin.id))
+        user_tokens = [create_access_token(identity=str(user_id)) for user_id in user_ids]
+
+    stop = time.monotonic() + seconds
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        client = app_sqlite.app.test_client()
+        local_latencies, local_errors = [], []
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            if rnd.random() < writes:
+                response = client.put(f'/api/orders/{rnd.choice(order_ids)}/status',
+                                      json={'status': rnd.choice(['Принят', 'Готовится', 'Готов'])},
+                                      headers={'Authorization': f'Bearer {admin_token}'})
+            else:
+                response = client.get('/api/orders',
+                                      headers={'Authorization': f'Bearer {rnd.choice(user_tokens)}'})
+            local_latencies.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                local_errors.append((response.get_json() or {}).get('error', '')[:80])
+        with lock:
+            latencies.extend(local_latencies)
+            errors.extend(local_errors)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    with app_sqlite.app.app_context():
+        settings = app_sqlite.sqlite_profile.effective_settings(app_sqlite.db.engine)
+    print(json.dumps({
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'errors': len(errors),
+        'sample_error': errors[0] if errors else None,
+        'journal_mode': settings.get('journal_mode'),
+    }, ensure_ascii=False))
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix='sqlite_bench_')
+    db_copy = os.path.join(workdir, 'sushi_express.db')
+    shutil.copy(os.path.join(HERE, 'sushi_express.db'), db_copy)
+    if mode == 'off':
+        # Режим журнала хранится в самом файле — возвращаем значение по умолчанию
+        conn = sqlite3.connect(db_copy)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+    env = dict(os.environ, SUSHI_SQLITE_PROFILE=mode, SUSHI_DB_PATH=db_copy)
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker',
+             '--threads', str(args.threads), '--seconds', str(args.seconds), '--writes', str(args.writes)],
+            env=env, cwd=HERE, capture_output=True, text=True
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+        if result.returncode != 0 or not lines:
+            raise RuntimeError(result.stderr[-2000:])
+        return json.loads(lines[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк профиля SQLite')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--writes', type=float, default=0.3, help='доля запросов на запись')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.threads, args.seconds, args.writes)
+        return
+
+    print(f'🏁 {args.threads} потоков, {args.seconds} с на режим, доля записи {args.writes}')
+    results = {}
+    for mode in ('off', 'on'):
+        results[mode] = run_mode(mode, args)
+        r = results[mode]
+        print(f"   профиль {mode:>3}: {r['rps']} запр/с, p50 {r['p50_ms']} мс, p95 {r['p95_ms']} мс, "
+              f"ошибок {r['errors']}, journal_mode={r['journal_mode']}")
+        if r['sample_error']:
+            print(f"      пример ошибки: {r['sample_error']}")
+    if results['off']['rps']:
+        print(f"📈 Ускорение: x{results['on']['rps'] / results['off']['rps']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
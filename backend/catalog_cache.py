@@ -0,0 +1,131 @@
+"""Кэш ответов каталога (/api/rolls, /api/sets, /api/other-items).
+
+Готовое тело JSON-ответа хранится в памяти и пересобирается только после
+изменения каталога. После commit любой сессии, в которой менялись Roll, Set,
+OtherItem, RollIngredient или SetRoll, увеличивается version, а если менялся
+Ingredient (остатки влияют на is_available, см. availability.py) —
+stock_version. Таблица цен (pricing.py) зависит только от version, поэтому
+списание остатков при заказе её не сбрасывает. Отслеживание идёт по событиям
+SQLAlchemy, поэтому правки через API видны сразу. Изменения,
+сделанные другими процессами (скрипты загрузки данных), подхватываются
+не позже чем через MAX_AGE_SECONDS.
+
+Клиент получает ETag и может спрашивать If-None-Match — тогда ответ 304
+без тела.
+"""
+import hashlib
+import threading
+import time
+
+from flask import current_app, jsonify, request
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import db, Roll, Set, OtherItem, RollIngredient, SetRoll, Ingredient
+
+CATALOG_MODELS = (Roll, Set, OtherItem, RollIngredient, SetRoll)
+STOCK_MODELS = (Ingredient,)
+MAX_AGE_SECONDS = 300
+
+
+class CatalogCache:
+    def __init__(self, max_age=MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self.version = 0
+        self.stock_version = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def state(self):
+        """Версия каталога вместе с остатками"""
+        return self.version, self.stock_version
+
+    def bump(self, catalog=True, stock=False):
+        with self._lock:
+            if catalog:
+                self.version += 1
+            if stock:
+                self.stock_version += 1
+            self._entries.clear()
+
+    def get(self, name, build):
+        """(тело, etag) для ответа name; build() возвращает данные для jsonify"""
+        now = time.monotonic()
+        with self._lock:
+            version = self.state
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version and now - entry[1] < self.max_age:
+                return entry[2], entry[3]
+        body = jsonify(build()).get_data()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            # Каталог мог измениться, пока собирали ответ — тогда не сохраняем
+            if self.state == version:
+                self._entries[name] = (version, now, body, etag)
+        return body, etag
+
+    def response(self, name, build):
+        """Ответ с ETag; 304, если у клиента та же версия"""
+        body, etag = self.get(name, build)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+catalog_cache = CatalogCache()
+
+
+def db_fingerprint(*models):
+    """Число строк и MAX(updated_at) по таблицам одним запросом.
+
+    В отличие от catalog_cache.version меняется и от коммитов других
+    процессов (воркеры gunicorn, catalog_import.py), если они обновляют
+    updated_at — ORM update() делает это сам через onupdate.
+    """
+    columns = []
+    for model in models:
+        columns.append(db.session.query(func.count(model.id)).scalar_subquery())
+        if hasattr(model, 'updated_at'):
+            columns.append(db.session.query(func.max(model.updated_at)).scalar_subquery())
+    return tuple(db.session.query(*columns).one())
+
+
+def _mark_changes(session, classes):
+    if any(issubclass(cls, CATALOG_MODELS) for cls in classes):
+        session.info['catalog_changed'] = True
+    if any(issubclass(cls, STOCK_MODELS) for cls in classes):
+        session.info['stock_changed'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flushed_changes(session, flush_context):
+    _mark_changes(session, {type(obj) for obj in (*session.new, *session.dirty, *session.deleted)})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_changes(orm_execute_state):
+    # Массовые update()/delete() и insert() идут мимо flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        _mark_changes(orm_execute_state.session, {mapper.class_})
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_catalog_version(session):
+    catalog = session.info.pop('catalog_changed', False)
+    stock = session.info.pop('stock_changed', False)
+    if catalog or stock:
+        catalog_cache.bump(catalog=catalog, stock=stock)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_catalog_changes(session):
+    session.info.pop('catalog_changed', None)
+    session.info.pop('stock_changed', None)
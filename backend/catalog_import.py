@@ -0,0 +1,417 @@
+"""Массовая загрузка каталога (ингредиенты, роллы, сеты, составы) в SQLite.
+
+Каждый источник (.xlsx или .csv) читается один раз, проверка и
+преобразование — векторные операции pandas, запись — executemany в одной
+транзакции (BEGIN IMMEDIATE ... COMMIT): при ошибке база не меняется.
+
+Режимы:
+- upsert (по умолчанию) — строки сопоставляются с базой по названию (без
+  учёта регистра и пробелов по краям). Новые вставляются, изменившиеся
+  обновляются, совпадающие и отсутствующие в источнике не трогаются.
+  Обновляются только колонки, которые есть в источнике. Себестоимость
+  роллов и сетов и остатки ингредиентов задаются только новым строкам:
+  себестоимость дальше ведёт cost_recalc.py (полный пересчёт —
+  POST /api/admin/costs/recalculate), а остатки списываются заказами.
+  Составы роллов и сетов приводятся к источнику для тех роллов и
+  сетов, что в нём есть. Такой режим можно запускать на работающей базе —
+  API увидит изменения не позже чем через catalog_cache.MAX_AGE_SECONDS.
+- replace — таблицы каталога очищаются и заполняются заново, как раньше
+  делали load_real_data*.py.
+
+    python catalog_import.py --source-dir ../sushiback [--db sushi_express.db] [--replace] [--dry-run]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SOURCE_NAMES = ('ingredients', 'rolls', 'roll_recipes', 'sets', 'set_composition')
+
+# Названия роллов в составе сетов -> названия в каталоге
+ROLL_NAME_ALIASES = {
+    'Филадельфия': 'филадельфия',
+    'Темпура Чикен маки': 'чикен маки',
+    'Саке маки': 'саке маки',
+    'Овощной ролл': 'овощьной ролл',
+    'Мини ролл огурец': 'мини рол огурец',
+    'Запеченная Маки курица': 'маки курица',
+    'Лосось темпура': 'лосось темпура',
+    'Курица темпура': 'курица темпура',
+    'Угорь темпура': 'угорь темпура',
+    'Запечённый магистр': 'запеч магистр',
+    'Запеченный магистр': 'запеч магистр',
+    'Запечённая фила': 'запеч фила',
+    'Унаги запечённый': 'унаги запеч',
+    'Фила спешл': 'фила спешл',
+    'Копчёная фила': 'копченная фила',
+    'Фила с угрём': 'фила с угрем',
+    'Сладкий ролл': 'сладкий ролл',
+    'Чедр ролл': 'чедр ролл',
+    'Острый лосось': 'острый лосось',
+    'Ролл нежный (запеч.)': 'запеч фила',
+    'Ролл Чикаго': 'чикаго ролл',
+    'Запеченная филадельфия': 'запеч фила',
+    'Чикаго ролл': 'чикаго ролл',
+    'Филадельфия спешл': 'фила спешл',
+    'Ролл нежный': 'запеч фила',
+    'Ролл томаго': 'саке маки',
+    'Ролл запеченный нежный': 'запеч фила',
+    'Запеченная Филадельфия': 'запеч фила',
+    'Запеченный Маки курица': 'маки курица',
+}
+
+# Таблица -> (колонки для вставки, колонки, которые upsert не обновляет)
+ENTITY_TABLES = {
+    'ingredients': (['name', 'cost_per_unit', 'price_per_unit', 'stock_quantity', 'unit'],
+                    {'stock_quantity'}),
+    'rolls': (['name', 'description', 'cost_price', 'sale_price', 'image_url', 'is_popular', 'is_new'],
+              {'cost_price'}),
+    'sets': (['name', 'description', 'cost_price', 'set_price', 'discount_percent', 'image_url',
+              'is_popular', 'is_new'],
+             {'cost_price'}),
+}
+
+
+class ImportReport:
+    def __init__(self):
+        self.tables = {}  # таблица -> {inserted, updated, deleted, unchanged}
+        self.warnings = []
+        self.seconds = 0.0
+
+    def count(self, table, **counts):
+        entry = self.tables.setdefault(table, {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0})
+        for key, value in counts.items():
+            entry[key] += int(value)
+
+    def print(self):
+        for table, counts in self.tables.items():
+            print(f"   {table}: +{counts['inserted']} ~{counts['updated']} -{counts['deleted']} "
+                  f"(без изменений {counts['unchanged']})")
+        for warning in self.warnings:
+            print(f"⚠️ {warning}")
+        print(f"⏱️ {self.seconds:.2f} с")
+
+
+# ===== Чтение и подготовка источников =====
+
+def find_sources(directory):
+    """{имя: путь} для файлов каталога в папке (.xlsx предпочтительнее .csv)"""
+    sources = {}
+    for name in SOURCE_NAMES:
+        for ext in ('.xlsx', '.csv'):
+            path = os.path.join(directory, name + ext)
+            if os.path.exists(path):
+                sources[name] = path
+                break
+    return sources
+
+
+def read_source(source):
+    """DataFrame из пути к .xlsx/.csv (разделитель CSV определяется сам) или готового DataFrame"""
+    if source is None or isinstance(source, pd.DataFrame):
+        return source
+    if source.endswith('.csv'):
+        return pd.read_csv(source, sep=None, engine='python', encoding='utf-8-sig')
+    return pd.read_excel(source)
+
+
+def name_key(names):
+    return names.astype('string').str.strip().str.casefold()
+
+
+def _number(df, column, default):
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=float)
+    return pd.to_numeric(df[column], errors='coerce').fillna(default)
+
+
+def _text(df, column, default):
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[column].where(df[column].notna(), default)
+
+
+def _flag(df, column):
+    return _number(df, column, 0).astype(bool).astype(int)
+
+
+def _named(df, table, report):
+    """Строки с непустым названием, без повторов (берётся последняя)"""
+    df = df.copy()
+    df['name'] = df['name'].astype('string').str.strip()
+    df = df[df['name'].notna() & (df['name'] != '')]
+    df['key'] = name_key(df['name'])
+    duplicated = df['key'].duplicated(keep='last')
+    if duplicated.any():
+        report.warnings.append(f"{table}: повторяются названия {sorted(df.loc[duplicated, 'name'])}")
+    return df[~duplicated]
+
+
+def prepare_ingredients(df, report):
+    """(строки для ingredients, колонки из источника)"""
+    df = _named(df, 'ingredients', report)
+    cost = _number(df, 'price_per_unit', 100)
+    out = pd.DataFrame({
+        'key': df['key'],
+        'name': df['name'],
+        'cost_per_unit': cost,
+        'price_per_unit': (cost * 1.2).round(4),  # 20% наценки
+        'stock_quantity': _number(df, 'quantity', 10),
+        'unit': _text(df, 'unit', 'шт'),
+    })
+    provided = {'name'} | ({'cost_per_unit', 'price_per_unit'} if 'price_per_unit' in df.columns else set())
+    provided |= {'unit'} & set(df.columns)
+    return out, provided
+
+
+def prepare_rolls(df, report):
+    df = _named(df, 'rolls', report)
+    sale_price = _number(df, 'sale_price', 300)
+    out = pd.DataFrame({
+        'key': df['key'],
+        'name': df['name'],
+        'description': _text(df, 'description', 'Вкусный ролл'),
+        # Себестоимость из источника, иначе оценка 30% от цены
+        'cost_price': _number(df, 'cost', np.nan).fillna(sale_price * 0.3),
+        'sale_price': sale_price,
+        'image_url': _text(df, 'image_url', 'https://via.placeholder.com/300x200?text=Roll'),
+        'is_popular': _flag(df, 'is_popular'),
+        'is_new': _flag(df, 'is_new'),
+    })
+    provided = {'name'} | ({'description', 'sale_price', 'image_url', 'is_popular', 'is_new'} & set(df.columns))
+    return out, provided
+
+
+def prepare_sets(df, report):
+    df = _named(df, 'sets', report)
+    set_price = _number(df, 'set_price', 800)
+    out = pd.DataFrame({
+        'key': df['key'],
+        'name': df['name'],
+        'description': _text(df, 'description', 'Вкусный сет'),
+        'cost_price': _number(df, 'cost_price', np.nan).fillna(set_price * 0.4),
+        'set_price': set_price,
+        'discount_percent': _number(df, 'discount_percent', 0),
+        'image_url': _text(df, 'image_url', 'https://via.placeholder.com/300x200?text=Set'),
+        'is_popular': _flag(df, 'is_popular'),
+        'is_new': _flag(df, 'is_new'),
+    })
+    provided = {'name'} | ({'description', 'set_price', 'discount_percent', 'image_url', 'is_popular', 'is_new'}
+                           & set(df.columns))
+    return out, provided
+
+
+def _unmatched(mask, what, values, report):
+    if mask.any():
+        report.warnings.append(f"{what}: не найдено {sorted(set(map(str, values[mask])))}")
+
+
+def _keys_by_id(df):
+    """id источника -> ключ названия (включая строки-повторы)"""
+    if 'id' not in df.columns:
+        return pd.Series(dtype='string')
+    df = df[df['name'].notna()]
+    return pd.Series(name_key(df['name']).values, index=pd.to_numeric(df['id'], errors='coerce'))
+
+
+def prepare_roll_ingredients(df, rolls, ingredients, roll_ids, ingredient_ids, report):
+    """Строки roll_ingredients (id из базы) по рецептам с id источника"""
+    roll_keys = _keys_by_id(rolls)
+    ingredient_keys = _keys_by_id(ingredients)
+    source_roll = pd.to_numeric(df['roll_id'], errors='coerce')
+    source_ingredient = pd.to_numeric(df['ingredient_id'], errors='coerce')
+    out = pd.DataFrame({
+        'roll_id': source_roll.map(roll_keys).map(roll_ids),
+        'ingredient_id': source_ingredient.map(ingredient_keys).map(ingredient_ids),
+        'amount_per_roll': pd.to_numeric(df['amount_per_roll'], errors='coerce'),
+    })
+    _unmatched(out['roll_id'].isna(), 'roll_recipes: роллы', source_roll, report)
+    _unmatched(out['ingredient_id'].isna(), 'roll_recipes: ингредиенты', source_ingredient, report)
+    out = out.dropna()
+    out = out[out['amount_per_roll'] > 0]
+    # Повторы строки рецепта складываются
+    return out.groupby(['roll_id', 'ingredient_id'], as_index=False)['amount_per_roll'].sum().astype(
+        {'roll_id': int, 'ingredient_id': int})
+
+
+def prepare_set_rolls(df, sets, set_ids, roll_ids, report):
+    """Строки set_rolls по составу сетов: сет по id источника, ролл по названию"""
+    set_keys = _keys_by_id(sets)
+    source_set = pd.to_numeric(df['set_id'], errors='coerce')
+    roll_names = df['roll_name'].astype('string').str.strip()
+    roll_names = roll_names.map(lambda name: ROLL_NAME_ALIASES.get(name, name))
+    out = pd.DataFrame({
+        'set_id': source_set.map(set_keys).map(set_ids),
+        'roll_id': name_key(roll_names).map(roll_ids),
+    })
+    _unmatched(out['set_id'].isna(), 'set_composition: сеты', source_set, report)
+    _unmatched(out['roll_id'].isna(), 'set_composition: роллы', df['roll_name'], report)
+    out = out.dropna().astype(int)
+    # Повтор ролла в составе — количество
+    return out.groupby(['set_id', 'roll_id']).size().rename('quantity').reset_index()
+
+
+# ===== Запись =====
+
+def _differs(left, right):
+    """Поэлементно: значения отличаются (числа — с допуском, NULL == NULL)"""
+    if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+        left, right = left.astype(float), right.astype(float)
+        both_nan = left.isna() & right.isna()
+        return ~(np.isclose(left, right, rtol=0, atol=1e-9) | both_nan)
+    return left.fillna('').astype(str) != right.fillna('').astype(str)
+
+
+def _rows(df, columns):
+    return [tuple(None if pd.isna(v) else (v.item() if isinstance(v, np.generic) else v) for v in row)
+            for row in df[columns].itertuples(index=False, name=None)]
+
+
+def sync_entities(cursor, table, df, provided, report, now):
+    """Upsert роллов/сетов/ингредиентов; {ключ названия: id в базе}"""
+    columns, insert_only = ENTITY_TABLES[table]
+    existing = pd.DataFrame(cursor.execute(f'SELECT id, {", ".join(columns)} FROM {table} ORDER BY id').fetchall(),
+                            columns=['id'] + columns)
+    existing['key'] = name_key(existing['name'])
+    existing = existing.drop_duplicates('key')  # дубли в базе: берём первый id
+
+    merged = df.merge(existing, on='key', how='left', suffixes=('', '_db'))
+    new = merged[merged['id'].isna()]
+    if not new.empty:
+        cursor.executemany(
+            f'INSERT INTO {table} ({", ".join(columns)}, created_at, updated_at) '
+            f'VALUES ({", ".join("?" for _ in columns)}, ?, ?)',
+            [row + (now, now) for row in _rows(new, columns)]
+        )
+
+    update_columns = [c for c in columns if c in provided and c not in insert_only]
+    matched = merged[merged['id'].notna()]
+    changed = pd.Series(False, index=matched.index)
+    for column in update_columns:
+        changed |= _differs(matched[column], matched[f'{column}_db'])
+    changed_rows = matched[changed]
+    if not changed_rows.empty:
+        cursor.executemany(
+            f'UPDATE {table} SET {", ".join(f"{c} = ?" for c in update_columns)}, updated_at = ? WHERE id = ?',
+            [row[:-1] + (now, int(row[-1])) for row in _rows(changed_rows, update_columns + ['id'])]
+        )
+    report.count(table, inserted=len(new), updated=len(changed_rows), unchanged=len(matched) - len(changed_rows))
+
+    ids = cursor.execute(f'SELECT id, name FROM {table} ORDER BY id').fetchall()
+    result = {}
+    for entity_id, name in ids:
+        result.setdefault(str(name).strip().casefold(), entity_id)
+    return result
+
+
+def sync_links(cursor, table, parent, child, value, df, report):
+    """Привести связи parent-child к df для всех parent из df"""
+    existing = pd.DataFrame(cursor.execute(f'SELECT id, {parent}, {child}, {value} FROM {table} ORDER BY id').fetchall(),
+                            columns=['id', parent, child, value])
+    existing = existing[existing[parent].isin(df[parent])]
+    duplicates = existing[existing.duplicated([parent, child])]
+    existing = existing.drop_duplicates([parent, child])
+
+    merged = df.merge(existing, on=[parent, child], how='outer', suffixes=('', '_db'), indicator=True)
+    new = merged[merged['_merge'] == 'left_only']
+    gone = merged[merged['_merge'] == 'right_only']
+    both = merged[merged['_merge'] == 'both']
+    changed = both[_differs(both[value], both[f'{value}_db'])]
+
+    if not new.empty:
+        cursor.executemany(f'INSERT INTO {table} ({parent}, {child}, {value}) VALUES (?, ?, ?)',
+                           _rows(new, [parent, child, value]))
+    if not changed.empty:
+        cursor.executemany(f'UPDATE {table} SET {value} = ? WHERE id = ?',
+                           [(v, int(i)) for v, i in _rows(changed, [value, 'id'])])
+    removed = [(int(i),) for i in list(gone['id']) + list(duplicates['id'])]
+    if removed:
+        cursor.executemany(f'DELETE FROM {table} WHERE id = ?', removed)
+    report.count(table, inserted=len(new), updated=len(changed), deleted=len(removed),
+                 unchanged=len(both) - len(changed))
+
+
+def import_catalog(db_path, sources, replace=False, dry_run=False, before_import=None):
+    """Загрузить каталог из sources ({имя: путь или DataFrame}, см. SOURCE_NAMES).
+
+    before_import(cursor) выполняется в той же транзакции до загрузки
+    (например, очистка заказов в режиме replace). Возвращает ImportReport.
+    """
+    started = time.monotonic()
+    report = ImportReport()
+    frames = {name: read_source(sources.get(name)) for name in SOURCE_NAMES}
+    prepared = {}
+    for name, prepare in (('ingredients', prepare_ingredients), ('rolls', prepare_rolls), ('sets', prepare_sets)):
+        if frames[name] is not None:
+            prepared[name] = prepare(frames[name], report)
+        else:
+            report.warnings.append(f'нет источника {name}')
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        if before_import is not None:
+            before_import(cursor)
+        if replace:
+            for table in ('set_rolls', 'roll_ingredients', 'sets', 'rolls', 'ingredients'):
+                report.count(table, deleted=cursor.execute(f'DELETE FROM {table}').rowcount)
+
+        ids = {}
+        for table in ('ingredients', 'rolls', 'sets'):
+            if table in prepared:
+                df, provided = prepared[table]
+                ids[table] = sync_entities(cursor, table, df, provided, report, now)
+
+        if frames['roll_recipes'] is not None and 'rolls' in prepared and 'ingredients' in prepared:
+            links = prepare_roll_ingredients(frames['roll_recipes'], frames['rolls'], frames['ingredients'],
+                                             ids['rolls'], ids['ingredients'], report)
+            sync_links(cursor, 'roll_ingredients', 'roll_id', 'ingredient_id', 'amount_per_roll', links, report)
+        if frames['set_composition'] is not None and 'sets' in prepared and 'rolls' in ids:
+            links = prepare_set_rolls(frames['set_composition'], frames['sets'], ids['sets'], ids['rolls'], report)
+            sync_links(cursor, 'set_rolls', 'set_id', 'roll_id', 'quantity', links, report)
+
+        if dry_run:
+            cursor.execute('ROLLBACK')
+        else:
+            cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    report.seconds = time.monotonic() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Загрузка каталога из .xlsx/.csv')
+    parser.add_argument('--source-dir', default='../sushiback', help='папка с ingredients, rolls, sets, ...')
+    parser.add_argument('--db', default='sushi_express.db')
+    parser.add_argument('--replace', action='store_true', help='очистить каталог и загрузить заново')
+    parser.add_argument('--dry-run', action='store_true', help='показать изменения без записи')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not os.path.exists(db_path):
+        db_path = os.path.join('instance', args.db)
+    sources = find_sources(args.source_dir)
+    print(f"📂 Источники: {', '.join(f'{k}={v}' for k, v in sources.items()) or 'не найдены'}")
+    try:
+        report = import_catalog(db_path, sources, replace=args.replace, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Ошибка загрузки каталога: {e}")
+        return 1
+    print('🔎 Пробный запуск, база не изменена:' if args.dry_run else '✅ Каталог загружен:')
+    report.print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Пакетная загрузка товаров каталога.
+
+Вместо Roll.query.get / Set.query.get на каждую позицию корзины или заказа
+все нужные товары одного типа загружаются одним запросом IN (...),
+а связанные ингредиенты и состав сетов — через selectinload.
+"""
+from sqlalchemy.orm import selectinload
+
+from models import Roll, RollIngredient, Set, SetRoll, Order, OtherItem
+
+
+def load_rolls(ids, with_ingredients=False):
+    """{id: Roll} для переданных id"""
+    ids = {int(i) for i in ids if i is not None}
+    if not ids:
+        return {}
+    query = Roll.query.filter(Roll.id.in_(ids))
+    if with_ingredients:
+        query = query.options(selectinload(Roll.ingredients).selectinload(RollIngredient.ingredient))
+    return {roll.id: roll for roll in query.all()}
+
+
+def load_sets(ids, with_rolls=False):
+    """{id: Set} для переданных id"""
+    ids = {int(i) for i in ids if i is not None}
+    if not ids:
+        return {}
+    query = Set.query.filter(Set.id.in_(ids))
+    if with_rolls:
+        query = query.options(selectinload(Set.rolls).selectinload(SetRoll.roll))
+    return {set_item.id: set_item for set_item in query.all()}
+
+
+def load_other_items(ids):
+    """{id: OtherItem} для переданных id"""
+    ids = {int(i) for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {item.id: item for item in OtherItem.query.filter(OtherItem.id.in_(ids)).all()}
+
+
+def ids_by_type(items, type_key='item_type', id_key='item_id'):
+    """{тип: {id, ...}} по списку позиций (словарей или объектов)"""
+    result = {}
+    for item in items:
+        if isinstance(item, dict):
+            item_type, item_id = item.get(type_key), item.get(id_key)
+        else:
+            item_type, item_id = getattr(item, type_key), getattr(item, id_key)
+        if item_id is None:
+            continue
+        try:
+            result.setdefault(item_type, set()).add(int(item_id))
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+def orders_query():
+    """Order.query с позициями, загружаемыми одним запросом на все заказы"""
+    return Order.query.options(selectinload(Order.items))
+
+
+def load_order_catalog(orders):
+    """{тип: {id: товар}} для всех позиций переданных заказов — по запросу на тип"""
+    ids = ids_by_type(item for order in orders for item in order.items)
+    return {
+        'roll': load_rolls(ids.get('roll', ())),
+        'set': load_sets(ids.get('set', ())),
+        'other_item': load_other_items(ids.get('other_item', ())),
+    }
+
+
+def orders_to_dicts(orders):
+    """Order.to_dict() для списка заказов без запроса на каждую позицию"""
+    catalog = load_order_catalog(orders)
+    return [order.to_dict(catalog) for order in orders]
+
+
+def order_to_dict(order):
+    return orders_to_dicts([order])[0]
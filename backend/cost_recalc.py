@@ -0,0 +1,131 @@
+"""Пересчёт себестоимости роллов и сетов по ценам ингредиентов.
+
+Себестоимость ролла — сумма amount_per_roll * cost_per_unit по рецепту
+(cost_per_unit — закупочная цена, price_per_unit — цена с наценкой),
+себестоимость сета — сумма себестоимостей роллов состава с учётом quantity.
+
+recalculate_costs(ingredient_ids) идёт по обратным связям
+ингредиент -> roll_ingredients -> ролл -> set_rolls -> сет (по индексам
+внешних ключей), считает себестоимость только затронутых роллов и сетов
+агрегатными запросами и записывает изменившиеся одним массовым UPDATE на
+таблицу. Роллы без рецепта и сеты без состава не трогаются — их
+себестоимость задана вручную. commit делает вызывающий код, вместе с
+изменением цены.
+
+Рецепты в базе пока не сверены с ручной себестоимостью (сумма по рецепту
+бывает 1.96 при заданных 96.59). Поэтому при правке цены ингредиента
+(previous_costs — старые цены) пересчитываются только роллы, чья
+себестоимость совпадала с рецептом по старым ценам, и сеты, чья
+себестоимость совпадала с суммой роллов; остальные попадают в skipped.
+Полный пересчёт без previous_costs перезаписывает всё — это явное
+действие администратора.
+"""
+from sqlalchemy import case, func, update
+
+from models import db, Ingredient, Roll, RollIngredient, Set, SetRoll
+
+COST_DIGITS = 2
+
+
+class CostChanges:
+    def __init__(self):
+        self.rolls = {}  # id ролла -> новая себестоимость
+        self.sets = {}  # id сета -> новая себестоимость
+        self.skipped_rolls = set()  # себестоимость задана вручную, не совпадает с рецептом
+        self.skipped_sets = set()
+
+    def to_dict(self):
+        return {
+            'rolls': [{'id': roll_id, 'cost_price': cost} for roll_id, cost in sorted(self.rolls.items())],
+            'sets': [{'id': set_id, 'cost_price': cost} for set_id, cost in sorted(self.sets.items())],
+            'skipped_rolls': sorted(self.skipped_rolls),
+            'skipped_sets': sorted(self.skipped_sets),
+        }
+
+
+def dependent_rolls(ingredient_ids=None):
+    """id роллов, в рецепте которых есть ингредиенты (None — все роллы с рецептом)"""
+    query = db.session.query(RollIngredient.roll_id).distinct()
+    if ingredient_ids is not None:
+        query = query.filter(RollIngredient.ingredient_id.in_(ingredient_ids))
+    return {roll_id for (roll_id,) in query}
+
+
+def dependent_sets(roll_ids=None):
+    """id сетов, в составе которых есть роллы (None — все сеты с составом)"""
+    query = db.session.query(SetRoll.set_id).distinct()
+    if roll_ids is not None:
+        query = query.filter(SetRoll.roll_id.in_(roll_ids))
+    return {set_id for (set_id,) in query}
+
+
+def _round(cost):
+    return round(cost or 0.0, COST_DIGITS)
+
+
+def _roll_costs(roll_ids, ingredient_costs=None):
+    """{id ролла: себестоимость по рецепту}; ingredient_costs подменяет цены ингредиентов"""
+    cost_per_unit = Ingredient.cost_per_unit
+    if ingredient_costs:
+        cost_per_unit = case(ingredient_costs, value=Ingredient.id, else_=Ingredient.cost_per_unit)
+    query = db.session.query(
+        RollIngredient.roll_id, func.sum(RollIngredient.amount_per_roll * cost_per_unit)
+    ).join(Ingredient, Ingredient.id == RollIngredient.ingredient_id).filter(
+        RollIngredient.roll_id.in_(roll_ids)
+    ).group_by(RollIngredient.roll_id)
+    return {roll_id: _round(cost) for roll_id, cost in query}
+
+
+def _set_costs(set_ids):
+    """{id сета: сумма текущей себестоимости роллов состава}"""
+    query = db.session.query(
+        SetRoll.set_id, func.sum(Roll.cost_price * func.coalesce(SetRoll.quantity, 1))
+    ).join(Roll, Roll.id == SetRoll.roll_id).filter(
+        SetRoll.set_id.in_(set_ids)
+    ).group_by(SetRoll.set_id)
+    return {set_id: _round(cost) for set_id, cost in query}
+
+
+def _apply(model, costs, expected=None, skipped=None):
+    """Записать изменившуюся себестоимость одним UPDATE; {id: себестоимость} изменённых.
+
+    expected — {id: себестоимость до изменения цен}: строки, где сохранённая
+    себестоимость с ней не совпадает, заданы вручную и попадают в skipped.
+    """
+    current = dict(db.session.query(model.id, model.cost_price).filter(model.id.in_(costs)))
+    changed = {}
+    for item_id, cost in costs.items():
+        if item_id not in current or current[item_id] == cost:
+            continue
+        if expected is not None and _round(current[item_id]) != expected.get(item_id):
+            skipped.add(item_id)
+            continue
+        changed[item_id] = cost
+    if changed:
+        db.session.execute(update(model), [{'id': item_id, 'cost_price': cost} for item_id, cost in changed.items()])
+    return changed
+
+
+def recalculate_costs(ingredient_ids=None, previous_costs=None):
+    """Пересчитать себестоимость роллов и сетов, зависящих от ингредиентов.
+
+    ingredient_ids=None — полный пересчёт. previous_costs — {id ингредиента:
+    cost_per_unit до изменения}: тогда обновляются только роллы и сеты,
+    себестоимость которых была рассчитана (см. описание модуля).
+    Возвращает CostChanges.
+    """
+    changes = CostChanges()
+    roll_ids = dependent_rolls(ingredient_ids)
+    set_ids = dependent_sets(roll_ids if ingredient_ids is not None else None)
+    expected_rolls = expected_sets = None
+    if previous_costs is not None:
+        expected_rolls = _roll_costs(roll_ids, previous_costs) if roll_ids else {}
+        expected_sets = _set_costs(set_ids) if set_ids else {}
+
+    if roll_ids:
+        changes.rolls = _apply(Roll, _roll_costs(roll_ids), expected_rolls, changes.skipped_rolls)
+
+    # Сеты считаются по уже обновлённой себестоимости роллов
+    if set_ids:
+        changes.sets = _apply(Set, _set_costs(set_ids), expected_sets, changes.skipped_sets)
+    return changes
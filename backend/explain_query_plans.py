@@ -0,0 +1,179 @@
+"""Отчёт EXPLAIN QUERY PLAN по запросам каждого эндпоинта API.
+
+Скрипт берёт копию sushi_express.db, применяет к ней миграции
+(корзина/избранное, резервы, индексы), вызывает эндпоинты через Flask test
+client и для каждого выполненного SQL-запроса печатает план SQLite.
+
+Полный просмотр таблицы (SCAN) считается нормальным, если запрос по смыслу
+читает таблицу целиком: в нём нет параметров (список роллов), это агрегат
+GROUP BY без условий вида «колонка = ?» (статистика в admin_stats.py) или
+IN по списку id, сравнимому с размером таблицы (подгрузка позиций для
+полного списка заказов) — тогда SQLite сознательно читает таблицу. Проход по индексу в нужном порядке (SCAN ... USING INDEX)
+тоже нормален — так работают ORDER BY ... LIMIT. Остальные SCAN в запросах
+с параметрами — пропущенный индекс: такие строки помечаются ❌, и скрипт
+завершается с кодом 1.
+
+    python explain_query_plans.py [--output plans.txt]
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def prepare_database():
+    """Копия базы с применёнными миграциями; путь к ней"""
+    workdir = tempfile.mkdtemp(prefix='explain_')
+    shutil.copy(os.path.join(HERE, 'sushi_express.db'), os.path.join(workdir, 'sushi_express.db'))
+    sys.path.insert(0, HERE)
+    from migrate_cart_favorites import migrate_cart_favorites
+    from add_stock_reservations import add_stock_reservations
+    from add_indexes import add_indexes
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with redirect_stdout(StringIO()):
+            migrate_cart_favorites()
+            add_stock_reservations()
+            add_indexes()
+    finally:
+        os.chdir(cwd)
+    return workdir
+
+
+def is_bulk_read(cursor, scan, parameters):
+    """IN по id покрывает заметную часть таблицы (не меньше четверти строк)"""
+    table = scan.split()[1]
+    try:
+        rows = cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    except Exception:
+        return False  # псевдоним таблицы — не угадываем
+    return len(parameters) * 4 >= rows
+
+
+def endpoints(app_sqlite):
+    """[(метод, url, json, пользователь)] с реальными id из базы"""
+    from models import User, Order, Roll, Set
+    with app_sqlite.app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+        customer_id = app_sqlite.db.session.query(Order.user_id).filter(Order.user_id != admin.id).first()[0]
+        order_id = Order.query.filter_by(user_id=customer_id).first().id
+        roll_id = Roll.query.first().id
+        set_id = Set.query.first().id
+    customer, admin = customer_id, admin.id
+    return [
+        ('GET', '/api/health', None, None),
+        ('GET', '/api/rolls', None, None),
+        ('GET', '/api/sets', None, None),
+        ('GET', '/api/other-items', None, None),
+        ('GET', f'/api/rolls/{roll_id}', None, None),
+        ('GET', f'/api/sets/{set_id}', None, None),
+        ('POST', '/api/cart/add', {'item_type': 'roll', 'item_id': roll_id, 'quantity': 1}, customer),
+        ('GET', '/api/cart', None, customer),
+        ('DELETE', f'/api/cart/remove/{roll_id}', None, customer),
+        ('POST', '/api/favorites/add', {'item_type': 'roll', 'item_id': roll_id}, customer),
+        ('GET', '/api/favorites', None, customer),
+        ('DELETE', f'/api/favorites/remove/{roll_id}', None, customer),
+        ('POST', '/api/orders', {'phone': '0', 'delivery_address': '-',
+                                 'items': [{'item_type': 'roll', 'item_id': roll_id, 'quantity': 1},
+                                           {'item_type': 'set', 'item_id': set_id, 'quantity': 1}]}, customer),
+        ('GET', '/api/orders', None, customer),
+        ('GET', '/api/orders?limit=20', None, customer),
+        ('GET', '/api/orders/all', None, admin),
+        ('GET', '/api/orders/all?limit=20', None, admin),
+        ('GET', '/api/orders/all?updated_since=2024-01-01T00:00:00', None, admin),
+        ('GET', f'/api/orders/{order_id}', None, admin),
+        ('PUT', f'/api/orders/{order_id}/status', {'status': 'Готовится'}, admin),
+        ('PUT', f'/api/orders/{order_id}/cancel', None, customer),
+        ('GET', '/api/orders/events?timeout=0', None, customer),
+        ('GET', '/api/admin/ingredients', None, admin),
+        ('GET', '/api/admin/users', None, admin),
+        ('GET', '/api/admin/stats', None, admin),
+        ('GET', f'/api/admin/rolls/{roll_id}/recipe', None, admin),
+        ('GET', '/api/loyalty/cards', None, customer),
+        ('GET', '/api/loyalty/available-rolls', None, customer),
+        ('GET', '/api/loyalty/history', None, customer),
+        ('GET', '/api/referral/my-code', None, customer),
+        ('GET', '/api/referral/history', None, customer),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Планы запросов для эндпоинтов API')
+    parser.add_argument('--output', help='записать отчёт в файл')
+    args = parser.parse_args()
+
+    workdir = prepare_database()
+    os.environ['SUSHI_DB_PATH'] = os.path.join(workdir, 'sushi_express.db')
+    try:
+        import app_sqlite
+        from flask_jwt_extended import create_access_token
+        from sqlalchemy import event
+
+        captured = []
+        with app_sqlite.app.app_context():
+            engine = app_sqlite.db.engine
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                captured.append((statement, parameters))
+
+        client = app_sqlite.app.test_client()
+        tokens = {}
+        lines = []
+        problems = 0
+        for method, url, payload, user_id in endpoints(app_sqlite):
+            headers = {}
+            if user_id is not None:
+                if user_id not in tokens:
+                    with app_sqlite.app.app_context():
+                        tokens[user_id] = create_access_token(identity=str(user_id))
+                headers['Authorization'] = f'Bearer {tokens[user_id]}'
+            captured.clear()
+            response = client.open(url, method=method, json=payload, headers=headers)
+            lines.append(f'\n=== {method} {url} -> {response.status_code}')
+            seen = set()
+            for statement, parameters in list(captured):
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                raw = engine.raw_connection()
+                try:
+                    cursor = raw.cursor()
+                    plan = cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+                    details = [row[-1] for row in plan]
+                    full_scans = [d for d in details if d.startswith('SCAN ')
+                                  and 'CONSTANT ROW' not in d and ' INDEX ' not in d]
+                    whole_table = not parameters or (' GROUP BY ' in statement and not re.search(r'=\s*\?', statement))
+                    missing = [d for d in full_scans if not whole_table and not is_bulk_read(cursor, d, parameters)]
+                finally:
+                    raw.close()
+                if missing:
+                    marker = '❌'
+                    problems += 1
+                elif full_scans:
+                    marker = '📋'  # таблица целиком по смыслу запроса
+                else:
+                    marker = '✅'
+                lines.append(f'{marker} {" ".join(statement.split())[:160]}')
+                lines.extend(f'      {d}' for d in details)
+        lines.append(f'\nПолных просмотров таблиц, где нужен индекс: {problems}')
+        report = '\n'.join(lines)
+        print(report)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        return 1 if problems else 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Списание бонусных баллов и накопительных карт под заказ.
+
+Скидку баллами и бесплатные роллы (loyalty_roll) считает resolve_cart, а
+списывает redeem() в транзакции заказа, так же как резерв склада:
+- баллы — условным UPDATE users ... WHERE bonus_points >= :discount;
+- каждая позиция loyalty_roll погашает одну заполненную карту: строка
+  loyalty_card_usage вставляется INSERT ... SELECT с проверкой NOT EXISTS,
+  поэтому одну карту не погасят два одновременных заказа.
+Если списать не удалось, RedemptionError — транзакцию нужно откатить.
+
+Списанные баллы записываются позицией заказа bonus_points (quantity —
+баллы, total_price — минус скидка), поэтому refund() при отмене возвращает
+ровно списанное, а заказы, оформленные до списания баллов, ничего не
+начисляют. Погашенные карты освобождаются удалением строк loyalty_card_usage.
+"""
+from datetime import datetime
+
+from sqlalchemy import exists, func, insert, literal, select, update
+
+from models import db, User, LoyaltyCard, LoyaltyCardUsage, LoyaltyRoll, OrderItem
+
+LOYALTY_ITEM_TYPE = 'loyalty_roll'
+BONUS_ITEM_TYPE = 'bonus_points'
+
+
+class RedemptionError(Exception):
+    """Баллов или заполненных карт уже не хватает"""
+
+
+def redeemable_cards(user_id):
+    """id заполненных и ещё не погашенных карт пользователя"""
+    used = exists().where(LoyaltyCardUsage.loyalty_card_id == LoyaltyCard.id)
+    query = (db.session.query(LoyaltyCard.id)
+             .filter(LoyaltyCard.user_id == user_id, LoyaltyCard.is_completed.is_(True), ~used)
+             .order_by(LoyaltyCard.id))
+    return [card_id for (card_id,) in query]
+
+
+def loyalty_roll_ids():
+    """id роллов, которые можно получить по карте"""
+    return {roll_id for (roll_id,) in db.session.query(LoyaltyRoll.roll_id).filter(LoyaltyRoll.is_available.is_(True))}
+
+
+def order_discount(order):
+    """Баллы, списанные заказом (по позиции bonus_points)"""
+    points = (db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0))
+              .filter(OrderItem.order_id == order.id, OrderItem.item_type == BONUS_ITEM_TYPE).scalar())
+    return int(points)
+
+
+def redeem(order, discount=None):
+    """Списать баллы и погасить карты под заказ. Commit — за вызывающим кодом.
+
+    discount — скидка нового заказа, записывается позицией bonus_points;
+    None — списать уже записанную (заказ возвращается из отмены).
+    """
+    if discount is None:
+        discount = order_discount(order)
+    elif discount:
+        db.session.add(OrderItem(order_id=order.id, item_type=BONUS_ITEM_TYPE, item_id=0, quantity=discount,
+                                 unit_price=-1.0, total_price=-float(discount)))
+    if discount:
+        result = db.session.execute(
+            update(User)
+            .where(User.id == order.user_id, User.bonus_points >= discount)
+            .values(bonus_points=User.bonus_points - discount)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise RedemptionError('Недостаточно бонусных баллов')
+
+    free_rolls = (db.session.query(OrderItem.item_id, OrderItem.quantity)
+                  .filter(OrderItem.order_id == order.id, OrderItem.item_type == LOYALTY_ITEM_TYPE))
+    for roll_id, quantity in free_rolls:
+        for _ in range(quantity or 1):
+            used = exists().where(LoyaltyCardUsage.loyalty_card_id == LoyaltyCard.id)
+            card = (select(literal(order.user_id), LoyaltyCard.id, literal(roll_id), literal(order.id),
+                           literal(datetime.utcnow()))
+                    .where(LoyaltyCard.user_id == order.user_id, LoyaltyCard.is_completed.is_(True), ~used)
+                    .order_by(LoyaltyCard.id)
+                    .limit(1))
+            result = db.session.execute(
+                insert(LoyaltyCardUsage).from_select(
+                    ['user_id', 'loyalty_card_id', 'roll_id', 'order_id', 'used_at'], card)
+            )
+            if result.rowcount != 1:
+                raise RedemptionError('Нет заполненной накопительной карты для бесплатного ролла')
+
+
+def refund(order):
+    """Вернуть баллы и освободить карты, погашенные заказом. Commit — за вызывающим кодом."""
+    discount = order_discount(order)
+    if discount:
+        db.session.execute(
+            update(User)
+            .where(User.id == order.user_id)
+            .values(bonus_points=func.coalesce(User.bonus_points, 0) + discount)
+            .execution_options(synchronize_session=False)
+        )
+    LoyaltyCardUsage.query.filter_by(order_id=order.id).delete(synchronize_session=False)
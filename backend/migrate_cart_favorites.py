@@ -0,0 +1,135 @@
+import sqlite3
+import os
+import json
+from datetime import datetime
+
+def _parse_json(value):
+    if not value or value.strip() in ('', 'null', 'None'):
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+def _item_id(value):
+    """ID товара как int; нечисловые ID (например, 'bonus' у бонусных баллов) -> 0"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def _added_at(value):
+    try:
+        return str(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        return str(datetime.utcnow())
+
+def cart_rows(user_id, cart_json):
+    """Строки cart_items из JSON-корзины пользователя"""
+    cart = _parse_json(cart_json)
+    if not isinstance(cart, list):
+        return []
+    rows = []
+    for item in cart:
+        if not isinstance(item, dict) or not item.get('item_type'):
+            continue
+        rows.append((
+            user_id,
+            item['item_type'],
+            _item_id(item.get('item_id')),
+            int(item.get('quantity') or 1),
+            item.get('price') if item['item_type'] in ('bonus_points', 'loyalty_roll') else None,
+            item.get('name'),
+            _added_at(item.get('added_at')),
+        ))
+    return rows
+
+def favorite_rows(user_id, favorites_json):
+    """Строки favorite_items из избранного в любом из двух форматов:
+    {"roll": [1, 2], "set": [3]} или [{"item_type": "roll", "item_id": 1}, ...]"""
+    favorites = _parse_json(favorites_json)
+    pairs = []
+    if isinstance(favorites, dict):
+        for item_type, item_ids in favorites.items():
+            if isinstance(item_ids, list):
+                pairs.extend((item_type, item_id) for item_id in item_ids)
+    elif isinstance(favorites, list):
+        pairs = [(fav.get('item_type'), fav.get('item_id')) for fav in favorites if isinstance(fav, dict)]
+    now = str(datetime.utcnow())
+    return [(user_id, item_type, _item_id(item_id), now)
+            for item_type, item_id in pairs if item_type and item_id is not None]
+
+def migrate_cart_favorites():
+    """Переносит корзины и избранное из JSON-полей users в таблицы cart_items и favorite_items"""
+
+    db_path = 'sushi_express.db'
+    if not os.path.exists(db_path):
+        db_path = 'instance/sushi_express.db'
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("🔧 Создаю таблицы cart_items и favorite_items...")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cart_items (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                item_type VARCHAR(20) NOT NULL,
+                item_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 1,
+                price FLOAT,
+                name VARCHAR(200),
+                added_at DATETIME,
+                CONSTRAINT uq_cart_items_user_item UNIQUE (user_id, item_type, item_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS favorite_items (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                item_type VARCHAR(20) NOT NULL,
+                item_id INTEGER NOT NULL,
+                added_at DATETIME,
+                CONSTRAINT uq_favorite_items_user_item UNIQUE (user_id, item_type, item_id)
+            )
+        ''')
+
+        cursor.execute('SELECT id, cart, favorites FROM users')
+        users = cursor.fetchall()
+
+        carts = []
+        favorites = []
+        for user_id, cart_json, favorites_json in users:
+            carts.extend(cart_rows(user_id, cart_json))
+            favorites.extend(favorite_rows(user_id, favorites_json))
+
+        # Повторы одного товара в старой корзине складываются в одну строку
+        cursor.executemany('''
+            INSERT INTO cart_items (user_id, item_type, item_id, quantity, price, name, added_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, item_type, item_id) DO UPDATE SET quantity = quantity + excluded.quantity
+        ''', carts)
+        cursor.executemany('''
+            INSERT INTO favorite_items (user_id, item_type, item_id, added_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, item_type, item_id) DO NOTHING
+        ''', favorites)
+
+        # Старые поля больше не используются — очищаем, чтобы данные не расходились
+        cursor.execute('UPDATE users SET cart = NULL, favorites = NULL')
+
+        conn.commit()
+        print(f"✅ Перенесено позиций корзины: {len(carts)}")
+        print(f"✅ Перенесено товаров в избранном: {len(favorites)}")
+        print("\n✅ Миграция корзины и избранного завершена!")
+
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_cart_favorites()
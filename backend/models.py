@@ -18,8 +18,8 @@ class User(db.Model):
     bonus_points = db.Column(db.Integer, default=0)  # Бонусные баллы от рефералов
     referral_code = db.Column(db.String(20), unique=True, nullable=True)  # Уникальный реферальный код пользователя
     referred_by = db.Column(db.String(20), nullable=True)  # Код пользователя, который пригласил
-    favorites = db.Column(db.Text, nullable=True)  # JSON строка с избранными
-    cart = db.Column(db.Text, nullable=True)  # JSON строка с корзиной
+    favorites = db.Column(db.Text, nullable=True)  # Устарело: избранное в favorite_items
+    cart = db.Column(db.Text, nullable=True)  # Устарело: корзина в cart_items
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login_at = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
@@ -44,6 +44,58 @@ class User(db.Model):
             'is_admin': self.is_admin
         }
 
+# Позиция корзины: одна строка на (пользователь, тип, товар)
+class CartItem(db.Model):
+    __tablename__ = 'cart_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    item_type = db.Column(db.String(20), nullable=False)  # 'roll', 'set', 'other_item', ...
+    item_id = db.Column(db.Integer, nullable=False)  # ID товара (0 — для бонусных баллов)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    price = db.Column(db.Float, nullable=True)  # Цена для особых позиций (бонусные баллы, бесплатный ролл)
+    name = db.Column(db.String(200), nullable=True)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'item_type', 'item_id', name='uq_cart_items_user_item'),
+    )
+
+    def to_dict(self):
+        data = {
+            'item_type': self.item_type,
+            'item_id': self.item_id,
+            'quantity': self.quantity,
+            'added_at': self.added_at.isoformat() if self.added_at else None
+        }
+        if self.price is not None:
+            data['price'] = self.price
+        if self.name:
+            data['name'] = self.name
+        return data
+
+# Товар в избранном
+class FavoriteItem(db.Model):
+    __tablename__ = 'favorite_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    item_type = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'item_type', 'item_id', name='uq_favorite_items_user_item'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.item_id,
+            'item_type': self.item_type,
+            'item_id': self.item_id,
+            'added_at': self.added_at.isoformat() if self.added_at else None
+        }
+
 # Модель ингредиентов
 class Ingredient(db.Model):
     __tablename__ = 'ingredients'
@@ -108,8 +160,8 @@ class RollIngredient(db.Model):
     __tablename__ = 'roll_ingredients'
     
     id = db.Column(db.Integer, primary_key=True)
-    roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False)
-    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False, index=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False, index=True)
     amount_per_roll = db.Column(db.Float, nullable=False)  # Количество ингредиента на ролл
     
     # Связи
@@ -165,8 +217,8 @@ class SetRoll(db.Model):
     __tablename__ = 'set_rolls'
     
     id = db.Column(db.Integer, primary_key=True)
-    set_id = db.Column(db.Integer, db.ForeignKey('sets.id'), nullable=False)
-    roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False)
+    set_id = db.Column(db.Integer, db.ForeignKey('sets.id'), nullable=False, index=True)
+    roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, default=1)  # Количество роллов в сете
     
     # Связи
@@ -191,7 +243,7 @@ class Order(db.Model):
     phone = db.Column(db.String(20), nullable=False)  # Номер для связи
     delivery_address = db.Column(db.Text, nullable=False)  # Адрес доставки
     payment_method = db.Column(db.String(50), nullable=False)  # Способ оплаты
-    status = db.Column(db.String(50), default='Принят')  # Статус заказа
+    status = db.Column(db.String(50), default='Принят', index=True)  # Статус заказа
     total_price = db.Column(db.Float, nullable=False)  # Общая стоимость
     comment = db.Column(db.Text, nullable=True)  # Комментарий к заказу
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -201,7 +253,14 @@ class Order(db.Model):
     user = db.relationship('User')
     items = db.relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
 
-    def to_dict(self):
+    # Постраничная выдача и синхронизация (order_sync.py), заказы пользователя
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at', 'id'),
+    )
+
+    def to_dict(self, catalog=None):
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -211,7 +270,7 @@ class Order(db.Model):
             'status': self.status,
             'total_price': self.total_price,
             'comment': self.comment,
-            'items': [item.to_dict() for item in self.items],
+            'items': [item.to_dict(catalog) for item in self.items],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -221,7 +280,7 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     item_type = db.Column(db.String(20), nullable=False)  # 'roll' или 'set'
     item_id = db.Column(db.Integer, nullable=False)  # ID ролла или сета
     quantity = db.Column(db.Integer, nullable=False)  # Количество
@@ -231,12 +290,21 @@ class OrderItem(db.Model):
     # Связи
     order = db.relationship('Order', back_populates='items')
 
-    def to_dict(self):
+    def to_dict(self, catalog=None):
         # Получаем название товара
         item_name = 'Товар'
         item_image = ''
         
-        if self.item_type == 'roll':
+        if self.item_type == 'bonus_points':
+            # Скидка баллами: quantity — списанные баллы (см. loyalty_redemption)
+            item_name = 'Бонусные баллы'
+        elif catalog is not None:
+            # Товары заранее загружены пачкой (см. catalog_loader.orders_to_dicts)
+            product = catalog.get(self.item_type, {}).get(self.item_id)
+            if product:
+                item_name = product.name
+                item_image = product.image_url or ''
+        elif self.item_type == 'roll':
             roll = Roll.query.get(self.item_id)
             if roll:
                 item_name = roll.name
@@ -264,6 +332,16 @@ class OrderItem(db.Model):
             'total_price': self.total_price
         }
 
+# Резерв ингредиентов под заказ (снимается со склада при создании, возвращается при отмене)
+class StockReservation(db.Model):
+    __tablename__ = 'stock_reservations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)  # Сколько списано со склада
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # Модель дополнительных товаров (соусы, напитки, другое)
 class OtherItem(db.Model):
     __tablename__ = 'other_items'
@@ -304,7 +382,7 @@ class LoyaltyCard(db.Model):
     __tablename__ = 'loyalty_cards'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     card_number = db.Column(db.String(50), nullable=False)  # Номер карты (например, LC-001)
     filled_rolls = db.Column(db.Integer, default=0)  # Количество заполненных роллов (0-8)
     is_completed = db.Column(db.Boolean, default=False)  # Карта полностью заполнена
@@ -331,8 +409,8 @@ class LoyaltyRoll(db.Model):
     __tablename__ = 'loyalty_rolls'
     
     id = db.Column(db.Integer, primary_key=True)
-    roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False)
-    is_available = db.Column(db.Boolean, default=True)  # Доступен ли ролл для получения
+    roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False, index=True)
+    is_available = db.Column(db.Boolean, default=True, index=True)  # Доступен ли ролл для получения
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Связи
@@ -353,11 +431,16 @@ class LoyaltyCardUsage(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    loyalty_card_id = db.Column(db.Integer, db.ForeignKey('loyalty_cards.id'), nullable=False)
+    loyalty_card_id = db.Column(db.Integer, db.ForeignKey('loyalty_cards.id'), nullable=False, index=True)
     roll_id = db.Column(db.Integer, db.ForeignKey('rolls.id'), nullable=False)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True)  # Если получен через заказ
     used_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # История пользователя: WHERE user_id = ? ORDER BY used_at DESC
+    __table_args__ = (
+        db.Index('ix_loyalty_card_usage_user_id_used_at', 'user_id', 'used_at'),
+    )
+    
     # Связи
     user = db.relationship('User')
     loyalty_card = db.relationship('LoyaltyCard')
@@ -381,7 +464,7 @@ class ReferralCode(db.Model):
     __tablename__ = 'referral_codes'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     code = db.Column(db.String(20), unique=True, nullable=False)  # Уникальный код
     is_active = db.Column(db.Boolean, default=True)  # Активен ли код
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -404,11 +487,16 @@ class ReferralUsage(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     referrer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Кто пригласил
-    referred_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Кого пригласили
+    referred_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # Кого пригласили
     referral_code = db.Column(db.String(20), nullable=False)  # Использованный код
     bonus_points_awarded = db.Column(db.Integer, default=200)  # Количество бонусных баллов
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # История приглашений: WHERE referrer_id = ? ORDER BY created_at DESC
+    __table_args__ = (
+        db.Index('ix_referral_usage_referrer_id_created_at', 'referrer_id', 'created_at'),
+    )
+    
     # Связи
     referrer = db.relationship('User', foreign_keys=[referrer_id], backref='referrals_made')
     referred = db.relationship('User', foreign_keys=[referred_id], backref='referrals_received')
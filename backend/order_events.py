@@ -0,0 +1,92 @@
+"""Лента изменений заказов внутри процесса.
+
+create_order и update_order_status публикуют событие после commit, клиенты
+получают его через long-poll (/api/orders/events) или SSE (/api/orders/stream)
+вместо периодического опроса /api/orders/all.
+
+У каждого события свой номер (version), клиент передаёт последний полученный
+номер и получает только новые события. Хранятся последние MAX_EVENTS событий;
+если клиент отстал сильнее, в ответе reset=True — нужно перечитать список
+заказов (например, через updated_since, см. order_sync.py).
+
+Лента живёт в памяти одного процесса: при запуске нескольких воркеров
+события видят только клиенты того воркера, который изменил заказ.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+MAX_EVENTS = 1000
+HEARTBEAT_SECONDS = 15
+
+
+class OrderEvents:
+    def __init__(self, max_events=MAX_EVENTS):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=max_events)
+        self.version = 0
+
+    def publish(self, event_type, order):
+        """Опубликовать событие по заказу (словарь order_to_dict) и вернуть его номер"""
+        with self._cond:
+            self.version += 1
+            self._events.append({
+                'version': self.version,
+                'type': event_type,
+                'order_id': order.get('id'),
+                'user_id': order.get('user_id'),
+                'status': order.get('status'),
+                'order': order,
+            })
+            self._cond.notify_all()
+            return self.version
+
+    def _since(self, version):
+        """(события новее version, reset) — вызывать под self._cond"""
+        if version > self.version:
+            # Номера сбросились (перезапуск сервера)
+            return [], True
+        if not self._events or version >= self.version:
+            return [], False
+        first = self._events[0]['version']
+        reset = version < first - 1
+        return [e for e in self._events if e['version'] > version], reset
+
+    def wait(self, version, timeout, user_filter=None):
+        """Ждать событий новее version не дольше timeout секунд.
+
+        user_filter(event) -> bool отбирает события, видимые клиенту;
+        возвращает (события, reset, текущий номер).
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events, reset = self._since(version)
+                if user_filter is not None:
+                    events = [e for e in events if user_filter(e)]
+                if events or reset:
+                    return events, reset, self.version
+                # Чужие события тоже продвигают номер, чтобы не получать их снова
+                version = self.version
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False, self.version
+                self._cond.wait(remaining)
+
+    def stream(self, version, user_filter=None, heartbeat=HEARTBEAT_SECONDS):
+        """Генератор строк text/event-stream; пустой комментарий раз в heartbeat секунд"""
+        yield 'retry: 3000\n\n'
+        while True:
+            events, reset, current = self.wait(version, heartbeat, user_filter)
+            if reset:
+                yield f'id: {current}\nevent: reset\ndata: {{}}\n\n'
+            for event in events:
+                data = json.dumps(event, ensure_ascii=False, default=str)
+                yield f"id: {event['version']}\nevent: {event['type']}\ndata: {data}\n\n"
+            if not events and not reset:
+                yield ': ping\n\n'
+            version = current
+
+
+order_events = OrderEvents()
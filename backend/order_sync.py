@@ -0,0 +1,125 @@
+"""Постраничная выдача и синхронизация списка заказов.
+
+Режимы (параметры запроса):
+- без параметров — весь список, как раньше (новые сверху);
+- limit / cursor — страница по ключу (created_at, id), новые сверху;
+  cursor берётся из next_cursor предыдущего ответа;
+- updated_since — только заказы, изменённые после метки (по ключу
+  (updated_at, id), старые изменения сначала). Метка — sync_token или
+  next_since из прошлого ответа либо время в ISO-формате.
+
+updated_at ставится часами приложения до commit, поэтому заказ может
+стать видимым позже заказов с меньшей меткой. Пока has_more, next_since
+точный; на последней странице он отступает на SYNC_OVERLAP от начала
+синхронизации, и следующий запрос повторит недавние изменения. Клиент
+сохраняет заказы по id, так что повторы безвредны.
+
+Заказы без created_at/updated_at (старые строки) в постраничную выдачу по
+этому ключу не попадают — курсор для них не построить.
+
+Запросы опираются на индексы orders(created_at, id) и orders(updated_at, id).
+"""
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from models import Order
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+# Дольше любой транзакции записи заказа
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def encode_cursor(moment, order_id, floor=None):
+    """Курсор (время, id); floor — точка повтора для updated_since"""
+    if moment is None:
+        raise ValueError('Нет времени для курсора')
+    raw = f'{moment.isoformat()}|{order_id}'
+    if floor is not None:
+        raw += f'|{floor.isoformat()}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(token):
+    """(datetime, id, floor или None); время в ISO-формате даёт (время, 0, None)"""
+    try:
+        return datetime.fromisoformat(token), 0, None
+    except ValueError:
+        pass
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        parts = raw.split('|')
+        if len(parts) not in (2, 3):
+            raise ValueError(raw)
+        floor = datetime.fromisoformat(parts[2]) if len(parts) == 3 else None
+        return datetime.fromisoformat(parts[0]), int(parts[1]), floor
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Неверный курсор')
+
+
+def decode_cursor(token):
+    """(datetime, id) из курсора; время в ISO-формате даёт (время, 0)"""
+    return _decode(token)[:2]
+
+
+def _limit(args):
+    limit = args.get('limit', type=int) or DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _sync_token(query):
+    """Метка последнего изменения среди заказов запроса — отправная точка для updated_since"""
+    last = (query.order_by(None)
+            .filter(Order.updated_at.isnot(None))
+            .order_by(Order.updated_at.desc(), Order.id.desc())
+            .with_entities(Order.updated_at, Order.id)
+            .first())
+    return encode_cursor(last[0], last[1]) if last and last[0] else None
+
+
+def page_orders(query, args):
+    """Заказы по параметрам запроса и дополнительные поля ответа.
+
+    query — Order.query (с фильтрами и options), args — request.args.
+    ValueError — неверный курсор или метка.
+    """
+    since = args.get('updated_since')
+    if since:
+        moment, last_id, floor = _decode(since)
+        if floor is None:
+            # Начало синхронизации: всё, что ещё не закоммичено, новее этой точки
+            floor = datetime.utcnow() - SYNC_OVERLAP
+        limit = _limit(args)
+        rows = (query
+                .filter(or_(Order.updated_at > moment, and_(Order.updated_at == moment, Order.id > last_id)))
+                .order_by(Order.updated_at.asc(), Order.id.asc())
+                .limit(limit + 1)
+                .all())
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if has_more:
+            next_since = encode_cursor(rows[-1].updated_at, rows[-1].id, floor)
+        else:
+            last = rows[-1].updated_at if rows else moment
+            next_since = encode_cursor(min(last, floor), 0)
+        return rows, {'next_since': next_since, 'has_more': has_more}
+
+    extra = {'sync_token': _sync_token(query)}
+    query = query.order_by(Order.created_at.desc(), Order.id.desc())
+    cursor = args.get('cursor')
+    if not cursor and 'limit' not in args:
+        # Старое поведение: весь список
+        return query.all(), extra
+    query = query.filter(Order.created_at.isnot(None))
+    if cursor:
+        moment, last_id = decode_cursor(cursor)
+        query = query.filter(or_(Order.created_at < moment, and_(Order.created_at == moment, Order.id < last_id)))
+    limit = _limit(args)
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    extra['next_cursor'] = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    extra['has_more'] = has_more
+    return rows, extra
@@ -0,0 +1,147 @@
+"""Расчёт стоимости заказа на сервере.
+
+Цены берутся только из каталога: цены и суммы, присланные клиентом,
+не используются. Таблица цен {(тип, id): цена} строится одним запросом
+на тип товара и хранится до изменения каталога: в этом процессе (версия
+catalog_cache) или в другом (db_fingerprint роллов, сетов и прочих
+товаров), но не дольше MAX_AGE_SECONDS. Оформление заказа делает один
+лёгкий запрос отпечатка вместо выборки цен.
+
+resolve_cart() один раз считает строки и итог; по тем же строкам
+create_order создаёт OrderItem. Баллы и карты списывает loyalty_redemption
+в той же транзакции.
+"""
+import math
+import threading
+import time
+
+from models import db, Roll, Set, OtherItem
+from catalog_cache import catalog_cache, db_fingerprint, MAX_AGE_SECONDS
+from loyalty_redemption import loyalty_roll_ids
+
+# Тип позиции -> (модель, колонка цены)
+PRICED_TYPES = {
+    'roll': (Roll, Roll.sale_price),
+    'set': (Set, Set.set_price),
+    'other_item': (OtherItem, OtherItem.sale_price),
+}
+
+
+class PricingError(ValueError):
+    """Позицию заказа нельзя оценить (нет товара, неверное количество)"""
+
+
+class PricedLine:
+    def __init__(self, item_type, item_id, quantity, unit_price):
+        self.item_type = item_type
+        self.item_id = item_id
+        self.quantity = quantity
+        self.unit_price = unit_price
+
+    @property
+    def total_price(self):
+        return self.unit_price * self.quantity
+
+
+class PricedCart:
+    def __init__(self):
+        self.lines = []  # позиции, которые станут OrderItem
+        self.discount = 0  # скидка бонусными баллами (целые баллы, >= 0)
+
+    @property
+    def has_paid_items(self):
+        return any(line.item_type in PRICED_TYPES and line.unit_price > 0 for line in self.lines)
+
+    @property
+    def total(self):
+        return sum(line.total_price for line in self.lines) - self.discount
+
+
+class PriceTable:
+    def __init__(self, cache, max_age=MAX_AGE_SECONDS):
+        self.cache = cache
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0
+        self._prices = {}
+
+    def prices(self):
+        """{(тип, id): цена} для всех товаров каталога"""
+        version = (self.cache.version, db_fingerprint(*(model for model, _ in PRICED_TYPES.values())))
+        with self._lock:
+            if self._version == version and time.monotonic() - self._built_at < self.max_age:
+                return self._prices
+        built_at = time.monotonic()
+        prices = {}
+        for item_type, (model, price_column) in PRICED_TYPES.items():
+            for item_id, price in db.session.query(model.id, price_column):
+                prices[(item_type, item_id)] = price or 0.0
+        with self._lock:
+            if self.cache.version == version[0]:
+                self._version, self._built_at, self._prices = version, built_at, prices
+        return prices
+
+
+price_table = PriceTable(catalog_cache)
+
+
+def _quantity(item):
+    quantity = item.get('quantity', 1)
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+        raise PricingError(f"Неверное количество: {quantity!r}")
+    return quantity
+
+
+def _bonus_amount(item):
+    """Сумма списания бонусов из позиции bonus_points: |price| * quantity"""
+    try:
+        amount = abs(float(item.get('price') or 0)) * float(item.get('quantity') or 1)
+    except (TypeError, ValueError):
+        raise PricingError(f"Неверная сумма бонусов: {item.get('price')!r}")
+    if not math.isfinite(amount):
+        raise PricingError(f"Неверная сумма бонусов: {item.get('price')!r}")
+    return amount
+
+
+def resolve_cart(items, bonus_balance=0, loyalty_cards=0):
+    """PricedCart по позициям корзины или запроса ({item_type, item_id, quantity}).
+
+    loyalty_roll — бесплатный ролл (цена 0) из LoyaltyRoll: одна позиция с
+    quantity 1 на каждую из loyalty_cards заполненных карт пользователя.
+    bonus_points — скидка в целых баллах: сумма берётся из позиции, но не
+    больше бонусного баланса пользователя.
+    """
+    prices = price_table.prices()
+    cart = PricedCart()
+    free_rolls = None
+    for item in items:
+        item_type = item.get('item_type', 'roll')
+        if item_type == 'bonus_points':
+            requested = int(_bonus_amount(item))
+            cart.discount += min(requested, max(int(bonus_balance) - cart.discount, 0))
+            continue
+        quantity = _quantity(item)
+        try:
+            item_id = int(item.get('item_id'))
+        except (TypeError, ValueError):
+            raise PricingError(f"Неверный товар: {item.get('item_id')!r}")
+        if item_type == 'loyalty_roll':
+            if free_rolls is None:
+                free_rolls = loyalty_roll_ids()
+            if item_id not in free_rolls:
+                raise PricingError(f"Ролл {item_id} нельзя получить по накопительной карте")
+            if quantity != 1:
+                raise PricingError("Бесплатный ролл — одна порция на карту")
+            loyalty_cards -= 1
+            if loyalty_cards < 0:
+                raise PricingError("Нет заполненной накопительной карты для бесплатного ролла")
+            unit_price = 0.0
+        elif item_type in PRICED_TYPES:
+            unit_price = prices.get((item_type, item_id))
+            if unit_price is None:
+                raise PricingError(f"Товар не найден: {item_type} {item_id}")
+        else:
+            raise PricingError(f"Неизвестный тип товара: {item_type}")
+        cart.lines.append(PricedLine(item_type, item_id, quantity, unit_price))
+    return cart
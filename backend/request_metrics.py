@@ -0,0 +1,247 @@
+"""Метрики запросов API и профилирование отдельного запроса.
+
+Для каждого эндпоинта (шаблон маршрута, например /api/orders/<int:order_id>)
+собираются:
+- число ответов по коду статуса;
+- гистограмма времени ответа;
+- размер запроса и ответа;
+- число SQL-запросов и время в них за один HTTP-запрос (события
+  before/after_cursor_execute движка SQLAlchemy).
+
+GET /metrics отдаёт всё в текстовом формате Prometheus. Метрики живут в
+памяти процесса: при нескольких воркерах gunicorn каждый отдаёт свои.
+Доступ — с заголовком X-Metrics-Token, равным SUSHI_METRICS_TOKEN (для
+сборщика метрик), или пользователю, которого пропускает authorize
+приложения; остальным 403.
+
+?__profile=1 вместо ответа возвращает отчёт cProfile по этому запросу
+(?__profile=pyinstrument — HTML pyinstrument, если он установлен).
+Профилирование доступно только при app.debug или SUSHI_PROFILE_REQUESTS=1.
+
+Модуль есть в backend/ и sushiback/ в двух копиях: приложения
+разворачиваются отдельно, каждое из своей папки, общего пакета у них нет.
+Копии совпадают, кроме install() (источник операций: SQL-запросы движка
+или чтение/запись Excel через table_cache), PREFIX и подписей метрик —
+исправления в остальном коде нужно переносить в обе.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+try:
+    import pyinstrument
+except ImportError:  # необязательная зависимость
+    pyinstrument = None
+
+PREFIX = 'sushi'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+PROFILE_LINES = 60
+
+
+def metrics_token_valid():
+    """Заголовок X-Metrics-Token совпадает с SUSHI_METRICS_TOKEN (если он задан)"""
+    expected = os.environ.get('SUSHI_METRICS_TOKEN', '')
+    given = request.headers.get('X-Metrics-Token', '')
+    return bool(expected) and hmac.compare_digest(given.encode(), expected.encode())
+
+
+def profiling_allowed(app):
+    return app.debug or os.environ.get('SUSHI_PROFILE_REQUESTS', '').lower() in ('1', 'on', 'true')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последний — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.responses = {}  # (method, endpoint, status) -> количество
+        self.latency = {}  # (method, endpoint) -> Histogram
+        self.request_size = {}
+        self.response_size = {}
+        self.operations = {}  # (endpoint, вид) -> Histogram числа операций за запрос
+        self.operation_seconds = {}  # (endpoint, вид) -> Histogram времени операций за запрос
+        self.operation_kinds = ()
+        self.app = None
+        self.authorize = None  # () -> bool: текущий пользователь может смотреть /metrics
+
+    # --- сбор ---
+    def observe(self, kind, seconds):
+        """Учесть операцию (SQL-запрос, чтение файла) в текущем HTTP-запросе"""
+        if not has_request_context():
+            return
+        timings = g.get('_metrics_timings')
+        if timings is None:
+            return
+        entry = timings.setdefault(kind, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def _histogram(self, table, key, buckets):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(buckets)
+        return histogram
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_timings = {}
+        with self._lock:
+            self.in_flight += 1
+        mode = request.args.get('__profile')
+        if mode and profiling_allowed(self.app):
+            if mode == 'pyinstrument' and pyinstrument is not None:
+                g._metrics_profiler = pyinstrument.Profiler()
+                g._metrics_profiler.start()
+            else:
+                g._metrics_profiler = cProfile.Profile()
+                g._metrics_profiler.enable()
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        timings = g.pop('_metrics_timings', {})
+        method = request.method
+        endpoint = request.url_rule.rule if request.url_rule else '<unmatched>'
+        response_size = response.calculate_content_length()
+        with self._lock:
+            self.in_flight -= 1
+            key = (method, endpoint, response.status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            self._histogram(self.latency, (method, endpoint), LATENCY_BUCKETS).observe(elapsed)
+            self._histogram(self.request_size, (method, endpoint), SIZE_BUCKETS).observe(request.content_length or 0)
+            if response_size is not None:  # у потоковых ответов (SSE) размера нет
+                self._histogram(self.response_size, (method, endpoint), SIZE_BUCKETS).observe(response_size)
+            for kind in self.operation_kinds:
+                count, seconds = timings.get(kind, (0, 0.0))
+                self._histogram(self.operations, (endpoint, kind), COUNT_BUCKETS).observe(count)
+                self._histogram(self.operation_seconds, (endpoint, kind), LATENCY_BUCKETS).observe(seconds)
+        profiler = g.pop('_metrics_profiler', None)
+        if profiler is not None:
+            return self._profile_response(profiler, response, elapsed, timings)
+        return response
+
+    def _profile_response(self, profiler, response, elapsed, timings):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            out = io.StringIO()
+            out.write(f'{request.method} {request.full_path} -> {response.status_code}, {elapsed * 1000:.1f} мс\n')
+            for kind, (count, seconds) in sorted(timings.items()):
+                out.write(f'{kind}: {count} за {seconds * 1000:.1f} мс\n')
+            out.write('\n')
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            body, mimetype = out.getvalue(), 'text/plain'
+        else:
+            profiler.stop()
+            body, mimetype = profiler.output_html(), 'text/html'
+        result = self.app.response_class(body, mimetype=mimetype)
+        result.headers['X-Profiled-Status'] = str(response.status_code)
+        return result
+
+    # --- выдача ---
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+        def histograms(name, table, label_names):
+            for key, histogram in sorted(table.items()):
+                lines.extend(histogram.lines(f'{PREFIX}_{name}', tuple(zip(label_names, key))))
+
+        with self._lock:
+            header('process_start_time_seconds', 'gauge', 'Время запуска процесса (unix)')
+            lines.append(f'{PREFIX}_process_start_time_seconds {self.started_at}')
+            header('http_requests_in_flight', 'gauge', 'Запросы в обработке')
+            lines.append(f'{PREFIX}_http_requests_in_flight {self.in_flight}')
+            header('http_responses_total', 'counter', 'Ответы по эндпоинтам и кодам')
+            for (method, endpoint, status), count in sorted(self.responses.items()):
+                labels = (('method', method), ('endpoint', endpoint), ('status', status))
+                lines.append(f'{PREFIX}_http_responses_total{_labels(labels)} {count}')
+            header('http_request_duration_seconds', 'histogram', 'Время ответа')
+            histograms('http_request_duration_seconds', self.latency, ('method', 'endpoint'))
+            header('http_request_size_bytes', 'histogram', 'Размер тела запроса')
+            histograms('http_request_size_bytes', self.request_size, ('method', 'endpoint'))
+            header('http_response_size_bytes', 'histogram', 'Размер тела ответа')
+            histograms('http_response_size_bytes', self.response_size, ('method', 'endpoint'))
+            header('request_operations', 'histogram', 'Операций (SQL-запросов) за HTTP-запрос')
+            histograms('request_operations', self.operations, ('endpoint', 'kind'))
+            header('request_operation_seconds', 'histogram', 'Время операций (SQL) за HTTP-запрос')
+            histograms('request_operation_seconds', self.operation_seconds, ('endpoint', 'kind'))
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        if not (metrics_token_valid() or (self.authorize is not None and self.authorize())):
+            return self.app.response_class('Доступ запрещен\n', status=403, mimetype='text/plain; charset=utf-8')
+        return self.app.response_class(self.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    # --- подключение ---
+    def install(self, app, engine):
+        """Подключить сбор метрик к приложению и SQL-запросам engine"""
+        self.app = app
+        self.operation_kinds = ('sql',)
+        # Первыми в before_request и последними в after_request — замер всего запроса
+        app.before_request_funcs.setdefault(None, []).insert(0, self._before_request)
+        app.after_request_funcs.setdefault(None, []).insert(0, self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _query_started(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('_metrics_query_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _query_finished(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info['_metrics_query_started'].pop()
+            self.observe('sql', time.perf_counter() - started)
+
+        @event.listens_for(engine, 'handle_error')
+        def _query_failed(context):
+            stack = context.connection.info.get('_metrics_query_started') if context.connection else None
+            if stack:
+                self.observe('sql', time.perf_counter() - stack.pop())
+
+
+request_metrics = RequestMetrics()
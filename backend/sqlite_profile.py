@@ -0,0 +1,103 @@
+"""Настройки SQLite для API (app_sqlite.py).
+
+На каждое новое соединение выставляются PRAGMA:
+- journal_mode=WAL — читатели не ждут писателя, писатель не ждёт читателей;
+- synchronous=NORMAL — в режиме WAL безопасно и без fsync на каждый commit;
+- busy_timeout — вместо мгновенного «database is locked» ждём освобождения
+  блокировки до BUSY_TIMEOUT_MS;
+- mmap_size, cache_size — чтение страниц из памяти;
+- foreign_keys=ON — проверка внешних ключей.
+
+Пул соединений (QueuePool) держит POOL_SIZE открытых соединений, так что
+PRAGMA выполняются один раз на соединение, а не на запрос.
+
+SUSHI_SQLITE_PROFILE=off отключает профиль (настройки SQLite по умолчанию) —
+для сравнения в benchmark_sqlite_profile.py.
+"""
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+
+BUSY_TIMEOUT_MS = 5000
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # в КиБ (отрицательное значение), ~20 МБ
+    'foreign_keys': 'ON',
+}
+
+# Значения, которые возвращает PRAGMA при чтении
+EXPECTED = {
+    'journal_mode': 'wal',
+    'synchronous': 1,
+    'busy_timeout': BUSY_TIMEOUT_MS,
+    'cache_size': -20000,
+    'foreign_keys': 1,
+}
+
+
+def enabled():
+    return os.environ.get('SUSHI_SQLITE_PROFILE', 'on').lower() not in ('off', '0', 'false')
+
+
+def engine_options():
+    """SQLALCHEMY_ENGINE_OPTIONS для профиля"""
+    if not enabled():
+        return {}
+    return {
+        'poolclass': QueuePool,
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': 30,
+        'connect_args': {
+            'timeout': BUSY_TIMEOUT_MS / 1000,
+            # Соединения пула переходят между потоками сервера
+            'check_same_thread': False,
+        },
+    }
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def install(engine):
+    """Выставлять PRAGMA на каждое новое соединение engine"""
+    if enabled() and not event.contains(engine, 'connect', _set_pragmas):
+        event.listen(engine, 'connect', _set_pragmas)
+
+
+def effective_settings(engine):
+    """{pragma: значение} на реальном соединении из пула"""
+    with engine.connect() as connection:
+        settings = {name: connection.execute(text(f'PRAGMA {name}')).scalar() for name in PRAGMAS}
+    settings['pool'] = type(engine.pool).__name__
+    settings['pool_size'] = engine.pool.size() if hasattr(engine.pool, 'size') else None
+    return settings
+
+
+def self_check(engine):
+    """Напечатать действующие настройки и вернуть список расхождений с профилем"""
+    settings = effective_settings(engine)
+    problems = []
+    if enabled():
+        for name, expected in EXPECTED.items():
+            if str(settings.get(name)).lower() != str(expected).lower():
+                problems.append(f'{name}={settings.get(name)} (ожидалось {expected})')
+    print('🗄️  Профиль SQLite:', 'включен' if enabled() else 'выключен (SUSHI_SQLITE_PROFILE=off)')
+    for name, value in settings.items():
+        print(f'   - {name}: {value}')
+    for problem in problems:
+        print(f'⚠️  {problem}')
+    return problems
@@ -0,0 +1,115 @@
+"""Резервирование ингредиентов под заказы.
+
+При создании заказа позиции (роллы, бесплатные роллы и сеты через SetRoll)
+раскладываются на потребность в ингредиентах, и каждый ингредиент
+списывается условным UPDATE ... WHERE stock_quantity >= :need в той же
+транзакции, что и заказ. Если какого-то ингредиента не хватает, UPDATE не
+затрагивает строку, вызывается InsufficientStock, и откат транзакции
+возвращает всё, что успели списать. Проверка и списание — одна операция
+в БД, поэтому одновременные заказы не могут продать больше остатка.
+
+Списанное записывается в stock_reservations. При отмене заказа до начала
+приготовления (PRE_PRODUCTION_STATUSES) оно возвращается на склад
+(release), после — ингредиенты считаются израсходованными и резерв просто
+закрывается (consume). Заказ, возвращённый из отмены в работу, резервирует
+склад заново (reserve_order).
+"""
+from sqlalchemy import update
+
+from models import db, Ingredient, RollIngredient, SetRoll, StockReservation, OrderItem
+
+# Позиции, за которыми стоит ролл с рецептом
+ROLL_ITEM_TYPES = ('roll', 'loyalty_roll')
+CANCELLED_STATUSES = ('Отменен', 'cancelled')
+# Заказ ещё не начали готовить: отмена возвращает ингредиенты на склад
+PRE_PRODUCTION_STATUSES = ('Принят', 'pending', 'confirmed')
+
+
+class InsufficientStock(Exception):
+    def __init__(self, ingredient_id, name=None):
+        self.ingredient_id = ingredient_id
+        self.name = name
+        super().__init__(f"Недостаточно ингредиента '{name or ingredient_id}' на складе")
+
+
+def ingredient_requirements(items):
+    """{ingredient_id: количество} для позиций заказа [(item_type, item_id, quantity), ...]"""
+    roll_counts = {}
+    set_counts = {}
+    for item_type, item_id, quantity in items:
+        try:
+            item_id, quantity = int(item_id), int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if item_type in ROLL_ITEM_TYPES:
+            roll_counts[item_id] = roll_counts.get(item_id, 0) + quantity
+        elif item_type == 'set':
+            set_counts[item_id] = set_counts.get(item_id, 0) + quantity
+
+    # Сеты раскладываются на роллы одним запросом
+    if set_counts:
+        for set_id, roll_id, per_set in (db.session.query(SetRoll.set_id, SetRoll.roll_id, SetRoll.quantity)
+                                         .filter(SetRoll.set_id.in_(set_counts))):
+            roll_counts[roll_id] = roll_counts.get(roll_id, 0) + set_counts[set_id] * (per_set or 1)
+
+    needs = {}
+    if roll_counts:
+        for roll_id, ingredient_id, amount in (db.session.query(RollIngredient.roll_id, RollIngredient.ingredient_id,
+                                                                RollIngredient.amount_per_roll)
+                                               .filter(RollIngredient.roll_id.in_(roll_counts))):
+            if amount and amount > 0:
+                needs[ingredient_id] = needs.get(ingredient_id, 0) + roll_counts[roll_id] * amount
+    return needs
+
+
+def reserve(order_id, needs):
+    """Списать needs со склада и записать резерв заказа. Commit — за вызывающим кодом.
+
+    InsufficientStock, если хоть одного ингредиента не хватает: транзакцию
+    нужно откатить.
+    """
+    # Один порядок обхода для всех заказов
+    for ingredient_id in sorted(needs):
+        need = needs[ingredient_id]
+        result = db.session.execute(
+            update(Ingredient)
+            .where(Ingredient.id == ingredient_id, Ingredient.stock_quantity >= need)
+            .values(stock_quantity=Ingredient.stock_quantity - need)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            ingredient = db.session.get(Ingredient, ingredient_id)
+            raise InsufficientStock(ingredient_id, ingredient.name if ingredient else None)
+        db.session.add(StockReservation(order_id=order_id, ingredient_id=ingredient_id, amount=need))
+
+
+def release(order_id):
+    """Вернуть на склад всё, что зарезервировано под заказ. Commit — за вызывающим кодом."""
+    reservations = StockReservation.query.filter_by(order_id=order_id).all()
+    for reservation in reservations:
+        db.session.execute(
+            update(Ingredient)
+            .where(Ingredient.id == reservation.ingredient_id)
+            .values(stock_quantity=Ingredient.stock_quantity + reservation.amount)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.delete(reservation)
+    return len(reservations)
+
+
+def consume(order_id):
+    """Закрыть резерв без возврата на склад (ингредиенты израсходованы). Commit — за вызывающим кодом."""
+    return StockReservation.query.filter_by(order_id=order_id).delete(synchronize_session=False)
+
+
+def cancel_reservation(order_id, old_status):
+    """Резерв при отмене заказа из статуса old_status: вернуть на склад или закрыть"""
+    if old_status in PRE_PRODUCTION_STATUSES:
+        return release(order_id)
+    return consume(order_id)
+
+
+def reserve_order(order):
+    """Снова зарезервировать склад под позиции заказа (возврат из отмены); InsufficientStock"""
+    items = db.session.query(OrderItem.item_type, OrderItem.item_id, OrderItem.quantity).filter_by(order_id=order.id)
+    reserve(order.id, ingredient_requirements(items))
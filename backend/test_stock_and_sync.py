@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Проверка резерва склада, отмены заказов, хуков admin_stats и курсоров заказов.
+
+В отличие от остальных test_*.py сервер не нужен: скрипт берёт копию
+sushi_express.db с миграциями (как explain_query_plans.py) и вызывает API
+через Flask test client. Проверяется:
+- резерв: заказ больше остатка — 409 без списания, ровно на остаток — 201;
+- отмена возвращает резерв, повторная отмена (и статус «Отменен» ещё раз)
+  склад не меняет;
+- клиент не может отменить готовый заказ, отмена готового заказа склад не
+  пополняет, возврат из отмены резервирует склад заново или даёт 409;
+- бесплатный ролл — только из LoyaltyRoll и по заполненной карте (одна
+  позиция на карту), баллы списываются с баланса и возвращаются при отмене;
+- статистика после хуков совпадает с пересчётом с нуля;
+- limit/cursor и updated_since проходят все заказы без пропусков и повторов,
+  а заказ, закоммиченный с опозданием, приходит в следующей синхронизации.
+
+    python test_stock_and_sync.py
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+from explain_query_plans import prepare_database
+
+CUSTOMER_ID = 25
+ADMIN_ID = 26
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def __call__(self, condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            self.failed += 1
+
+
+def test_stock_and_sync():
+    os.environ['SUSHI_DB_PATH'] = os.path.join(prepare_database(), 'sushi_express.db')
+    import app_sqlite
+    from flask_jwt_extended import create_access_token
+    from models import db, Ingredient, LoyaltyCard, LoyaltyCardUsage, LoyaltyRoll, Order, OtherItem, RollIngredient, User
+    from admin_stats import admin_stats, build_snapshot, snapshot_to_dict
+
+    app = app_sqlite.app
+    client = app.test_client()
+    check = Checks()
+    with app.app_context():
+        customer = {'Authorization': f'Bearer {create_access_token(identity=str(CUSTOMER_ID))}'}
+        admin = {'Authorization': f'Bearer {create_access_token(identity=str(ADMIN_ID))}'}
+
+    def stock(ingredient_ids):
+        with app.app_context():
+            return {i.id: i.stock_quantity for i in Ingredient.query.filter(Ingredient.id.in_(ingredient_ids))}
+
+    def order(quantity):
+        return client.post('/api/orders', headers=customer, json={
+            'items': [{'item_type': 'roll', 'item_id': roll_id, 'quantity': quantity}]})
+
+    def stats_match():
+        with app.app_context():
+            return admin_stats.stats() == snapshot_to_dict(build_snapshot())
+
+    # Ролл с рецептом; остатков ингредиентов ровно на одну порцию
+    with app.app_context():
+        roll_id = db.session.query(RollIngredient.roll_id).order_by(RollIngredient.roll_id).first()[0]
+        recipe = {r.ingredient_id: r.amount_per_roll for r in RollIngredient.query.filter_by(roll_id=roll_id)}
+        for ingredient in Ingredient.query.filter(Ingredient.id.in_(recipe)):
+            ingredient.stock_quantity = recipe[ingredient.id]
+        db.session.commit()
+    one_portion = stock(recipe)
+    client.get('/api/admin/stats', headers=admin)  # снимок статистики для проверки хуков
+
+    print("\n📝 Резерв склада")
+    response = order(2)
+    check(response.status_code == 409, f"заказ 2 порций при остатке на 1: {response.status_code}")
+    check(stock(recipe) == one_portion, "после отказа склад не изменился")
+    response = order(1)
+    check(response.status_code == 201, f"заказ 1 порции: {response.status_code}")
+    order_id = response.get_json().get('order', {}).get('id')
+    check(all(abs(v) < 1e-9 for v in stock(recipe).values()), "остаток списан полностью")
+    response = order(1)
+    check(response.status_code == 409, f"следующий заказ без остатка: {response.status_code}")
+    check(stats_match(), "статистика после order_created совпадает с пересчётом")
+
+    print("\n📝 Отмена заказа")
+    response = client.put(f'/api/orders/{order_id}/cancel', headers=customer)
+    check(response.status_code == 200, f"отмена: {response.status_code}")
+    check(stock(recipe) == one_portion, "резерв вернулся на склад")
+    response = client.put(f'/api/orders/{order_id}/cancel', headers=customer)
+    check(response.status_code == 400, f"повторная отмена: {response.status_code}")
+    response = client.put(f'/api/orders/{order_id}/status', headers=admin, json={'status': 'Отменен'})
+    check(response.status_code == 200, f"статус «Отменен» ещё раз: {response.status_code}")
+    check(stock(recipe) == one_portion, "повторная отмена склад не меняет")
+    check(stats_match(), "статистика после status_changed совпадает с пересчётом")
+
+    print("\n📝 Переходы статусов")
+    def set_status(status):
+        return client.put(f'/api/orders/{order_id}/status', headers=admin, json={'status': status})
+    response = set_status('Принят')
+    check(response.status_code == 200, f"возврат из отмены: {response.status_code}")
+    check(all(abs(v) < 1e-9 for v in stock(recipe).values()), "возврат из отмены резервирует склад заново")
+    set_status('Готов')
+    response = client.put(f'/api/orders/{order_id}/cancel', headers=customer)
+    check(response.status_code == 409, f"клиент отменяет готовый заказ: {response.status_code}")
+    response = set_status('Отменен')
+    check(response.status_code == 200 and all(abs(v) < 1e-9 for v in stock(recipe).values()),
+          "отмена готового заказа не возвращает израсходованное на склад")
+    response = set_status('Принят')
+    check(response.status_code == 409, f"возврат из отмены без остатка: {response.status_code}")
+    with app.app_context():
+        status = db.session.get(Order, order_id).status
+    check(status == 'Отменен', f"после отказа заказ остался отменённым: {status}")
+    check(stats_match(), "статистика после переходов совпадает с пересчётом")
+
+    print("\n📝 Бесплатные роллы и бонусные баллы")
+    with app.app_context():
+        free_roll = db.session.query(LoyaltyRoll.roll_id).filter(LoyaltyRoll.is_available.is_(True)).first()[0]
+        other_roll = db.session.query(RollIngredient.roll_id).filter(
+            RollIngredient.roll_id.notin_(db.session.query(LoyaltyRoll.roll_id))).first()[0]
+        paid_item = {'item_type': 'other_item', 'item_id': db.session.query(OtherItem.id).first()[0], 'quantity': 1}
+        for ingredient in Ingredient.query.filter(Ingredient.id.in_(recipe)):
+            ingredient.stock_quantity = 1000  # общие ингредиенты (рис, нори) после проверок выше на нуле
+        db.session.get(User, CUSTOMER_ID).bonus_points = 100
+        db.session.add(LoyaltyCard(user_id=CUSTOMER_ID, card_number='LC-TEST', filled_rolls=8, is_completed=True))
+        db.session.commit()
+
+    def order_with(*extra):
+        return client.post('/api/orders', headers=customer, json={'items': [paid_item, *extra]})
+
+    def free(roll, quantity=1):
+        return {'item_type': 'loyalty_roll', 'item_id': roll, 'quantity': quantity}
+
+    def bonus(points):
+        return {'item_type': 'bonus_points', 'item_id': 0, 'price': -points, 'quantity': 1}
+
+    def balance():
+        with app.app_context():
+            return db.session.get(User, CUSTOMER_ID).bonus_points
+
+    def used_cards():
+        with app.app_context():
+            return LoyaltyCardUsage.query.filter_by(user_id=CUSTOMER_ID).count()
+
+    response = order_with(free(other_roll))
+    check(response.status_code == 400, f"бесплатный ролл не из LoyaltyRoll: {response.status_code}")
+    response = order_with(free(free_roll, 2))
+    check(response.status_code == 400, f"две порции по одной карте: {response.status_code}")
+    response = order_with(free(free_roll), free(free_roll))
+    check(response.status_code == 400, f"две позиции по одной карте: {response.status_code}")
+    response = order_with(free(free_roll), bonus(30))
+    check(response.status_code == 201, f"ролл по карте и 30 баллов: {response.status_code}")
+    loyalty_order = response.get_json().get('order', {}).get('id')
+    check(used_cards() == 1 and balance() == 70, f"карта погашена, баланс {balance()}")
+    response = order_with(free(free_roll))
+    check(response.status_code == 400, f"повторный ролл по погашенной карте: {response.status_code}")
+    response = order_with(bonus(500))
+    check(response.status_code == 201 and balance() == 0, f"скидка не больше баланса, баланс {balance()}")
+    response = client.put(f'/api/orders/{loyalty_order}/cancel', headers=customer)
+    check(response.status_code == 200 and used_cards() == 0 and balance() == 30,
+          f"отмена возвращает карту и баллы, баланс {balance()}")
+    response = client.put(f'/api/orders/{loyalty_order}/status', headers=admin, json={'status': 'Принят'})
+    check(response.status_code == 200 and used_cards() == 1 and balance() == 0,
+          f"возврат из отмены списывает карту и баллы заново, баланс {balance()}")
+    client.put(f'/api/orders/{loyalty_order}/cancel', headers=customer)
+    with app.app_context():
+        db.session.get(User, CUSTOMER_ID).bonus_points = 0
+        db.session.commit()
+    response = client.put(f'/api/orders/{loyalty_order}/status', headers=admin, json={'status': 'Принят'})
+    check(response.status_code == 409 and used_cards() == 0, f"возврат из отмены без баллов: {response.status_code}")
+    check(stats_match(), "статистика после заказов с баллами совпадает с пересчётом")
+
+    print("\n📝 Курсоры списка заказов")
+    with app.app_context():
+        expected = {o.id for o in Order.query.filter(Order.created_at.isnot(None))}
+        synced = {o.id for o in Order.query.filter(Order.updated_at.isnot(None))}
+    seen, cursor = [], None
+    while True:
+        page = client.get('/api/orders/all', headers=admin,
+                          query_string={'limit': 7, **({'cursor': cursor} if cursor else {})}).get_json()
+        seen += [o['id'] for o in page['orders']]
+        cursor = page['next_cursor']
+        if not page['has_more']:
+            break
+    check(len(seen) == len(set(seen)) and set(seen) == expected,
+          f"limit/cursor: {len(seen)} заказов из {len(expected)}, без повторов")
+
+    seen, since = [], '2000-01-01T00:00:00'
+    while True:
+        page = client.get('/api/orders/all', headers=admin,
+                          query_string={'updated_since': since, 'limit': 7}).get_json()
+        seen += [o['id'] for o in page['orders']]
+        since = page['next_since']
+        if not page['has_more']:
+            break
+    check(set(seen) == synced, f"updated_since: {len(set(seen))} заказов из {len(synced)}")
+
+    # Заказ закоммичен позже, но с меткой времени раньше последней синхронизации
+    late = datetime.utcnow() - timedelta(seconds=10)
+    with app.app_context():
+        db.session.execute(db.update(Order).where(Order.id == order_id).values(updated_at=late))
+        db.session.commit()
+    page = client.get('/api/orders/all', headers=admin, query_string={'updated_since': since}).get_json()
+    check(order_id in [o['id'] for o in page['orders']], "заказ с опоздавшим commit пришёл в следующей синхронизации")
+
+    print(f"\n{'🎉 Все проверки пройдены' if not check.failed else f'❌ Не пройдено проверок: {check.failed}'}")
+    assert not check.failed
+
+
+if __name__ == '__main__':
+    try:
+        test_stock_and_sync()
+    except AssertionError:
+        sys.exit(1)
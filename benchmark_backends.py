@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Нагрузочный бенчмарк обоих бэкендов без запущенного сервера.
+
+Для каждого бэкенда во временной папке создаются синтетический каталог и
+история заказов нужного размера (--orders 10000 / 100000 / 1000000),
+затем в отдельном процессе через Flask test client выполняется смесь
+сценариев. Генератор случайных чисел фиксирован (--seed), так что данные
+и последовательность запросов одинаковы от запуска к запуску.
+
+Сценарии:
+- browse   — просмотр меню;
+- cart     — добавление в корзину (только backend/);
+- checkout — оформление заказа;
+- chef     — смена статуса заказа шеф-поваром;
+- report   — отчёты (статистика админки / бухгалтерия и отчёты sushiback).
+
+Результат — JSON с p50/p95/p99 и запросами в секунду по каждому сценарию.
+С --baseline результат сравнивается с прошлым прогоном: если p95 или
+пропускная способность какого-то сценария хуже более чем на --tolerance,
+скрипт завершается с кодом 1.
+
+    python benchmark_backends.py --orders 100000 --requests 3000 --output bench.json
+    python benchmark_backends.py --backends sushiback --mix browse=5,checkout=2,chef=2,report=1
+    python benchmark_backends.py --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ('backend', 'sushiback')
+DEFAULT_MIX = 'browse=50,cart=15,checkout=10,chef=20,report=5'
+# Сценарии с меньшим числом запросов не сравниваются с baseline — слишком шумно
+MIN_COMPARE_REQUESTS = 30
+
+# Размер синтетического каталога
+INGREDIENTS = 60
+ROLLS = 40
+SETS = 12
+OTHER_ITEMS = 10
+HISTORY_DAYS = 365
+CHUNK = 20000
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def parse_mix(text):
+    """'browse=50,chef=20' -> {'browse': 50.0, 'chef': 20.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def summarize(samples, elapsed, threads):
+    """samples: {сценарий: [(секунды, код ответа)]} -> словарь метрик.
+
+    rps сценария — сколько таких запросов в секунду выдержали бы threads
+    потоков, если бы шли только они (по суммарному времени ответов); rps
+    в total — реальная пропускная способность смеси по часам.
+    """
+    def stats(rows, seconds):
+        latencies = [latency for latency, _ in rows]
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for _, status in rows if status >= 400),
+            'rps': round(len(rows) / seconds, 1) if seconds else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+    result = {name: stats(rows, sum(latency for latency, _ in rows) / threads)
+              for name, rows in sorted(samples.items())}
+    result['total'] = stats([row for rows in samples.values() for row in rows], elapsed)
+    return result
+
+
+def drive(scenarios, mix, args):
+    """Выполнить args.requests запросов по смеси сценариев в args.threads потоках.
+
+    scenarios: {имя: функция(clients, rnd) -> код ответа}; clients — результат
+    scenarios['__clients__'](), свой у каждого потока.
+    """
+    names = [name for name in mix if name in scenarios and mix[name] > 0]
+    weights = [mix[name] for name in names]
+    per_thread = max(args.requests // args.threads, 1)
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+
+    def worker(index):
+        rnd = random.Random(args.seed * 1000 + index)
+        clients = scenarios['__clients__']()
+        local = {name: [] for name in names}
+        for step in range(args.warmup + per_thread):
+            name = rnd.choices(names, weights)[0]
+            started = time.perf_counter()
+            status = scenarios[name](clients, rnd)
+            if step >= args.warmup:
+                local[name].append((time.perf_counter() - started, status))
+        with lock:
+            for name, rows in local.items():
+                samples[name].extend(rows)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Прогрев входит во время, но его доля мала; вычитаем её оценку
+    elapsed = time.monotonic() - started
+    measured = sum(len(rows) for rows in samples.values())
+    total = measured + args.warmup * args.threads
+    return summarize(samples, elapsed * measured / total if total else elapsed, args.threads)
+
+
+# ===== backend/ (Flask + SQLAlchemy + SQLite) =====
+
+def seed_backend(app_sqlite, orders, seed):
+    from werkzeug.security import generate_password_hash
+    from models import (db, User, Ingredient, Roll, RollIngredient, Set, SetRoll, OtherItem,
+                        Order, OrderItem)
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    users = max(50, orders // 20)
+    password = generate_password_hash('bench')
+
+    def insert(model, rows):
+        for start in range(0, len(rows), CHUNK):
+            db.session.execute(model.__table__.insert(), rows[start:start + CHUNK])
+
+    with app_sqlite.app.app_context():
+        db.create_all()
+        insert(User, [{
+            'id': i, 'name': f'Пользователь {i}', 'email': f'user{i}@bench.local', 'phone': f'+996{i:09d}',
+            'password_hash': password, 'is_admin': i == 1, 'created_at': now,
+        } for i in range(1, users + 1)])
+        insert(Ingredient, [{
+            'id': i, 'name': f'Ингредиент {i}', 'cost_per_unit': rnd.uniform(1, 50),
+            'price_per_unit': rnd.uniform(1, 60), 'stock_quantity': 1e9, 'unit': 'г',
+        } for i in range(1, INGREDIENTS + 1)])
+        roll_prices = {i: float(rnd.randrange(250, 700, 10)) for i in range(1, ROLLS + 1)}
+        insert(Roll, [{
+            'id': i, 'name': f'Ролл {i}', 'cost_price': price * 0.4, 'sale_price': price,
+        } for i, price in roll_prices.items()])
+        insert(RollIngredient, [{
+            'roll_id': roll_id, 'ingredient_id': ingredient_id, 'amount_per_roll': rnd.uniform(0.01, 0.2),
+        } for roll_id in roll_prices for ingredient_id in rnd.sample(range(1, INGREDIENTS + 1), 5)])
+        set_prices = {i: float(rnd.randrange(1200, 3000, 50)) for i in range(1, SETS + 1)}
+        insert(Set, [{
+            'id': i, 'name': f'Сет {i}', 'cost_price': price * 0.4, 'set_price': price,
+        } for i, price in set_prices.items()])
+        insert(SetRoll, [{
+            'set_id': set_id, 'roll_id': roll_id, 'quantity': 1,
+        } for set_id in set_prices for roll_id in rnd.sample(list(roll_prices), 4)])
+        other_prices = {i: float(rnd.randrange(50, 200, 10)) for i in range(1, OTHER_ITEMS + 1)}
+        insert(OtherItem, [{
+            'id': i, 'name': f'Товар {i}', 'cost_price': price * 0.3, 'sale_price': price,
+            'category': 'другое', 'stock_quantity': 1e6,
+        } for i, price in other_prices.items()])
+
+        catalog = ([('roll', i, p) for i, p in roll_prices.items()]
+                   + [('set', i, p) for i, p in set_prices.items()]
+                   + [('other_item', i, p) for i, p in other_prices.items()])
+        statuses = ['Принят'] * 2 + ['Готовится', 'Готов', 'Доставлен'] * 5 + ['Отменен']
+        order_rows, item_rows = [], []
+        for order_id in range(1, orders + 1):
+            created = now - timedelta(seconds=rnd.randrange(HISTORY_DAYS * 86400))
+            total = 0.0
+            for item_type, item_id, price in rnd.sample(catalog, rnd.randint(1, 3)):
+                quantity = rnd.randint(1, 3)
+                total += price * quantity
+                item_rows.append({
+                    'order_id': order_id, 'item_type': item_type, 'item_id': item_id,
+                    'quantity': quantity, 'unit_price': price, 'total_price': price * quantity,
+                })
+            order_rows.append({
+                'id': order_id, 'user_id': rnd.randint(2, users), 'phone': '+996000000000',
+                'delivery_address': 'Бишкек', 'payment_method': 'cash', 'status': rnd.choice(statuses),
+                'total_price': total, 'created_at': created, 'updated_at': created,
+            })
+            if len(order_rows) >= CHUNK:
+                insert(Order, order_rows)
+                insert(OrderItem, item_rows)
+                order_rows, item_rows = [], []
+        insert(Order, order_rows)
+        insert(OrderItem, item_rows)
+        db.session.commit()
+    return {'users': users, 'rolls': ROLLS, 'sets': SETS, 'orders': orders}
+
+
+def backend_scenarios(app_sqlite, seeded):
+    from flask_jwt_extended import create_access_token
+    with app_sqlite.app.app_context():
+        admin = {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+        users = [{'Authorization': f'Bearer {create_access_token(identity=str(i))}'}
+                 for i in range(2, min(seeded['users'], 200) + 1)]
+    menu = ['/api/rolls', '/api/sets', '/api/other-items']
+
+    def browse(client, rnd):
+        return client.get(rnd.choice(menu)).status_code
+
+    def cart(client, rnd):
+        return client.post('/api/cart/add', headers=rnd.choice(users), json={
+            'item_type': 'roll', 'item_id': rnd.randint(1, seeded['rolls']), 'quantity': 1,
+        }).status_code
+
+    def checkout(client, rnd):
+        return client.post('/api/orders', headers=rnd.choice(users), json={
+            'phone': '+996000000000', 'delivery_address': 'Бишкек',
+            'items': [{'item_type': 'roll', 'item_id': rnd.randint(1, seeded['rolls']), 'quantity': 2},
+                      {'item_type': 'set', 'item_id': rnd.randint(1, seeded['sets']), 'quantity': 1}],
+        }).status_code
+
+    def chef(client, rnd):
+        if rnd.random() < 0.5:
+            return client.get('/api/orders/all?limit=50', headers=admin).status_code
+        return client.put(f'/api/orders/{rnd.randint(1, seeded["orders"])}/status', headers=admin,
+                          json={'status': rnd.choice(['Готовится', 'Готов', 'Доставлен'])}).status_code
+
+    def report(client, rnd):
+        return client.get('/api/admin/stats', headers=admin).status_code
+
+    return {
+        '__clients__': app_sqlite.app.test_client,
+        'browse': browse, 'cart': cart, 'checkout': checkout, 'chef': chef, 'report': report,
+    }
+
+
+def run_backend(args, workdir):
+    os.environ['SUSHI_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    sys.path.insert(0, os.path.join(ROOT, 'backend'))
+    started = time.monotonic()
+    import app_sqlite
+    seeded = seed_backend(app_sqlite, args.orders, args.seed)
+    seed_seconds = time.monotonic() - started
+    return seeded, seed_seconds, backend_scenarios(app_sqlite, seeded)
+
+
+# ===== sushiback/ (Flask + pandas, Excel или SQLite) =====
+
+def seed_sushiback(orders, seed):
+    import numpy as np
+    import pandas as pd
+    from models import (INGREDIENTS_FILE, ROLLS_FILE, ROLL_RECIPES_FILE, ORDERS_FILE, SETS_FILE,
+                        SET_COMPOSITION_FILE, STOCK_HISTORY_FILE, EXPENSES_FILE)
+    from storage import storage
+
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.now().floor('s')
+    roll_ids = np.arange(1, ROLLS + 1)
+    set_ids = np.arange(1, SETS + 1)
+
+    storage.write(INGREDIENTS_FILE, pd.DataFrame({
+        'id': np.arange(1, INGREDIENTS + 1),
+        'name': [f'Ингредиент {i}' for i in range(1, INGREDIENTS + 1)],
+        'quantity': 1e9,
+        'unit': 'г',
+        'price_per_unit': rng.uniform(1, 60, INGREDIENTS).round(2),
+    }))
+    roll_prices = rng.integers(25, 70, ROLLS) * 10.0
+    storage.write(ROLLS_FILE, pd.DataFrame({
+        'id': roll_ids, 'name': [f'Ролл {i}' for i in roll_ids], 'sale_price': roll_prices,
+    }))
+    storage.write(ROLL_RECIPES_FILE, pd.DataFrame({
+        'roll_id': np.repeat(roll_ids, 5),
+        'ingredient_id': np.concatenate([rng.choice(INGREDIENTS, 5, replace=False) + 1 for _ in roll_ids]),
+        'amount_per_roll': rng.uniform(0.01, 0.2, ROLLS * 5).round(3),
+    }))
+    set_prices = rng.integers(24, 60, SETS) * 50.0
+    storage.write(SETS_FILE, pd.DataFrame({
+        'id': set_ids, 'name': [f'Сет {i}' for i in set_ids], 'cost_price': set_prices * 0.4,
+        'retail_price': set_prices * 1.1, 'set_price': set_prices, 'discount_percent': 10.0,
+        'gross_profit': set_prices * 0.6, 'margin_percent': 60.0,
+    }))
+    composition_rolls = np.concatenate([rng.choice(roll_ids, 4, replace=False) for _ in set_ids])
+    storage.write(SET_COMPOSITION_FILE, pd.DataFrame({
+        'set_id': np.repeat(set_ids, 4), 'roll_id': composition_rolls,
+        'roll_name': [f'Ролл {i}' for i in composition_rolls],
+    }))
+
+    is_set = rng.random(orders) < 0.15
+    quantity = rng.integers(1, 4, orders)
+    item_ids = np.where(is_set, rng.choice(set_ids, orders), rng.choice(roll_ids, orders))
+    unit_price = np.where(is_set, set_prices[np.minimum(item_ids, SETS) - 1], roll_prices[item_ids - 1])
+    order_time = now - pd.to_timedelta(rng.integers(0, HISTORY_DAYS * 86400, orders), unit='s')
+    storage.write(ORDERS_FILE, pd.DataFrame({
+        'id': np.arange(1, orders + 1),
+        'roll_id': np.where(is_set, np.nan, item_ids),
+        'set_id': np.where(is_set, item_ids, np.nan),
+        'quantity': quantity,
+        'order_time': order_time.sort_values().strftime('%Y-%m-%d %H:%M:%S'),
+        'total_price': unit_price * quantity,
+        'cost_per_roll': (unit_price * 0.4).round(2),
+        'status': rng.choice(['Принят', 'Готовится', 'Сделан', 'Сделан', 'Сделан'], orders),
+        'comment': '',
+        'order_type': np.where(is_set, 'set', 'roll'),
+    }))
+    deliveries = max(orders // 50, 10)
+    ingredient_ids = rng.integers(1, INGREDIENTS + 1, deliveries)
+    storage.write(STOCK_HISTORY_FILE, pd.DataFrame({
+        'date': (now - pd.to_timedelta(rng.integers(0, HISTORY_DAYS * 86400, deliveries), unit='s'))
+        .sort_values().strftime('%Y-%m-%d %H:%M:%S'),
+        'ingredient_id': ingredient_ids,
+        'ingredient_name': [f'Ингредиент {i}' for i in ingredient_ids],
+        'operation': rng.choice(['Поставка', 'Списание'], deliveries, p=[0.8, 0.2]),
+        'amount': rng.uniform(1, 100, deliveries).round(2),
+        'comment': '',
+    }))
+    storage.write(EXPENSES_FILE, pd.DataFrame({'salary': [100000.0], 'rent': [50000.0]}))
+    return {'rolls': ROLLS, 'sets': SETS, 'orders': orders, 'storage': storage.name}
+
+
+def sushiback_scenarios(app, seeded):
+    today = datetime.now()
+    report_period = {
+        'date_from': (today - timedelta(days=30)).strftime('%Y-%m-%d'),
+        'date_to': today.strftime('%Y-%m-%d'),
+    }
+
+    def clients():
+        result = {}
+        for role in ('chef', 'accountant'):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['role'] = role
+            result[role] = client
+        return result
+
+    def browse(clients, rnd):
+        return clients['chef'].get('/api/menu').status_code
+
+    def checkout(clients, rnd):
+        return clients['chef'].post('/orders', data={
+            'roll_id': rnd.randint(1, seeded['rolls']), 'quantity': rnd.randint(1, 3), 'comment': 'bench',
+        }).status_code
+
+    def chef(clients, rnd):
+        return clients['chef'].post(f'/orders/change_status/{rnd.randint(1, seeded["orders"])}', data={
+            'status': rnd.choice(['Готовится', 'Готов', 'Отправлен']),
+        }).status_code
+
+    def report(clients, rnd):
+        if rnd.random() < 0.5:
+            return clients['chef'].get('/reports').status_code
+        return clients['accountant'].get('/accounting', query_string=report_period).status_code
+
+    return {'__clients__': clients, 'browse': browse, 'checkout': checkout, 'chef': chef, 'report': report}
+
+
+def run_sushiback(args, workdir):
+    # sushiback работает с файлами в текущей папке — берём копию кода без данных
+    source = os.path.join(ROOT, 'sushiback')
+    shutil.copytree(source, workdir, dirs_exist_ok=True, ignore=shutil.ignore_patterns(
+        '*.xlsx', '*.csv', '*.db', '*.db-*', '*.jsonl*', '__pycache__', 'client_pwa'))
+    os.chdir(workdir)
+    os.environ['SUSHI_STORAGE'] = args.sushiback_storage
+    os.environ['SUSHI_DB'] = os.path.join(workdir, 'sushi.db')
+    sys.path.insert(0, workdir)
+    started = time.monotonic()
+    seeded = seed_sushiback(args.orders, args.seed)
+    import app as sushiback_app  # при импорте строятся дневные агрегаты
+    seed_seconds = time.monotonic() - started
+    return seeded, seed_seconds, sushiback_scenarios(sushiback_app.app, seeded)
+
+
+def run_worker(args):
+    """Один бэкенд в отдельном процессе; результат — JSON в stdout"""
+    workdir = tempfile.mkdtemp(prefix=f'bench_{args.worker}_')
+    try:
+        runner = run_backend if args.worker == 'backend' else run_sushiback
+        seeded, seed_seconds, scenarios = runner(args, workdir)
+        results = drive(scenarios, parse_mix(args.mix), args)
+        print(json.dumps({
+            'seeded': seeded,
+            'seed_seconds': round(seed_seconds, 1),
+            'scenarios': results,
+        }, ensure_ascii=False))
+    finally:
+        # Журнал аудита sushiback сбрасывается при выходе — пишем его, пока папка на месте
+        audit_log = sys.modules.get('audit_log')
+        if audit_log is not None:
+            audit_log.audit_sink.flush()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline, tolerance):
+    """Напечатать сравнение с прошлым прогоном; список регрессий"""
+    regressions = []
+    for backend, result in current['results'].items():
+        old = baseline.get('results', {}).get(backend)
+        if not old:
+            continue
+        print(f'\n📊 {backend}: сравнение с {baseline.get("config", {}).get("created_at", "baseline")}')
+        for name, now in result['scenarios'].items():
+            before = old['scenarios'].get(name)
+            if not before or min(before['requests'], now['requests']) < MIN_COMPARE_REQUESTS:
+                continue
+            rps_change = (now['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+            p95_change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            worse = rps_change < -tolerance or p95_change > tolerance
+            print(f"   {'❌' if worse else '✅'} {name:<9} {before['rps']:>8} -> {now['rps']:>8} запр/с "
+                  f"({rps_change:+.0%}), p95 {before['p95_ms']} -> {now['p95_ms']} мс ({p95_change:+.0%})")
+            if worse:
+                regressions.append(f'{backend}/{name}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный бенчмарк backend/ и sushiback/')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='backend,sushiback')
+    parser.add_argument('--orders', type=int, default=10000, help='размер истории заказов')
+    parser.add_argument('--requests', type=int, default=2000, help='запросов на бэкенд')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=20, help='неучитываемых запросов на поток')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='веса сценариев: browse=50,cart=15,...')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sushiback-storage', choices=('sqlite', 'excel'), default='sqlite',
+                        help='хранилище sushiback (excel — только для небольших --orders)')
+    parser.add_argument('--output', help='записать JSON в файл')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='допустимое ухудшение (доля)')
+    parser.add_argument('--worker', choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ('worker', 'output', 'baseline', 'tolerance')}
+    config['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    report = {'config': config, 'results': {}}
+    for backend in [name.strip() for name in args.backends.split(',') if name.strip()]:
+        if backend not in BACKENDS:
+            parser.error(f'неизвестный бэкенд: {backend}')
+        print(f'🏁 {backend}: {args.orders} заказов, {args.requests} запросов, потоков {args.threads}')
+        command = [sys.executable, os.path.abspath(__file__), '--worker', backend]
+        for key in ('orders', 'requests', 'threads', 'warmup', 'mix', 'seed', 'sushiback_storage'):
+            command += [f'--{key.replace("_", "-")}', str(getattr(args, key))]
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+        if result.returncode != 0 or not lines:
+            print(f'❌ {backend}: ошибка прогона\n{result.stderr[-3000:]}')
+            return 2
+        report['results'][backend] = json.loads(lines[-1])
+        scenarios = report['results'][backend]['scenarios']
+        print(f"   данные созданы за {report['results'][backend]['seed_seconds']} с")
+        for name, row in scenarios.items():
+            print(f"   {name:<9} {row['requests']:>6} запр, {row['rps']:>8} запр/с, p50 {row['p50_ms']} мс, "
+                  f"p95 {row['p95_ms']} мс, p99 {row['p99_ms']} мс, ошибок {row['errors']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'💾 Результат: {args.output}')
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Регрессии: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
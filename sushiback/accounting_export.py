@@ -0,0 +1,180 @@
+"""Выгрузка бухгалтерии в Excel.
+
+Книга пишется в режиме openpyxl write-only: строки уходят в файл по одной,
+без промежуточных списков и DataFrame. Каждый запрос пишет в свой
+временный файл, так что одновременные выгрузки не мешают друг другу.
+"""
+import os
+import tempfile
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from models import ORDERS_FILE, ORDER_INGREDIENTS_FILE, EMPLOYEES_FILE, ATTENDANCE_FILE
+from storage import storage
+
+
+def _cell(value):
+    """Значение pandas/numpy -> значение ячейки openpyxl"""
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, (str, int, float, bool, date, datetime)):
+        return value
+    return str(value)
+
+
+def _write_sheet(wb, title, columns, rows):
+    """Лист с заголовком columns; rows — итератор словарей"""
+    ws = wb.create_sheet(title)
+    if columns:
+        ws.append(list(columns))
+    for row in rows:
+        ws.append([_cell(row.get(c)) for c in columns])
+
+
+def _write_frame(wb, title, df):
+    ws = wb.create_sheet(title)
+    ws.append([str(c) for c in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append([_cell(v) for v in row])
+
+
+def _with_column(columns, extra):
+    columns = [str(c) for c in columns]
+    return columns if extra in columns else columns + [extra]
+
+
+def _id_key(value):
+    """Ключ id, одинаковый для 3, 3.0 и '3'"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return int(number) if number.is_integer() else number
+
+
+def _name_index(df, key='id', value='name'):
+    """{id: name} — поиск названий за O(1) вместо перебора таблицы"""
+    if df.empty or key not in df.columns or value not in df.columns:
+        return {}
+    index = {}
+    for k, v in zip(df[key], df[value]):
+        index.setdefault(_id_key(k), v)
+    return index
+
+
+def build_accounting_export(orders, orders_columns, stock_in, stock_out, stock_columns, totals,
+                            roll_costs, ingredients_df, recipes_df):
+    """Записать выгрузку во временный .xlsx и вернуть путь к нему.
+
+    orders/stock_in/stock_out — отфильтрованные строки (Series), totals — лист «Итоги».
+    Файл удаляет вызывающий код после отправки.
+    """
+    roll_names = {rid: roll['name'] for rid, roll in roll_costs.items()}
+    ing_names = _name_index(ingredients_df)
+
+    wb = Workbook(write_only=True)
+    # Для заказов: добавляем roll_name
+    _write_sheet(wb, 'Заказы', _with_column(orders_columns, 'roll_name'), (
+        dict(order, roll_name=roll_names.get(order['roll_id'], str(order['roll_id'])))
+        for order in orders
+    ))
+    # Для поставок/списаний: добавляем ingredient_name
+    def with_ing_name(ops):
+        for op in ops:
+            row = dict(op)
+            row['ingredient_name'] = ing_names.get(_id_key(op.get('ingredient_id'))) or op.get('ingredient_name', '')
+            yield row
+    stock_export_columns = _with_column(stock_columns, 'ingredient_name')
+    _write_sheet(wb, 'Поставки', stock_export_columns, with_ing_name(stock_in))
+    _write_sheet(wb, 'Списания', stock_export_columns, with_ing_name(stock_out))
+    _write_sheet(wb, 'Итоги', list(totals), [totals])
+    # Лист "Роллы"
+    _write_sheet(wb, 'Роллы', ['id', 'Название', 'Себестоимость', 'Цена продажи'], (
+        {'id': rid, 'Название': roll['name'], 'Себестоимость': roll['cost'], 'Цена продажи': roll['sale_price']}
+        for rid, roll in roll_costs.items()
+    ))
+    # Лист "Ингредиенты"
+    def ingredient_rows():
+        for ing in ingredients_df.to_dict(orient='records'):
+            stock_value = (ing.get('quantity') or 0) * (ing.get('price_per_unit') or 0)
+            yield {
+                'id': ing.get('id'),
+                'Название': ing.get('name'),
+                'Остаток': ing.get('quantity'),
+                'Ед. изм.': ing.get('unit'),
+                'Цена за ед.': ing.get('price_per_unit'),
+                'Сумма на складе': round(stock_value, 2)
+            }
+    _write_sheet(wb, 'Ингредиенты', ['id', 'Название', 'Остаток', 'Ед. изм.', 'Цена за ед.', 'Сумма на складе'],
+                 ingredient_rows())
+    # Лист "Рецепты"
+    _write_sheet(wb, 'Рецепты', ['roll_id', 'roll_name', 'ingredient_id', 'ingredient_name', 'amount_per_roll'], (
+        {
+            'roll_id': roll_id,
+            'roll_name': roll_names.get(roll_id, str(roll_id)),
+            'ingredient_id': ingredient_id,
+            'ingredient_name': ing_names.get(_id_key(ingredient_id)) or '',
+            'amount_per_roll': amount
+        }
+        for roll_id, ingredient_id, amount in zip(recipes_df.get('roll_id', []), recipes_df.get('ingredient_id', []),
+                                                  recipes_df.get('amount_per_roll', []))
+    ))
+    # Лист "Расход по заказам"
+    if storage.exists(ORDER_INGREDIENTS_FILE) and storage.exists(ORDERS_FILE):
+        order_ingredients_df = storage.read(ORDER_INGREDIENTS_FILE)
+        orders_df_full = storage.read(ORDERS_FILE)
+        order_roll_map = dict(zip(orders_df_full['id'], orders_df_full['roll_id']))
+        def order_ingredient_rows():
+            for order_id, ingredient_id, used_amount in zip(order_ingredients_df['order_id'],
+                                                            order_ingredients_df['ingredient_id'],
+                                                            order_ingredients_df['used_amount']):
+                roll_id = order_roll_map.get(order_id, '')
+                yield {
+                    'order_id': order_id,
+                    'roll_id': roll_id,
+                    'roll_name': roll_names.get(roll_id, ''),
+                    'ingredient_id': ingredient_id,
+                    'ingredient_name': ing_names.get(_id_key(ingredient_id), ''),
+                    'used_amount': used_amount
+                }
+        _write_sheet(wb, 'Расход по заказам',
+                     ['order_id', 'roll_id', 'roll_name', 'ingredient_id', 'ingredient_name', 'used_amount'],
+                     order_ingredient_rows())
+    # Листы "Сотрудники" и "Посещаемость"
+    if storage.exists(EMPLOYEES_FILE):
+        _write_frame(wb, 'Сотрудники', storage.read(EMPLOYEES_FILE))
+    if storage.exists(ATTENDANCE_FILE):
+        _write_frame(wb, 'Посещаемость', storage.read(ATTENDANCE_FILE))
+
+    fd, path = tempfile.mkstemp(prefix='accounting_export_', suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def stream_file_and_remove(path, chunk_size=65536):
+    """Отдать файл кусками и удалить его, когда ответ закрыт"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
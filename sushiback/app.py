@@ -4,18 +4,32 @@ from models import init_db
 import pandas as pd
 from models import INGREDIENTS_FILE
 from models import ROLLS_FILE
+from models import ROLL_RECIPES_FILE
 from models import ORDERS_FILE
 from datetime import datetime
 from models import ORDER_INGREDIENTS_FILE
+from models import STOCK_HISTORY_FILE, AUDIT_LOG_FILE, EXPENSES_FILE, TABLE_COLUMNS
 import pandas as pd
-STOCK_HISTORY_FILE = 'stock_history.xlsx'
 from functools import wraps
+from table_cache import table_cache
+from storage import storage
+from audit_log import audit_sink
+from cost_engine import cost_engine, recipe_lines, set_margin
+from ingredient_normalizer import ingredient_normalizer, normalize
+from menu_snapshot import menu_snapshot
+from accounting_export import build_accounting_export, stream_file_and_remove
+from period_index import period_index, text_equals, text_contains
+from daily_rollup import daily_rollup
+from request_metrics import request_metrics
 import zipfile
 import io
 import glob
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # Для flash-сообщений
+request_metrics.install(app)
+# /metrics без токена сборщика — только владельцу
+request_metrics.authorize = lambda: session.get('role') == 'owner'
 
 # Создание папок для шаблонов и статики, если их нет
 os.makedirs('templates', exist_ok=True)
@@ -24,8 +38,6 @@ os.makedirs('static', exist_ok=True)
 # Инициализация базы данных
 init_db()
 
-AUDIT_LOG_FILE = 'audit_log.xlsx'
-
 def log_audit(action, object_type, object_name, details, comment=None):
     import pandas as pd
     from datetime import datetime
@@ -40,16 +52,35 @@ def log_audit(action, object_type, object_name, details, comment=None):
         'role': role,
         'comment': comment or ''
     }
-    if os.path.exists(AUDIT_LOG_FILE):
-        df = pd.read_excel(AUDIT_LOG_FILE)
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-    else:
-        df = pd.DataFrame([row])
-    df.to_excel(AUDIT_LOG_FILE, index=False)
+    audit_sink.write(row)
+
+def _legacy_audit_rows():
+    if not storage.exists(AUDIT_LOG_FILE):
+        return []
+    df = storage.read(AUDIT_LOG_FILE)
+    if df.empty:
+        return []
+    df = df.sort_values('datetime', kind='stable')
+    return df.astype(object).where(df.notna(), '').to_dict(orient='records')
+
+# Старый audit_log.xlsx переносится в JSONL-журнал при первом запуске
+audit_sink.import_if_empty(_legacy_audit_rows)
+# Дневные агрегаты строятся из заказов, если их ещё нет
+daily_rollup.ensure()
+
+def audit_page_args():
+    """Параметры страницы журнала из запроса: даты и номер страницы"""
+    date_from = request.args.get('date_from') or None
+    date_to = request.args.get('date_to') or None
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    return date_from, date_to, page
 
 @app.before_request
 def require_login():
-    allowed = ['login', 'static']
+    allowed = ['login', 'static', 'metrics']
     if 'role' not in session and request.endpoint not in allowed:
         return redirect(url_for('login'))
 
@@ -93,28 +124,42 @@ def ingredients():
     if request.method == 'POST':
         if session.get('role') == 'owner':
             abort(403)
-        name = request.form['name']
+        match = ingredient_normalizer.resolve(request.form['name'])
+        name = match.name
         quantity = float(request.form['quantity'])
         unit = request.form['unit']
         price_per_unit = float(request.form['price_per_unit'])
         comment = request.form.get('comment', '')
-        df = pd.read_excel(INGREDIENTS_FILE)
-        new_id = (df['id'].max() + 1) if not df.empty else 1
-        new_row = pd.DataFrame([{
-            'id': new_id,
+        existing = match.existing
+        if match.is_duplicate:
+            # Тот же ингредиент под другим названием: пополняем остаток вместо дубля
+            if normalize(existing['unit']) != normalize(unit):
+                flash(f"Ингредиент «{existing['name']}» уже есть на складе в «{existing['unit']}» — отредактируйте его", 'danger')
+                return redirect(url_for('ingredients'))
+            storage.increment(INGREDIENTS_FILE, 'quantity', {existing['id']: quantity})
+            storage.update(INGREDIENTS_FILE, {'id': existing['id']}, {'price_per_unit': price_per_unit})
+            log_audit('Пополнение', 'Ингредиент', existing['name'],
+                      f"Введено как «{request.form['name']}»: +{quantity} {unit}, Цена: {price_per_unit}", comment)
+            flash(f"Ингредиент «{existing['name']}» уже есть на складе — остаток пополнен", 'success')
+            if existing['price_per_unit'] != price_per_unit:
+                _recalculate_costs(existing['id'], existing['price_per_unit'])
+            return redirect(url_for('ingredients'))
+        if existing is not None and not request.form.get('new_ingredient'):
+            flash(f"«{name}» похоже на «{existing['name']}» (id {existing['id']}). "
+                  f"Если это другой ингредиент, отметьте «Новый ингредиент»", 'warning')
+            return redirect(url_for('ingredients'))
+        storage.append(INGREDIENTS_FILE, {
             'name': name,
             'quantity': quantity,
             'unit': unit,
             'price_per_unit': price_per_unit
-        }])
-        df = pd.concat([df, new_row], ignore_index=True)
-        df.to_excel(INGREDIENTS_FILE, index=False)
+        }, id_column='id')
         log_audit('Добавление', 'Ингредиент', name, f'Остаток: {quantity} {unit}, Цена: {price_per_unit}', comment)
         return redirect(url_for('ingredients'))
-    df = pd.read_excel(INGREDIENTS_FILE)
+    df = storage.read(INGREDIENTS_FILE)
     # Для отображения использования ингредиента в роллах
-    recipes_df = pd.read_excel('roll_recipes.xlsx')
-    rolls_df = pd.read_excel(ROLLS_FILE)
+    recipes_df = storage.read(ROLL_RECIPES_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
     ingredients = df.to_dict(orient='records')
     for ing in ingredients:
         uses = []
@@ -125,10 +170,18 @@ def ingredients():
         ing['used_in'] = ', '.join(uses) if uses else '—'
     return render_template('ingredients.html', ingredients=ingredients)
 
+def _recalculate_costs(ing_id, old_price):
+    """Пересчёт себестоимости роллов и сетов с этим ингредиентом после смены цены"""
+    rolls_count, sets_count, skipped = cost_engine.recalculate([ing_id], {ing_id: old_price})
+    if rolls_count or sets_count:
+        flash(f'Себестоимость пересчитана: роллов {rolls_count}, сетов {sets_count}', 'info')
+    if skipped:
+        flash(f'Себестоимость задана вручную и не пересчитана: {skipped} шт.', 'info')
+
 @app.route('/ingredients/edit/<int:ing_id>', methods=['GET', 'POST'])
 @role_required(['chef'])
 def edit_ingredient(ing_id):
-    df = pd.read_excel(INGREDIENTS_FILE)
+    df = storage.read(INGREDIENTS_FILE)
     ing_row = df[df['id'] == ing_id]
     if ing_row.empty:
         flash('Ингредиент не найден', 'danger')
@@ -137,26 +190,38 @@ def edit_ingredient(ing_id):
         if session.get('role') == 'owner':
             abort(403)
         old = ing_row.iloc[0].to_dict()
+        name = ' '.join(request.form['name'].split())
+        # Проверка на дубли — только при смене названия: остаток и цену
+        # существующей строки можно править, даже если похожая уже есть
+        if normalize(name) != normalize(old['name']):
+            match = ingredient_normalizer.resolve(name, exclude_id=ing_id)
+            if match.existing is not None and (match.is_duplicate or not request.form.get('new_ingredient')):
+                existing = match.existing
+                if match.is_duplicate:
+                    flash(f"Ингредиент «{existing['name']}» (id {existing['id']}) уже есть на складе", 'danger')
+                else:
+                    flash(f"«{match.name}» похоже на «{existing['name']}» (id {existing['id']}). "
+                          f"Если это другой ингредиент, отметьте «Новый ингредиент»", 'warning')
+                return redirect(url_for('edit_ingredient', ing_id=ing_id))
+            name = match.name
         new = {
-            'name': request.form['name'],
+            'name': name,
             'quantity': float(request.form['quantity']),
             'unit': request.form['unit'],
             'price_per_unit': float(request.form['price_per_unit'])
         }
         comment = request.form.get('comment', '')
-        df.loc[df['id'] == ing_id, 'name'] = new['name']
-        df.loc[df['id'] == ing_id, 'quantity'] = new['quantity']
-        df.loc[df['id'] == ing_id, 'unit'] = new['unit']
-        df.loc[df['id'] == ing_id, 'price_per_unit'] = new['price_per_unit']
-        df.to_excel(INGREDIENTS_FILE, index=False)
+        storage.update(INGREDIENTS_FILE, {'id': ing_id}, new)
         details = f"Было: {old}, Стало: {new}"
         log_audit('Редактирование', 'Ингредиент', new['name'], details, comment)
         flash('Ингредиент обновлён', 'success')
+        if old['price_per_unit'] != new['price_per_unit']:
+            _recalculate_costs(ing_id, old['price_per_unit'])
         return redirect(url_for('ingredients'))
     # GET: показать форму редактирования
     # Для шаблона ingredients.html нужно передать edit_ingredient
-    recipes_df = pd.read_excel('roll_recipes.xlsx')
-    rolls_df = pd.read_excel(ROLLS_FILE)
+    recipes_df = storage.read(ROLL_RECIPES_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
     ingredients = df.to_dict(orient='records')
     for ing in ingredients:
         uses = []
@@ -170,14 +235,13 @@ def edit_ingredient(ing_id):
 @app.route('/ingredients/delete/<int:ing_id>')
 @role_required(['chef'])
 def delete_ingredient(ing_id):
-    df = pd.read_excel(INGREDIENTS_FILE)
+    df = storage.read(INGREDIENTS_FILE)
     ing_row = df[df['id'] == ing_id]
     if ing_row.empty:
         flash('Ингредиент не найден', 'danger')
     else:
         name = ing_row.iloc[0]['name']
-        df = df[df['id'] != ing_id]
-        df.to_excel(INGREDIENTS_FILE, index=False)
+        storage.delete(INGREDIENTS_FILE, {'id': ing_id})
         log_audit('Удаление', 'Ингредиент', name, f'Удалён ингредиент {name}')
         flash('Ингредиент удалён', 'success')
     return redirect(url_for('ingredients'))
@@ -190,14 +254,10 @@ def rolls():
             abort(403)
         name = request.form['name']
         sale_price = request.form.get('sale_price', '')
-        df = pd.read_excel(ROLLS_FILE)
-        new_id = (df['id'].max() + 1) if not df.empty else 1
-        new_row = pd.DataFrame([{'id': new_id, 'name': name, 'sale_price': sale_price}])
-        df = pd.concat([df, new_row], ignore_index=True)
-        df.to_excel(ROLLS_FILE, index=False)
+        storage.append(ROLLS_FILE, {'name': name, 'sale_price': sale_price}, id_column='id')
         log_audit('Добавление', 'Ролл', name, f'Добавлен ролл: {name}')
         return redirect(url_for('rolls'))
-    df = pd.read_excel(ROLLS_FILE)
+    df = storage.read(ROLLS_FILE)
     rolls = df.to_dict(orient='records')
     return render_template('rolls.html', rolls=rolls)
 
@@ -207,14 +267,14 @@ def sets():
     """Страница с сетов"""
     from models import SETS_FILE, SET_COMPOSITION_FILE
     
-    if not os.path.exists(SETS_FILE):
+    if not storage.exists(SETS_FILE):
         return render_template('sets.html', sets=[], rolls=[])
     
-    sets_df = pd.read_excel(SETS_FILE)
-    composition_df = pd.read_excel(SET_COMPOSITION_FILE) if os.path.exists(SET_COMPOSITION_FILE) else pd.DataFrame()
+    sets_df = storage.read(SETS_FILE)
+    composition_df = storage.read(SET_COMPOSITION_FILE) if storage.exists(SET_COMPOSITION_FILE) else pd.DataFrame()
     
     # Загружаем роллы для редактирования состава
-    rolls_df = pd.read_excel(ROLLS_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
     rolls = rolls_df.to_dict(orient='records')
     
     sets_data = []
@@ -253,17 +313,16 @@ def edit_set():
     gross_profit = set_price - cost_price
     margin_percent = (gross_profit / cost_price * 100) if cost_price > 0 else 0
     
-    # Обновляем данные в файле
-    sets_df = pd.read_excel(SETS_FILE)
-    sets_df.loc[sets_df['id'] == set_id, 'name'] = name
-    sets_df.loc[sets_df['id'] == set_id, 'cost_price'] = cost_price
-    sets_df.loc[sets_df['id'] == set_id, 'retail_price'] = retail_price
-    sets_df.loc[sets_df['id'] == set_id, 'set_price'] = set_price
-    sets_df.loc[sets_df['id'] == set_id, 'discount_percent'] = discount_percent
-    sets_df.loc[sets_df['id'] == set_id, 'gross_profit'] = gross_profit
-    sets_df.loc[sets_df['id'] == set_id, 'margin_percent'] = margin_percent
-    
-    sets_df.to_excel(SETS_FILE, index=False)
+    # Обновляем данные сета
+    storage.update(SETS_FILE, {'id': set_id}, {
+        'name': name,
+        'cost_price': cost_price,
+        'retail_price': retail_price,
+        'set_price': set_price,
+        'discount_percent': discount_percent,
+        'gross_profit': gross_profit,
+        'margin_percent': margin_percent
+    })
     
     log_audit('Редактирование', 'Сет', name, f'Обновлены параметры: цена сета {set_price}с, себестоимость {cost_price}с', None)
     flash(f'Сет "{name}" успешно обновлен', 'success')
@@ -279,17 +338,13 @@ def edit_set_composition():
     set_id = int(request.form['set_id'])
     roll_ids = request.form.getlist('roll_ids[]')
     
-    # Удаляем старый состав
-    composition_df = pd.read_excel(SET_COMPOSITION_FILE)
-    composition_df = composition_df[composition_df['set_id'] != set_id]
-    
     # Добавляем новый состав
+    rolls_df = storage.read(ROLLS_FILE)
+    roll_names = dict(zip(rolls_df['id'], rolls_df['name']))
     new_composition = []
     for roll_id in roll_ids:
         if roll_id:  # Проверяем, что roll_id не пустой
-            # Получаем название ролла
-            rolls_df = pd.read_excel(ROLLS_FILE)
-            roll_name = rolls_df[rolls_df['id'] == int(roll_id)]['name'].iloc[0] if not rolls_df[rolls_df['id'] == int(roll_id)].empty else f'Ролл {roll_id}'
+            roll_name = roll_names.get(int(roll_id), f'Ролл {roll_id}')
             
             new_composition.append({
                 'set_id': set_id,
@@ -297,49 +352,27 @@ def edit_set_composition():
                 'roll_name': roll_name
             })
     
-    # Добавляем новый состав в файл
-    if new_composition:
-        new_df = pd.DataFrame(new_composition)
-        composition_df = pd.concat([composition_df, new_df], ignore_index=True)
-    
-    composition_df.to_excel(SET_COMPOSITION_FILE, index=False)
+    # Заменяем старый состав новым
+    storage.replace(SET_COMPOSITION_FILE, {'set_id': set_id}, new_composition)
     
     # Пересчитываем себестоимость сета
     from models import SETS_FILE
-    sets_df = pd.read_excel(SETS_FILE)
+    sets_df = storage.read(SETS_FILE)
     set_name = sets_df[sets_df['id'] == set_id]['name'].iloc[0] if not sets_df[sets_df['id'] == set_id].empty else f'Сет {set_id}'
     
     # Рассчитываем новую себестоимость на основе состава
-    total_cost = 0
-    for composition in new_composition:
-        roll_id = composition['roll_id']
-        # Получаем рецепт ролла
-        recipes_df = pd.read_excel('roll_recipes.xlsx')
-        roll_recipe = recipes_df[recipes_df['roll_id'] == roll_id]
-        
-        for _, recipe_row in roll_recipe.iterrows():
-            ingredient_id = recipe_row['ingredient_id']
-            amount = recipe_row['amount_per_roll']
-            
-            # Получаем цену ингредиента
-            ingredients_df = pd.read_excel(INGREDIENTS_FILE)
-            ingredient = ingredients_df[ingredients_df['id'] == ingredient_id]
-            if not ingredient.empty:
-                price_per_unit = ingredient.iloc[0]['price_per_unit']
-                total_cost += amount * price_per_unit
-    
-    # Обновляем себестоимость сета
-    sets_df.loc[sets_df['id'] == set_id, 'cost_price'] = total_cost
+    total_cost = cost_engine.composition_cost(c['roll_id'] for c in new_composition)
     
     # Пересчитываем прибыль и маржу
     set_price = sets_df.loc[sets_df['id'] == set_id, 'set_price'].iloc[0]
-    gross_profit = set_price - total_cost
-    margin_percent = (gross_profit / total_cost * 100) if total_cost > 0 else 0
+    gross_profit, margin_percent = set_margin(set_price, total_cost)
     
-    sets_df.loc[sets_df['id'] == set_id, 'gross_profit'] = gross_profit
-    sets_df.loc[sets_df['id'] == set_id, 'margin_percent'] = margin_percent
-    
-    sets_df.to_excel(SETS_FILE, index=False)
+    # Обновляем себестоимость сета
+    storage.update(SETS_FILE, {'id': set_id}, {
+        'cost_price': total_cost,
+        'gross_profit': gross_profit,
+        'margin_percent': margin_percent
+    })
     
     log_audit('Редактирование', 'Состав сета', set_name, f'Обновлен состав: {len(new_composition)} роллов, новая себестоимость: {total_cost:.2f}с', None)
     flash(f'Состав сета "{set_name}" успешно обновлен', 'success')
@@ -352,10 +385,10 @@ def get_set_composition(set_id):
     """Получить состав сета для AJAX"""
     from models import SET_COMPOSITION_FILE
     
-    if not os.path.exists(SET_COMPOSITION_FILE):
+    if not storage.exists(SET_COMPOSITION_FILE):
         return jsonify([])
     
-    composition_df = pd.read_excel(SET_COMPOSITION_FILE)
+    composition_df = storage.read(SET_COMPOSITION_FILE)
     composition = composition_df[composition_df['set_id'] == set_id].to_dict(orient='records')
     
     return jsonify(composition)
@@ -363,13 +396,13 @@ def get_set_composition(set_id):
 @app.route('/rolls/<int:roll_id>', methods=['GET', 'POST'])
 @role_required(['chef'])
 def roll_detail(roll_id):
-    rolls_df = pd.read_excel(ROLLS_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
     roll = rolls_df[rolls_df['id'] == roll_id]
     if roll.empty:
         return 'Ролл не найден', 404
     roll_name = roll.iloc[0]['name']
-    recipes_df = pd.read_excel('roll_recipes.xlsx')
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+    recipes_df = storage.read(ROLL_RECIPES_FILE)
+    ingredients_df = storage.read(INGREDIENTS_FILE)
     # Добавление ингредиента в рецепт
     if request.method == 'POST':
         if session.get('role') == 'owner':
@@ -380,33 +413,24 @@ def roll_detail(roll_id):
         if not recipes_df[(recipes_df['roll_id'] == roll_id) & (recipes_df['ingredient_id'] == ing_id)].empty:
             flash('Этот ингредиент уже есть в рецепте', 'danger')
         else:
-            new_row = pd.DataFrame([{'roll_id': roll_id, 'ingredient_id': ing_id, 'amount_per_roll': amount}])
-            recipes_df = pd.concat([recipes_df, new_row], ignore_index=True)
-            recipes_df.to_excel('roll_recipes.xlsx', index=False)
+            storage.append(ROLL_RECIPES_FILE, {'roll_id': roll_id, 'ingredient_id': ing_id, 'amount_per_roll': amount})
             ing_name = ingredients_df[ingredients_df['id'] == ing_id].iloc[0]['name'] if not ingredients_df[ingredients_df['id'] == ing_id].empty else str(ing_id)
             log_audit('Добавление', 'Рецепт ролла', roll_name, f'Добавлен ингредиент: {ing_name}, {amount}', None)
             flash('Ингредиент добавлен в рецепт', 'success')
         return redirect(url_for('roll_detail', roll_id=roll_id))
     # Состав ролла
     recipe = recipes_df[recipes_df['roll_id'] == roll_id]
-    ingredients = []
-    total_cost = 0
-    for _, rec in recipe.iterrows():
-        ing_row = ingredients_df[ingredients_df['id'] == rec['ingredient_id']]
-        if not ing_row.empty:
-            ing = ing_row.iloc[0]
-            used = rec['amount_per_roll']
-            cost = used * ing['price_per_unit']
-            total_cost += cost
-            ingredients.append({
-                'id': rec['ingredient_id'],
-                'name': ing['name'],
-                'used': used,
-                'unit': ing['unit'],
-                'on_stock': ing['quantity'],
-                'price_per_unit': ing['price_per_unit'],
-                'cost': cost
-            })
+    lines = recipe_lines(recipes_df, ingredients_df, roll_id)
+    ingredients = [{
+        'id': line['ingredient_id'],
+        'name': line['name'],
+        'used': line['amount_per_roll'],
+        'unit': line['unit'],
+        'on_stock': line['quantity'],
+        'price_per_unit': line['price_per_unit'],
+        'cost': line['cost']
+    } for line in lines.to_dict(orient='records')]
+    total_cost = float(lines['cost'].sum()) if not lines.empty else 0
     # Для формы добавления ингредиента
     used_ids = set(recipe['ingredient_id'])
     available_ingredients = [
@@ -418,13 +442,12 @@ def roll_detail(roll_id):
 @app.route('/rolls/<int:roll_id>/delete_ingredient/<int:ingredient_id>')
 @role_required(['chef'])
 def delete_roll_ingredient(roll_id, ingredient_id):
-    recipes_df = pd.read_excel('roll_recipes.xlsx')
-    rolls_df = pd.read_excel(ROLLS_FILE)
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+    recipes_df = storage.read(ROLL_RECIPES_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
+    ingredients_df = storage.read(INGREDIENTS_FILE)
     roll_name = rolls_df[rolls_df['id'] == roll_id].iloc[0]['name'] if not rolls_df[rolls_df['id'] == roll_id].empty else str(roll_id)
     ing_name = ingredients_df[ingredients_df['id'] == ingredient_id].iloc[0]['name'] if not ingredients_df[ingredients_df['id'] == ingredient_id].empty else str(ingredient_id)
-    recipes_df = recipes_df[~((recipes_df['roll_id'] == roll_id) & (recipes_df['ingredient_id'] == ingredient_id))]
-    recipes_df.to_excel('roll_recipes.xlsx', index=False)
+    storage.delete(ROLL_RECIPES_FILE, {'roll_id': roll_id, 'ingredient_id': ingredient_id})
     log_audit('Удаление', 'Рецепт ролла', roll_name, f'Удалён ингредиент: {ing_name}', None)
     flash('Ингредиент удалён из рецепта', 'success')
     return redirect(url_for('roll_detail', roll_id=roll_id))
@@ -432,11 +455,11 @@ def delete_roll_ingredient(roll_id, ingredient_id):
 @app.route('/rolls/<int:roll_id>/edit_ingredient/<int:ingredient_id>', methods=['GET', 'POST'])
 @role_required(['chef'])
 def edit_roll_ingredient(roll_id, ingredient_id):
-    recipes_df = pd.read_excel('roll_recipes.xlsx')
+    recipes_df = storage.read(ROLL_RECIPES_FILE)
     rec = recipes_df[(recipes_df['roll_id'] == roll_id) & (recipes_df['ingredient_id'] == ingredient_id)]
-    rolls_df = pd.read_excel(ROLLS_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
     roll_name = rolls_df[rolls_df['id'] == roll_id].iloc[0]['name'] if not rolls_df[rolls_df['id'] == roll_id].empty else ''
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+    ingredients_df = storage.read(INGREDIENTS_FILE)
     ing_row = ingredients_df[ingredients_df['id'] == ingredient_id]
     ing_name = ing_row.iloc[0]['name'] if not ing_row.empty else ''
     if rec.empty:
@@ -447,8 +470,7 @@ def edit_roll_ingredient(roll_id, ingredient_id):
             abort(403)
         old_amount = rec.iloc[0]['amount_per_roll']
         new_amount = float(request.form['amount_per_roll'])
-        recipes_df.loc[(recipes_df['roll_id'] == roll_id) & (recipes_df['ingredient_id'] == ingredient_id), 'amount_per_roll'] = new_amount
-        recipes_df.to_excel('roll_recipes.xlsx', index=False)
+        storage.update(ROLL_RECIPES_FILE, {'roll_id': roll_id, 'ingredient_id': ingredient_id}, {'amount_per_roll': new_amount})
         log_audit('Редактирование', 'Рецепт ролла', roll_name, f'Ингредиент: {ing_name}, Было: {old_amount}, Стало: {new_amount}', None)
         flash('Количество обновлено', 'success')
         return redirect(url_for('roll_detail', roll_id=roll_id))
@@ -458,7 +480,7 @@ def edit_roll_ingredient(roll_id, ingredient_id):
 @app.route('/rolls/edit/<int:roll_id>', methods=['GET', 'POST'])
 @role_required(['chef'])
 def edit_roll(roll_id):
-    df = pd.read_excel(ROLLS_FILE)
+    df = storage.read(ROLLS_FILE)
     roll_row = df[df['id'] == roll_id]
     if roll_row.empty:
         flash('Ролл не найден', 'danger')
@@ -469,9 +491,7 @@ def edit_roll(roll_id):
         old_name = roll_row.iloc[0]['name']
         new_name = request.form['name']
         new_sale_price = request.form.get('sale_price', roll_row.iloc[0].get('sale_price', ''))
-        df.loc[df['id'] == roll_id, 'name'] = new_name
-        df.loc[df['id'] == roll_id, 'sale_price'] = new_sale_price
-        df.to_excel(ROLLS_FILE, index=False)
+        storage.update(ROLLS_FILE, {'id': roll_id}, {'name': new_name, 'sale_price': new_sale_price})
         log_audit('Редактирование', 'Ролл', new_name, f'Было: {old_name}, Стало: {new_name}')
         flash('Ролл обновлён', 'success')
         return redirect(url_for('rolls'))
@@ -481,14 +501,13 @@ def edit_roll(roll_id):
 @app.route('/rolls/delete/<int:roll_id>')
 @role_required(['chef'])
 def delete_roll(roll_id):
-    df = pd.read_excel(ROLLS_FILE)
+    df = storage.read(ROLLS_FILE)
     roll_row = df[df['id'] == roll_id]
     if roll_row.empty:
         flash('Ролл не найден', 'danger')
     else:
         name = roll_row.iloc[0]['name']
-        df = df[df['id'] != roll_id]
-        df.to_excel(ROLLS_FILE, index=False)
+        storage.delete(ROLLS_FILE, {'id': roll_id})
         log_audit('Удаление', 'Ролл', name, f'Удалён ролл: {name}')
         flash('Ролл удалён', 'success')
     return redirect(url_for('rolls'))
@@ -496,31 +515,26 @@ def delete_roll(roll_id):
 @app.route('/rolls/add', methods=['GET', 'POST'])
 @role_required(['chef'])
 def add_roll():
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+    ingredients_df = storage.read(INGREDIENTS_FILE)
     if request.method == 'POST':
         if session.get('role') == 'owner':
             abort(403)
         name = request.form['name']
         sale_price = request.form.get('sale_price', '')
         # Добавляем ролл
-        rolls_df = pd.read_excel(ROLLS_FILE)
-        new_id = (rolls_df['id'].max() + 1) if not rolls_df.empty else 1
-        new_row = pd.DataFrame([{'id': new_id, 'name': name, 'sale_price': sale_price}])
-        rolls_df = pd.concat([rolls_df, new_row], ignore_index=True)
-        rolls_df.to_excel(ROLLS_FILE, index=False)
+        new_id = storage.append(ROLLS_FILE, {'name': name, 'sale_price': sale_price}, id_column='id')
         # Добавляем состав
-        recipes_df = pd.read_excel('roll_recipes.xlsx')
+        new_recipes = []
         for ing in ingredients_df.itertuples():
             amount = request.form.get(f'ingredient_{ing.id}')
             if amount:
                 try:
                     amount = float(amount)
                     if amount > 0:
-                        new_recipe = pd.DataFrame([{'roll_id': new_id, 'ingredient_id': ing.id, 'amount_per_roll': amount}])
-                        recipes_df = pd.concat([recipes_df, new_recipe], ignore_index=True)
+                        new_recipes.append({'roll_id': new_id, 'ingredient_id': ing.id, 'amount_per_roll': amount})
                 except ValueError:
                     pass
-        recipes_df.to_excel('roll_recipes.xlsx', index=False)
+        storage.append_many(ROLL_RECIPES_FILE, new_recipes)
         flash('Ролл добавлен', 'success')
         return redirect(url_for('roll_detail', roll_id=new_id))
     return render_template('add_roll.html', ingredients=ingredients_df.to_dict(orient='records'))
@@ -529,7 +543,7 @@ def add_roll():
 @role_required(['chef', 'staff'])
 def orders():
     error = None
-    rolls_df = pd.read_excel(ROLLS_FILE)
+    rolls_df = storage.read(ROLLS_FILE)
     rolls = rolls_df.to_dict(orient='records')
     if request.method == 'POST':
         if session.get('role') == 'owner':
@@ -542,8 +556,8 @@ def orders():
             error = 'Ролл не найден.'
         else:
             # Проверка остатков ингредиентов
-            recipes_df = pd.read_excel('roll_recipes.xlsx')
-            ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+            recipes_df = storage.read(ROLL_RECIPES_FILE)
+            ingredients_df = storage.read(INGREDIENTS_FILE)
             not_enough = []
             used_ingredients = []
             total_cost = 0
@@ -562,15 +576,12 @@ def orders():
                 error = 'Не хватает ингредиентов: ' + ', '.join(not_enough)
             else:
                 # Вычитаем ингредиенты сразу при добавлении заказа
+                deltas = {}
                 for ing_id, need in used_ingredients:
-                    idx = ingredients_df[ingredients_df['id'] == ing_id].index[0]
-                    ingredients_df.at[idx, 'quantity'] -= need
-                ingredients_df.to_excel(INGREDIENTS_FILE, index=False)
-                orders_df = pd.read_excel(ORDERS_FILE)
-                new_id = (orders_df['id'].max() + 1) if not orders_df.empty else 1
+                    deltas[ing_id] = deltas.get(ing_id, 0) - need
+                storage.increment(INGREDIENTS_FILE, 'quantity', deltas)
                 now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                new_row = pd.DataFrame([{
-                    'id': new_id,
+                new_order = {
                     'roll_id': roll_id,
                     'set_id': None,
                     'quantity': quantity,
@@ -580,42 +591,41 @@ def orders():
                     'status': 'Принят',
                     'comment': comment,
                     'order_type': 'roll'
-                }])
-                orders_df = pd.concat([orders_df, new_row], ignore_index=True)
-                orders_df.to_excel(ORDERS_FILE, index=False)
+                }
+                storage.append(ORDERS_FILE, new_order, id_column='id')
+                daily_rollup.record_order(new_order)
                 return redirect(url_for('orders'))
     # Обработка действия "Сделан"
     if request.args.get('done'):
         order_id = int(request.args.get('done'))
-        orders_df = pd.read_excel(ORDERS_FILE)
+        orders_df = storage.read(ORDERS_FILE)
         order = orders_df[orders_df['id'] == order_id]
         if not order.empty and order.iloc[0]['status'] == 'Готовится':
             roll_id = order.iloc[0]['roll_id']
             quantity = order.iloc[0]['quantity']
             # Получаем рецепт ролла
-            recipes_df = pd.read_excel('roll_recipes.xlsx')
-            order_ingredients_df = pd.read_excel(ORDER_INGREDIENTS_FILE)
+            recipes_df = storage.read(ROLL_RECIPES_FILE)
             # Просто фиксируем расход по заказу (ингредиенты уже вычтены)
+            used_rows = []
             for _, rec in recipes_df[recipes_df['roll_id'] == roll_id].iterrows():
                 ing_id = rec['ingredient_id']
                 need = rec['amount_per_roll'] * quantity
-                order_ingredients_df = pd.concat([
-                    order_ingredients_df,
-                    pd.DataFrame([{'order_id': order_id, 'ingredient_id': ing_id, 'used_amount': need}])
-                ], ignore_index=True)
-            order_ingredients_df.to_excel(ORDER_INGREDIENTS_FILE, index=False)
+                used_rows.append({'order_id': order_id, 'ingredient_id': ing_id, 'used_amount': need})
+            # Агрегаты переносятся до записи нового расхода, иначе он попал бы в перенос
+            daily_rollup.change_status(order.iloc[0], 'Сделан')
+            storage.append_many(ORDER_INGREDIENTS_FILE, used_rows)
+            daily_rollup.add_usage(order.iloc[0], used_rows)
             # Меняем статус заказа
-            orders_df.loc[orders_df['id'] == order_id, 'status'] = 'Сделан'
-            orders_df.to_excel(ORDERS_FILE, index=False)
+            storage.update(ORDERS_FILE, {'id': order_id}, {'status': 'Сделан'})
             return redirect(url_for('orders'))
     # GET: показать список заказов
-    orders_df = pd.read_excel(ORDERS_FILE)
+    orders_df = storage.read(ORDERS_FILE)
     orders = []
     
     # Загружаем данные о сетах для отображения заказов
     from models import SETS_FILE, SET_COMPOSITION_FILE
-    sets_df = pd.read_excel(SETS_FILE) if os.path.exists(SETS_FILE) else pd.DataFrame()
-    composition_df = pd.read_excel(SET_COMPOSITION_FILE) if os.path.exists(SET_COMPOSITION_FILE) else pd.DataFrame()
+    sets_df = storage.read(SETS_FILE) if storage.exists(SETS_FILE) else pd.DataFrame()
+    composition_df = storage.read(SET_COMPOSITION_FILE) if storage.exists(SET_COMPOSITION_FILE) else pd.DataFrame()
     
     # Загружаем данные о сетах для формы заказа
     sets_for_form = sets_df.to_dict(orient='records') if not sets_df.empty else []
@@ -666,7 +676,7 @@ def add_set_to_order():
     comment = request.form.get('comment', '')
     
     # Получаем данные о сете
-    sets_df = pd.read_excel(SETS_FILE)
+    sets_df = storage.read(SETS_FILE)
     set_data = sets_df[sets_df['id'] == set_id]
     if set_data.empty:
         flash('Сет не найден', 'danger')
@@ -677,12 +687,12 @@ def add_set_to_order():
     total_cost = set_price * quantity
     
     # Получаем состав сета
-    composition_df = pd.read_excel(SET_COMPOSITION_FILE)
+    composition_df = storage.read(SET_COMPOSITION_FILE)
     set_composition = composition_df[composition_df['set_id'] == set_id]
     
     # Проверяем остатки ингредиентов для всех роллов в сете
-    recipes_df = pd.read_excel('roll_recipes.xlsx')
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+    recipes_df = storage.read(ROLL_RECIPES_FILE)
+    ingredients_df = storage.read(INGREDIENTS_FILE)
     not_enough = []
     used_ingredients = []
     
@@ -705,18 +715,15 @@ def add_set_to_order():
         return redirect(url_for('sets'))
     
     # Вычитаем ингредиенты
+    deltas = {}
     for ing_id, need in used_ingredients:
-        idx = ingredients_df[ingredients_df['id'] == ing_id].index[0]
-        ingredients_df.at[idx, 'quantity'] -= need
-    ingredients_df.to_excel(INGREDIENTS_FILE, index=False)
+        deltas[ing_id] = deltas.get(ing_id, 0) - need
+    storage.increment(INGREDIENTS_FILE, 'quantity', deltas)
     
     # Добавляем заказ
-    orders_df = pd.read_excel(ORDERS_FILE)
-    new_id = (orders_df['id'].max() + 1) if not orders_df.empty else 1
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    new_row = pd.DataFrame([{
-        'id': new_id,
+    new_order = {
         'roll_id': None,
         'set_id': set_id,
         'quantity': quantity,
@@ -726,10 +733,9 @@ def add_set_to_order():
         'status': 'Принят',
         'comment': comment,
         'order_type': 'set'
-    }])
-    
-    orders_df = pd.concat([orders_df, new_row], ignore_index=True)
-    orders_df.to_excel(ORDERS_FILE, index=False)
+    }
+    storage.append(ORDERS_FILE, new_order, id_column='id')
+    daily_rollup.record_order(new_order)
     
     flash(f'Сет "{set_info["name"]}" добавлен в заказ', 'success')
     return redirect(url_for('orders'))
@@ -740,13 +746,13 @@ def change_order_status(order_id):
     """Изменяет статус заказа"""
     new_status = request.form.get('status')
     if new_status in ['Принят', 'Готовится', 'Готов', 'Отправлен', 'Доставлен']:
-        orders_df = pd.read_excel(ORDERS_FILE)
+        orders_df = storage.read(ORDERS_FILE)
         if not orders_df.empty and order_id in orders_df['id'].values:
             order = orders_df[orders_df['id'] == order_id].iloc[0]
             order_type = order.get('order_type', 'roll')
             
-            orders_df.loc[orders_df['id'] == order_id, 'status'] = new_status
-            orders_df.to_excel(ORDERS_FILE, index=False)
+            storage.update(ORDERS_FILE, {'id': order_id}, {'status': new_status})
+            daily_rollup.change_status(order, new_status)
             
             # Логируем изменение статуса
             item_type = 'сет' if order_type == 'set' else 'ролл'
@@ -764,7 +770,7 @@ def change_order_status(order_id):
 @role_required(['chef'])
 def order_done(order_id):
     """Отметить заказ как выполненный"""
-    orders_df = pd.read_excel(ORDERS_FILE)
+    orders_df = storage.read(ORDERS_FILE)
     order = orders_df[orders_df['id'] == order_id]
     
     if not order.empty and order.iloc[0]['status'] == 'Готовится':
@@ -773,13 +779,13 @@ def order_done(order_id):
         if order_type == 'set':
             # Для сета нужно обработать все роллы в составе
             from models import SET_COMPOSITION_FILE
-            composition_df = pd.read_excel(SET_COMPOSITION_FILE) if os.path.exists(SET_COMPOSITION_FILE) else pd.DataFrame()
+            composition_df = storage.read(SET_COMPOSITION_FILE) if storage.exists(SET_COMPOSITION_FILE) else pd.DataFrame()
             set_id = order.iloc[0]['set_id']
             set_composition = composition_df[composition_df['set_id'] == set_id]
             
             # Получаем рецепты всех роллов в сете
-            recipes_df = pd.read_excel('roll_recipes.xlsx')
-            order_ingredients_df = pd.read_excel(ORDER_INGREDIENTS_FILE)
+            recipes_df = storage.read(ROLL_RECIPES_FILE)
+            used_rows = []
             
             for _, comp in set_composition.iterrows():
                 roll_id = comp['roll_id']
@@ -790,16 +796,16 @@ def order_done(order_id):
                     need = rec['amount_per_roll'] * order.iloc[0]['quantity']
                     
                     # Фиксируем расход по заказу
-                    order_ingredients_df = pd.concat([
-                        order_ingredients_df,
-                        pd.DataFrame([{'order_id': order_id, 'ingredient_id': ing_id, 'used_amount': need}])
-                    ], ignore_index=True)
+                    used_rows.append({'order_id': order_id, 'ingredient_id': ing_id, 'used_amount': need})
             
-            order_ingredients_df.to_excel(ORDER_INGREDIENTS_FILE, index=False)
+            daily_rollup.change_status(order.iloc[0], 'Сделан')
+            storage.append_many(ORDER_INGREDIENTS_FILE, used_rows)
+            daily_rollup.add_usage(order.iloc[0], used_rows)
+        else:
+            daily_rollup.change_status(order.iloc[0], 'Сделан')
         
         # Меняем статус заказа
-        orders_df.loc[orders_df['id'] == order_id, 'status'] = 'Сделан'
-        orders_df.to_excel(ORDERS_FILE, index=False)
+        storage.update(ORDERS_FILE, {'id': order_id}, {'status': 'Сделан'})
         
         item_type = 'сет' if order_type == 'set' else 'ролл'
         flash(f'Заказ #{order_id} ({item_type}) отмечен как выполненный', 'success')
@@ -809,39 +815,33 @@ def order_done(order_id):
 @app.route('/reports')
 @role_required(['chef'])
 def reports():
-    orders_df = pd.read_excel(ORDERS_FILE)
-    
-    # Подсчитываем доходы по типам заказов
-    completed_orders = orders_df[orders_df['status'] == 'Сделан'] if not orders_df.empty else pd.DataFrame()
+    # Итоги по выполненным заказам из дневных агрегатов
+    sales_df = daily_rollup.sales()
+    completed = sales_df[sales_df['status'] == 'Сделан']
+    roll_sales = completed[completed['item_type'] == 'roll']
+    set_sales = completed[completed['item_type'] == 'set']
     
-    if not completed_orders.empty:
-        roll_orders = completed_orders[completed_orders.get('order_type', 'roll') == 'roll']
-        set_orders = completed_orders[completed_orders.get('order_type', 'roll') == 'set']
-        
-        total_income = completed_orders['total_price'].sum()
-        roll_income = roll_orders['total_price'].sum() if not roll_orders.empty else 0
-        set_income = set_orders['total_price'].sum() if not set_orders.empty else 0
-        
-        # Статистика по заказам
-        total_orders = len(completed_orders)
-        roll_count = len(roll_orders)
-        set_count = len(set_orders)
-    else:
-        total_income = roll_income = set_income = 0
-        total_orders = roll_count = set_count = 0
+    total_income = completed['income'].sum() if not completed.empty else 0
+    roll_income = roll_sales['income'].sum() if not roll_sales.empty else 0
+    set_income = set_sales['income'].sum() if not set_sales.empty else 0
     
-    # Расход ингредиентов
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
-    order_ingredients_df = pd.read_excel(ORDER_INGREDIENTS_FILE)
+    # Статистика по заказам
+    total_orders = int(completed['orders'].sum()) if not completed.empty else 0
+    roll_count = int(roll_sales['orders'].sum()) if not roll_sales.empty else 0
+    set_count = int(set_sales['orders'].sum()) if not set_sales.empty else 0
     
-    # Суммируем расход по всем завершённым заказам
-    usage = order_ingredients_df.merge(orders_df[['id', 'status']], left_on='order_id', right_on='id')
-    usage = usage[usage['status'] == 'Сделан']
+    # Расход ингредиентов по всем завершённым заказам
+    ingredients_df = storage.read(INGREDIENTS_FILE)
+    usage_df = daily_rollup.usage()
+    done_usage = usage_df[usage_df['status'] == 'Сделан']
+    # dict, а не Series: get() по отсутствующему id не должен откатываться к позиции
+    used_by_ingredient = done_usage.groupby(
+        pd.to_numeric(done_usage['ingredient_id'], errors='coerce'))['used_amount'].sum().to_dict()
     
-    ingredients_usage = []
-    for _, ing in ingredients_df.iterrows():
-        used = usage[usage['ingredient_id'] == ing['id']]['used_amount'].sum() if not usage.empty else 0
-        ingredients_usage.append({'name': ing['name'], 'used': used})
+    ingredients_usage = [
+        {'name': ing['name'], 'used': used_by_ingredient.get(ing['id'], 0)}
+        for ing in ingredients_df.to_dict(orient='records')
+    ]
     
     return render_template('reports.html', 
                          total_income=total_income,
@@ -859,7 +859,7 @@ def stock():
     import os
     from datetime import datetime
     message = None
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE)
+    ingredients_df = storage.read(INGREDIENTS_FILE)
     if request.method == 'POST':
         ingredient_id = int(request.form['ingredient_id'])
         amount = float(request.form['amount'])
@@ -870,59 +870,46 @@ def stock():
         ingredient_name = ing_row.iloc[0]['name'] if not ing_row.empty else str(ingredient_id)
         # Обновление остатков
         if operation == 'add':
-            ingredients_df.loc[ingredients_df['id'] == ingredient_id, 'quantity'] += amount
+            delta = amount
             op_type = 'Поставка'
         else:
-            ingredients_df.loc[ingredients_df['id'] == ingredient_id, 'quantity'] -= amount
+            delta = -amount
             op_type = 'Списание'
-        ingredients_df.to_excel(INGREDIENTS_FILE, index=False)
+        storage.increment(INGREDIENTS_FILE, 'quantity', {ingredient_id: delta})
+        ingredients_df.loc[ingredients_df['id'] == ingredient_id, 'quantity'] += delta
         # Лог в историю
-        if os.path.exists(STOCK_HISTORY_FILE):
-            history_df = pd.read_excel(STOCK_HISTORY_FILE)
-        else:
-            history_df = pd.DataFrame(columns=['date', 'ingredient_id', 'ingredient_name', 'operation', 'amount', 'comment'])
-        new_row = pd.DataFrame([{
+        storage.append(STOCK_HISTORY_FILE, {
             'date': now,
             'ingredient_id': ingredient_id,
             'ingredient_name': ingredient_name,
             'operation': op_type,
             'amount': amount,
             'comment': comment
-        }])
-        history_df = pd.concat([history_df, new_row], ignore_index=True)
-        history_df.to_excel(STOCK_HISTORY_FILE, index=False)
+        })
         message = f'{op_type} {ingredient_name} на {amount} успешно проведена.'
     # История операций
-    if os.path.exists(STOCK_HISTORY_FILE):
-        history_df = pd.read_excel(STOCK_HISTORY_FILE)
+    if storage.exists(STOCK_HISTORY_FILE):
+        history_df = storage.read(STOCK_HISTORY_FILE)
     else:
-        history_df = pd.DataFrame(columns=['date', 'ingredient_id', 'ingredient_name', 'operation', 'amount', 'comment'])
+        history_df = pd.DataFrame(columns=TABLE_COLUMNS[STOCK_HISTORY_FILE])
     history = history_df.to_dict(orient='records')
     return render_template('stock.html', ingredients=ingredients_df.to_dict(orient='records'), history=history, message=message)
 
 @app.route('/audit')
 @role_required(['chef'])
 def audit():
-    import pandas as pd
-    if os.path.exists(AUDIT_LOG_FILE):
-        df = pd.read_excel(AUDIT_LOG_FILE)
-        history = df.sort_values('datetime', ascending=False).to_dict(orient='records')
-    else:
-        history = []
-    return render_template('audit.html', history=history)
+    date_from, date_to, page = audit_page_args()
+    history, has_next = audit_sink.query(date_from, date_to, page=page)
+    return render_template('audit.html', history=history, page=page, has_next=has_next,
+                           date_from=date_from or '', date_to=date_to or '')
 
 @app.route('/history')
 @role_required(['owner'])
 def history():
-    import pandas as pd
-    import os
-    log_file = 'audit_log.xlsx'
-    if os.path.exists(log_file):
-        df = pd.read_excel(log_file)
-        history = df.to_dict(orient='records')
-    else:
-        history = []
-    return render_template('history.html', history=history)
+    date_from, date_to, page = audit_page_args()
+    history, has_next = audit_sink.query(date_from, date_to, page=page)
+    return render_template('history.html', history=history, page=page, has_next=has_next,
+                           date_from=date_from or '', date_to=date_to or '')
 
 @app.route('/accounting', methods=['GET', 'POST'])
 @role_required(['accountant', 'owner'])
@@ -941,15 +928,13 @@ def accounting():
     if not date_to:
         date_to = today.strftime('%Y-%m-%d')
     # --- Загрузка данных ---
-    orders_df = pd.read_excel(ORDERS_FILE) if os.path.exists(ORDERS_FILE) else pd.DataFrame()
-    stock_df = pd.read_excel(STOCK_HISTORY_FILE) if os.path.exists(STOCK_HISTORY_FILE) else pd.DataFrame()
-    rolls_df = pd.read_excel(ROLLS_FILE) if os.path.exists(ROLLS_FILE) else pd.DataFrame()
-    recipes_df = pd.read_excel('roll_recipes.xlsx') if os.path.exists('roll_recipes.xlsx') else pd.DataFrame()
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE) if os.path.exists(INGREDIENTS_FILE) else pd.DataFrame()
+    rolls_df = storage.read(ROLLS_FILE) if storage.exists(ROLLS_FILE) else pd.DataFrame()
+    recipes_df = storage.read(ROLL_RECIPES_FILE) if storage.exists(ROLL_RECIPES_FILE) else pd.DataFrame()
+    ingredients_df = storage.read(INGREDIENTS_FILE) if storage.exists(INGREDIENTS_FILE) else pd.DataFrame()
     # --- Загрузка расходов (зп, аренда) ---
-    expenses_file = 'accounting_expenses.xlsx'
-    if os.path.exists(expenses_file):
-        exp_df = pd.read_excel(expenses_file)
+    expenses_file = EXPENSES_FILE
+    exp_df = storage.read(expenses_file) if storage.exists(expenses_file) else pd.DataFrame()
+    if not exp_df.empty:
         salary = float(exp_df.get('salary', [0])[0])
         rent = float(exp_df.get('rent', [0])[0])
     else:
@@ -961,7 +946,7 @@ def accounting():
             abort(403)
         salary = float(request.form.get('salary', 0))
         rent = float(request.form.get('rent', 0))
-        pd.DataFrame({'salary': [salary], 'rent': [rent]}).to_excel(expenses_file, index=False)
+        storage.write(expenses_file, pd.DataFrame({'salary': [salary], 'rent': [rent]}))
     # --- Продажная цена ---
     if request.method == 'POST' and 'set_price' in request.form:
         if session.get('role') == 'owner':
@@ -969,104 +954,65 @@ def accounting():
         roll_id = int(request.form['roll_id'])
         sale_price = float(request.form['sale_price'])
         rolls_df.loc[rolls_df['id'] == roll_id, 'sale_price'] = sale_price
-        rolls_df.to_excel(ROLLS_FILE, index=False)
+        storage.update(ROLLS_FILE, {'id': roll_id}, {'sale_price': sale_price})
     # --- Себестоимость и продажная цена ---
     roll_costs = {}
+    filled_prices = {}
+    costs = cost_engine.roll_costs()
     for _, roll in rolls_df.iterrows():
-        cost = 0
-        for _, rec in recipes_df[recipes_df['roll_id'] == roll['id']].iterrows():
-            ing_row = ingredients_df[ingredients_df['id'] == rec['ingredient_id']]
-            if not ing_row.empty:
-                cost += rec['amount_per_roll'] * ing_row.iloc[0]['price_per_unit']
+        cost = costs.get(roll['id'], 0)
         sale_price = roll['sale_price'] if 'sale_price' in roll and not pd.isna(roll['sale_price']) else round(cost * 1.2, 2)
         roll_costs[roll['id']] = {'cost': cost, 'sale_price': sale_price, 'name': roll['name']}
         if ('sale_price' not in roll or pd.isna(roll['sale_price'])) and cost > 0:
             rolls_df.loc[rolls_df['id'] == roll['id'], 'sale_price'] = sale_price
-    rolls_df.to_excel(ROLLS_FILE, index=False)
-    # --- Фильтрация по дате ---
-    def in_period(dt):
-        try:
-            d = pd.to_datetime(dt).date()
-            return pd.to_datetime(date_from).date() <= d <= pd.to_datetime(date_to).date()
-        except:
-            return False
+            filled_prices[roll['id']] = sale_price
+    # Пишем только заполненные цены, иначе кэш rolls.xlsx сбрасывался бы на каждом просмотре
+    for roll_id, sale_price in filled_prices.items():
+        storage.update(ROLLS_FILE, {'id': roll_id}, {'sale_price': sale_price})
     # --- Фильтрация заказов ---
-    filtered_orders = []
-    total_income = 0
-    total_cost = 0
     roll_id_filter = request.args.get('roll_id')
     order_status_filter = request.args.get('order_status')
     comment_filter = request.args.get('comment', '').strip().lower()
-    if not orders_df.empty:
-        for _, order in orders_df.iterrows():
-            if in_period(order['order_time']):
-                if roll_id_filter and str(order['roll_id']) != roll_id_filter:
-                    continue
-                if order_status_filter and str(order.get('status', '')) != order_status_filter:
-                    continue
-                if comment_filter and comment_filter not in str(order.get('comment', '')).lower():
-                    continue
-                roll_id = order['roll_id']
-                quantity = order['quantity']
-                sale_price = roll_costs[roll_id]['sale_price'] if roll_id in roll_costs else 0
-                cost = roll_costs[roll_id]['cost'] if roll_id in roll_costs else 0
-                total_income += sale_price * quantity
-                total_cost += cost * quantity
-                filtered_orders.append(order)
+    period_orders = period_index.between(ORDERS_FILE, 'order_time', date_from, date_to)
+    mask = pd.Series(True, index=period_orders.index)
+    if roll_id_filter:
+        mask &= text_equals(period_orders, 'roll_id', roll_id_filter)
+    if order_status_filter:
+        mask &= text_equals(period_orders, 'status', order_status_filter)
+    if comment_filter:
+        mask &= text_contains(period_orders, 'comment', comment_filter)
+    period_orders = period_orders[mask]
+    total_income = 0
+    total_cost = 0
+    if not period_orders.empty:
+        sale_prices = period_orders['roll_id'].map({rid: r['sale_price'] for rid, r in roll_costs.items()}).fillna(0)
+        roll_cost = period_orders['roll_id'].map({rid: r['cost'] for rid, r in roll_costs.items()}).fillna(0)
+        total_income = float((sale_prices * period_orders['quantity']).sum())
+        total_cost = float((roll_cost * period_orders['quantity']).sum())
+    filtered_orders = period_orders.to_dict(orient='records')
     # --- Фильтрация поставок и списаний ---
-    stock_in = []
-    stock_out = []
-    total_stock_in = 0
-    total_stock_out = 0
     ingredient_id_filter = request.args.get('ingredient_id')
     operation_filter = request.args.get('operation')
-    comment_filter_stock = comment_filter
-    if not stock_df.empty:
-        for _, op in stock_df.iterrows():
-            if in_period(op['date']):
-                if ingredient_id_filter and str(op.get('ingredient_id', '')) != ingredient_id_filter:
-                    continue
-                if operation_filter and str(op.get('operation', '')) != operation_filter:
-                    continue
-                if comment_filter_stock and comment_filter_stock not in str(op.get('comment', '')).lower():
-                    continue
-                if op['operation'] == 'Поставка':
-                    stock_in.append(op)
-                    total_stock_in += op['amount']
-                elif op['operation'] == 'Списание':
-                    stock_out.append(op)
-                    total_stock_out += op['amount']
+    period_stock = period_index.between(STOCK_HISTORY_FILE, 'date', date_from, date_to)
+    mask = pd.Series(True, index=period_stock.index)
+    if ingredient_id_filter:
+        mask &= text_equals(period_stock, 'ingredient_id', ingredient_id_filter)
+    if operation_filter:
+        mask &= text_equals(period_stock, 'operation', operation_filter)
+    if comment_filter:
+        mask &= text_contains(period_stock, 'comment', comment_filter)
+    period_stock = period_stock[mask]
+    stock_in_df = period_stock[text_equals(period_stock, 'operation', 'Поставка')]
+    stock_out_df = period_stock[text_equals(period_stock, 'operation', 'Списание')]
+    stock_in = stock_in_df.to_dict(orient='records')
+    stock_out = stock_out_df.to_dict(orient='records')
+    total_stock_in = stock_in_df['amount'].sum() if 'amount' in stock_in_df.columns else 0
+    total_stock_out = stock_out_df['amount'].sum() if 'amount' in stock_out_df.columns else 0
     # --- Экспорт в Excel ---
     if export == '1':
-        # Для заказов: добавляем roll_name
-        orders_export = []
-        for order in filtered_orders:
-            roll_id = order['roll_id']
-            roll_name = roll_costs[roll_id]['name'] if roll_id in roll_costs else str(roll_id)
-            row = dict(order)
-            row['roll_name'] = roll_name
-            orders_export.append(row)
-        # Для поставок/списаний: добавляем ingredient_name
-        def add_ing_name(op_list):
-            res = []
-            for op in op_list:
-                ing_id = op.get('ingredient_id')
-                ing_name = None
-                for ing in ingredients_df.to_dict(orient='records'):
-                    if str(ing.get('id')) == str(ing_id):
-                        ing_name = ing.get('name')
-                        break
-                row = dict(op)
-                row['ingredient_name'] = ing_name if ing_name else op.get('ingredient_name', '')
-                res.append(row)
-            return res
-        stock_in_export = add_ing_name(stock_in)
-        stock_out_export = add_ing_name(stock_out)
-        with pd.ExcelWriter('accounting_export.xlsx') as writer:
-            pd.DataFrame(orders_export).to_excel(writer, sheet_name='Заказы', index=False)
-            pd.DataFrame(stock_in_export).to_excel(writer, sheet_name='Поставки', index=False)
-            pd.DataFrame(stock_out_export).to_excel(writer, sheet_name='Списания', index=False)
-            pd.DataFrame([{
+        path = build_accounting_export(
+            filtered_orders, period_orders.columns, stock_in, stock_out, period_stock.columns,
+            {
                 'Поступления (продажи)': total_income,
                 'Себестоимость реализованного': total_cost,
                 'Поставки (всего)': total_stock_in,
@@ -1074,83 +1020,18 @@ def accounting():
                 'Зарплата': salary,
                 'Аренда': rent,
                 'Прибыль': total_income - total_cost - salary - rent
-            }]).to_excel(writer, sheet_name='Итоги', index=False)
-            # Лист "Роллы"
-            rolls_export = []
-            for rid, roll in roll_costs.items():
-                rolls_export.append({
-                    'id': rid,
-                    'Название': roll['name'],
-                    'Себестоимость': roll['cost'],
-                    'Цена продажи': roll['sale_price']
-                })
-            pd.DataFrame(rolls_export).to_excel(writer, sheet_name='Роллы', index=False)
-            # Лист "Ингредиенты"
-            ingredients_export = []
-            for ing in ingredients_df.to_dict(orient='records'):
-                stock_value = (ing.get('quantity') or 0) * (ing.get('price_per_unit') or 0)
-                ingredients_export.append({
-                    'id': ing.get('id'),
-                    'Название': ing.get('name'),
-                    'Остаток': ing.get('quantity'),
-                    'Ед. изм.': ing.get('unit'),
-                    'Цена за ед.': ing.get('price_per_unit'),
-                    'Сумма на складе': round(stock_value, 2)
-                })
-            pd.DataFrame(ingredients_export).to_excel(writer, sheet_name='Ингредиенты', index=False)
-            # Лист "Рецепты"
-            recipes_export = []
-            for _, rec in recipes_df.iterrows():
-                roll_id = rec['roll_id']
-                ingredient_id = rec['ingredient_id']
-                roll_name = roll_costs[roll_id]['name'] if roll_id in roll_costs else str(roll_id)
-                ing_name = None
-                for ing in ingredients_df.to_dict(orient='records'):
-                    if str(ing.get('id')) == str(ingredient_id):
-                        ing_name = ing.get('name')
-                        break
-                recipes_export.append({
-                    'roll_id': roll_id,
-                    'roll_name': roll_name,
-                    'ingredient_id': ingredient_id,
-                    'ingredient_name': ing_name if ing_name else '',
-                    'amount_per_roll': rec['amount_per_roll']
-                })
-            pd.DataFrame(recipes_export).to_excel(writer, sheet_name='Рецепты', index=False)
-            # Лист "Расход по заказам"
-            if os.path.exists('order_ingredients.xlsx') and os.path.exists('orders.xlsx'):
-                order_ingredients_df = pd.read_excel('order_ingredients.xlsx')
-                orders_df_full = pd.read_excel('orders.xlsx')
-                recipes_df_full = pd.read_excel('roll_recipes.xlsx') if os.path.exists('roll_recipes.xlsx') else pd.DataFrame()
-                order_roll_map = {row['id']: row['roll_id'] for _, row in orders_df_full.iterrows()}
-                roll_name_map = {rid: roll['name'] for rid, roll in roll_costs.items()}
-                ing_name_map = {ing['id']: ing['name'] for ing in ingredients_df.to_dict(orient='records')}
-                oi_export = []
-                for _, row in order_ingredients_df.iterrows():
-                    order_id = row['order_id']
-                    ingredient_id = row['ingredient_id']
-                    used_amount = row['used_amount']
-                    roll_id = order_roll_map.get(order_id, '')
-                    roll_name = roll_name_map.get(roll_id, '')
-                    ing_name = ing_name_map.get(ingredient_id, '')
-                    oi_export.append({
-                        'order_id': order_id,
-                        'roll_id': roll_id,
-                        'roll_name': roll_name,
-                        'ingredient_id': ingredient_id,
-                        'ingredient_name': ing_name,
-                        'used_amount': used_amount
-                    })
-                pd.DataFrame(oi_export).to_excel(writer, sheet_name='Расход по заказам', index=False)
-            # Лист "Сотрудники"
-            if os.path.exists('employees.xlsx'):
-                employees_df = pd.read_excel('employees.xlsx')
-                pd.DataFrame(employees_df).to_excel(writer, sheet_name='Сотрудники', index=False)
-            # Лист "Посещаемость"
-            if os.path.exists('attendance.xlsx'):
-                attendance_df = pd.read_excel('attendance.xlsx')
-                pd.DataFrame(attendance_df).to_excel(writer, sheet_name='Посещаемость', index=False)
-        return send_file('accounting_export.xlsx', as_attachment=True)
+            },
+            roll_costs, ingredients_df, recipes_df
+        )
+        # Временный файл удаляется после отправки
+        return app.response_class(
+            stream_file_and_remove(path),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={
+                'Content-Disposition': 'attachment; filename=accounting_export.xlsx',
+                'Content-Length': str(os.path.getsize(path))
+            }
+        )
     # --- Список ингредиентов для фильтра ---
     ingredients = ingredients_df.to_dict(orient='records') if not ingredients_df.empty else []
     return render_template('accounting.html',
@@ -1186,41 +1067,24 @@ def analytics():
     if not date_to:
         date_to = today.strftime('%Y-%m-%d')
     # --- Загрузка данных ---
-    orders_df = pd.read_excel(ORDERS_FILE) if os.path.exists(ORDERS_FILE) else pd.DataFrame()
-    rolls_df = pd.read_excel(ROLLS_FILE) if os.path.exists(ROLLS_FILE) else pd.DataFrame()
-    recipes_df = pd.read_excel('roll_recipes.xlsx') if os.path.exists('roll_recipes.xlsx') else pd.DataFrame()
-    ingredients_df = pd.read_excel(INGREDIENTS_FILE) if os.path.exists(INGREDIENTS_FILE) else pd.DataFrame()
+    rolls_df = storage.read(ROLLS_FILE) if storage.exists(ROLLS_FILE) else pd.DataFrame()
     # --- Себестоимость и продажная цена ---
     roll_costs = {}
+    costs = cost_engine.roll_costs()
     for _, roll in rolls_df.iterrows():
-        cost = 0
-        for _, rec in recipes_df[recipes_df['roll_id'] == roll['id']].iterrows():
-            ing_row = ingredients_df[ingredients_df['id'] == rec['ingredient_id']]
-            if not ing_row.empty:
-                cost += rec['amount_per_roll'] * ing_row.iloc[0]['price_per_unit']
+        cost = costs.get(roll['id'], 0)
         sale_price = roll['sale_price'] if 'sale_price' in roll and not pd.isna(roll['sale_price']) else round(cost * 1.2, 2)
         roll_costs[roll['id']] = {'cost': cost, 'sale_price': sale_price, 'name': roll['name']}
-    # --- Фильтрация по дате ---
-    def in_period(dt):
-        try:
-            d = pd.to_datetime(dt).date()
-            return pd.to_datetime(date_from).date() <= d <= pd.to_datetime(date_to).date()
-        except:
-            return False
-    # --- Аналитика по продажам роллов ---
+    # --- Аналитика по продажам роллов (из дневных агрегатов) ---
+    period_sales = daily_rollup.sales(date_from, date_to)
+    period_sales = period_sales[period_sales['item_type'] == 'roll']
+    # пропустить заказы по удалённым роллам
+    period_sales = period_sales[period_sales['item_id'].isin(list(roll_costs))]
     sales = {}
     profit = {}
-    if not orders_df.empty:
-        for _, order in orders_df.iterrows():
-            if in_period(order['order_time']):
-                roll_id = order['roll_id']
-                if roll_id not in roll_costs:
-                    continue  # пропустить заказы по удалённым роллам
-                quantity = order['quantity']
-                sale_price = roll_costs[roll_id]['sale_price']
-                cost = roll_costs[roll_id]['cost']
-                sales[roll_id] = sales.get(roll_id, 0) + quantity
-                profit[roll_id] = profit.get(roll_id, 0) + (sale_price - cost) * quantity
+    if not period_sales.empty:
+        sales = period_sales.sort_values('date', kind='stable').groupby('item_id', sort=False)['quantity'].sum().to_dict()
+        profit = {rid: (roll_costs[rid]['sale_price'] - roll_costs[rid]['cost']) * qty for rid, qty in sales.items()}
     # --- График продаж по роллам ---
     roll_names = [roll_costs[rid]['name'] for rid in sales.keys()]
     sales_values = [sales[rid] for rid in sales.keys()]
@@ -1241,90 +1105,52 @@ def analytics():
 
 @app.route('/api/menu')
 def api_menu():
-    import pandas as pd
-    import os
-    # Пути к файлам
-    rolls_file = 'rolls.xlsx'
-    roll_recipes_file = 'roll_recipes.xlsx'
-    ingredients_file = 'ingredients.xlsx'
-    # Проверка наличия файлов
-    if not (os.path.exists(rolls_file) and os.path.exists(roll_recipes_file) and os.path.exists(ingredients_file)):
+    if not menu_snapshot.available():
         return jsonify({'error': 'Menu data not found'}), 404
-    # Чтение данных
-    rolls_df = pd.read_excel(rolls_file)
-    recipes_df = pd.read_excel(roll_recipes_file)
-    ingredients_df = pd.read_excel(ingredients_file)
-    # Категории на основе названий роллов
-    def get_category(roll_name):
-        name_lower = roll_name.lower()
-        if 'темпура' in name_lower or 'запеч' in name_lower:
-            return 'baked'
-        elif 'маки' in name_lower and 'курица' in name_lower:
-            return 'sushi'
-        elif 'овощьной' in name_lower or 'вегетарианский' in name_lower:
-            return 'vegan'
-        elif 'сладкий' in name_lower:
-            return 'dessert'
-        elif 'соус' in name_lower:
-            return 'sauces'
-        else:
-            return 'classic'
-    # Составляем меню
-    menu = []
-    for _, roll in rolls_df.iterrows():
-        roll_id = int(roll['id'])
-        name = str(roll['name'])
-        price = int(roll['sale_price']) if not pd.isna(roll['sale_price']) and str(roll['sale_price']).isdigit() else 0
-        # Состав и вес
-        recipe = recipes_df[recipes_df['roll_id'] == roll_id]
-        ingredients = []
-        weight = 0
-        for _, rec in recipe.iterrows():
-            ing_row = ingredients_df[ingredients_df['id'] == rec['ingredient_id']]
-            if not ing_row.empty:
-                ing_name = str(ing_row.iloc[0]['name'])
-                amount = rec['amount_per_roll']
-                if isinstance(amount, str):
-                    try:
-                        amount = float(amount.replace(',', '.'))
-                    except:
-                        amount = 0
-                weight += amount if isinstance(amount, (int, float)) else 0
-                ingredients.append(ing_name)
-        # Категория
-        category = get_category(name)
-        menu.append({
-            'id': roll_id,
-            'name': name,
-            'category': category,
-            'ingredients': ', '.join(ingredients),
-            'weight': int(weight),
-            'price': price,
-            'image': '/client_pwa/image.png'
-        })
-    # Категории для фронта
-    categories = [
-        {'id': 'classic', 'name': 'Классические роллы'},
-        {'id': 'baked', 'name': 'Тёплые роллы'},
-        {'id': 'sushi', 'name': 'Суши'},
-        {'id': 'vegan', 'name': 'Вегетарианские'},
-        {'id': 'dessert', 'name': 'Десерты'},
-        {'id': 'sauces', 'name': 'Соусы'}
-    ]
-    return jsonify({'categories': categories, 'rolls': menu})
+    body, gzip_body, digest = menu_snapshot.get()
+    # Для gzip-варианта свой ETag: строгий ETag относится к конкретному представлению
+    use_gzip = 'gzip' in request.accept_encodings
+    etag = f'{digest}-gz' if use_gzip else digest
+    if request.if_none_match.contains(digest) or request.if_none_match.contains(f'{digest}-gz'):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(gzip_body if use_gzip else body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Клиент всегда перепроверяет меню, но повторная загрузка стоит только 304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/download_backups')
 @role_required(['admin', 'accountant', 'owner'])
 def download_backups():
-    # Собираем все .xlsx-файлы в рабочей папке
-    files = glob.glob('*.xlsx')
     mem_zip = io.BytesIO()
+    audit_sink.flush()
     with zipfile.ZipFile(mem_zip, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for file in files:
+        # Журнал аудита (с ротированными частями)
+        for file in audit_sink.files():
             zf.write(file)
+        if storage.name == 'excel':
+            # Собираем все .xlsx-файлы в рабочей папке
+            for file in glob.glob('*.xlsx'):
+                zf.write(file)
+        else:
+            # Данные лежат в SQLite: выгружаем каждую таблицу в .xlsx
+            for table in TABLE_COLUMNS:
+                buffer = io.BytesIO()
+                storage.read(table).to_excel(buffer, index=False)
+                zf.writestr(table, buffer.getvalue())
     mem_zip.seek(0)
     return send_file(mem_zip, mimetype='application/zip', as_attachment=True, download_name='sushi_backups.zip')
 
+@app.route('/cache_stats')
+@role_required(['admin', 'accountant', 'owner'])
+def cache_stats():
+    """Попадания/промахи кэша Excel-таблиц текущего воркера"""
+    return jsonify(table_cache.stats())
+
 @app.route('/pwa')
 def pwa_index():
     return send_from_directory('client_pwa', 'index.html')
@@ -0,0 +1,160 @@
+"""Журнал аудита: дописываемый JSONL с буферизацией и ротацией по размеру.
+
+Запись копится в буфере и сбрасывается пачкой (по размеру пачки или по
+возрасту буфера), файл ротируется при превышении max_bytes:
+audit_log.jsonl -> audit_log.jsonl.1 -> ... -> audit_log.jsonl.N.
+Чтение идёт с конца журнала, так что последние страницы не требуют
+загрузки всей истории.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессной блокировки нет
+    fcntl = None
+
+AUDIT_JSONL_FILE = 'audit_log.jsonl'
+
+
+def _reverse_lines(path, chunk_size=65536):
+    """Строки файла с конца к началу"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b''
+        while position > 0:
+            step = min(chunk_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + tail).split(b'\n')
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if tail.strip():
+            yield tail
+
+
+class AuditSink:
+    def __init__(self, path=AUDIT_JSONL_FILE, batch_size=20, flush_interval=2.0,
+                 max_bytes=5 * 1024 * 1024, backup_count=10):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = []
+        self._first_buffered_at = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    # --- запись ---
+    def write(self, row):
+        with self._lock:
+            if not self._buffer:
+                self._first_buffered_at = time.monotonic()
+                # Сброс по таймеру, чтобы одиночная запись не застряла в буфере
+                timer = threading.Timer(self.flush_interval, self.flush)
+                timer.daemon = True
+                timer.start()
+            self._buffer.append(row)
+            due = (len(self._buffer) >= self.batch_size or
+                   time.monotonic() - self._first_buffered_at >= self.flush_interval)
+        if due:
+            self.flush()
+
+    @contextmanager
+    def _file_lock(self):
+        """Блокировка журнала между воркерами gunicorn"""
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, rows):
+        data = ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in rows)
+        # Пачка пишется одним вызовом write в режиме append
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+        if os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            with self._file_lock():
+                self._append(rows)
+
+    def _rotate(self):
+        oldest = f'{self.path}.{self.backup_count}'
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+    # --- чтение ---
+    def files(self):
+        """Файлы журнала от нового к старому"""
+        paths = [self.path] + [f'{self.path}.{i}' for i in range(1, self.backup_count + 1)]
+        return [p for p in paths if os.path.exists(p)]
+
+    def iter_newest_first(self):
+        self.flush()
+        for path in self.files():
+            for line in _reverse_lines(path):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def query(self, date_from=None, date_to=None, page=1, per_page=50):
+        """Страница записей (новые сверху) с фильтром по дате 'YYYY-MM-DD'.
+
+        Возвращает (rows, has_next). Записи идут в хронологическом порядке,
+        поэтому чтение прекращается, как только пройдена дата date_from.
+        """
+        page = max(int(page), 1)
+        skip = (page - 1) * per_page
+        rows = []
+        for row in self.iter_newest_first():
+            day = str(row.get('datetime', ''))[:10]
+            if date_to and day > date_to:
+                continue
+            if date_from and day < date_from:
+                break
+            if skip:
+                skip -= 1
+                continue
+            rows.append(row)
+            if len(rows) > per_page:
+                break
+        return rows[:per_page], len(rows) > per_page
+
+    def import_if_empty(self, load_rows):
+        """Разовый перенос старого журнала; load_rows() отдаёт строки по возрастанию даты"""
+        if self.files():
+            return 0
+        with self._file_lock():
+            if self.files():
+                return 0
+            rows = load_rows()
+            if rows:
+                self._append(rows)
+            return len(rows)
+
+
+audit_sink = AuditSink()
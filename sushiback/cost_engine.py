@@ -0,0 +1,224 @@
+"""Себестоимость роллов и сетов.
+
+Себестоимость всех роллов считается одним merge/groupby по рецептам и
+ингредиентам, себестоимость сетов — суммой роллов из состава. Результат
+запоминается до изменения рецептов, ингредиентов или состава сетов
+(по версиям таблиц в хранилище).
+
+Себестоимость, сохранённая в таблицах (cost_price/gross_profit/margin_percent
+сетов и cost роллов), обновляется через recalculate(): по обратному индексу
+ингредиент -> роллы -> сеты пересчитываются только зависящие от изменённых
+ингредиентов строки и записываются одним update_many на таблицу.
+Строки, себестоимость которых не совпадала с расчётной по старым ценам
+(задана вручную), не перезаписываются.
+"""
+import threading
+import pandas as pd
+
+from models import INGREDIENTS_FILE, ROLLS_FILE, ROLL_RECIPES_FILE, SETS_FILE, SET_COMPOSITION_FILE
+from storage import storage
+
+
+def _numeric(series):
+    if series.dtype == object:
+        series = series.astype(str).str.replace(',', '.', regex=False)
+    return pd.to_numeric(series, errors='coerce')
+
+
+def _scalar(value):
+    return _numeric(pd.Series([value])).iloc[0]
+
+
+def recipe_lines(recipes_df, ingredients_df, roll_id=None):
+    """Строки рецептов с ценой ингредиента и стоимостью (amount_per_roll * price_per_unit).
+
+    Рецепты без найденного ингредиента отбрасываются, как и раньше.
+    """
+    if recipes_df.empty or ingredients_df.empty:
+        return pd.DataFrame(columns=['roll_id', 'ingredient_id', 'amount_per_roll', 'name', 'unit',
+                                     'quantity', 'price_per_unit', 'cost'])
+    recipes = recipes_df[['roll_id', 'ingredient_id', 'amount_per_roll']].copy()
+    if roll_id is not None:
+        recipes = recipes[recipes['roll_id'] == roll_id]
+    recipes['ingredient_id'] = _numeric(recipes['ingredient_id'])
+    recipes['amount_per_roll'] = _numeric(recipes['amount_per_roll']).fillna(0)
+    columns = [c for c in ['id', 'name', 'unit', 'quantity', 'price_per_unit'] if c in ingredients_df.columns]
+    ingredients = ingredients_df[columns].copy()
+    ingredients['id'] = _numeric(ingredients['id'])
+    # При дублях id берём первую строку — так же, как iloc[0] в старом коде
+    ingredients = ingredients.drop_duplicates('id', keep='first')
+    lines = recipes.merge(ingredients, left_on='ingredient_id', right_on='id', how='inner').drop(columns='id')
+    lines['price_per_unit'] = _numeric(lines['price_per_unit']).fillna(0)
+    lines['cost'] = lines['amount_per_roll'] * lines['price_per_unit']
+    return lines
+
+
+def compute_roll_costs(recipes_df, ingredients_df):
+    """{roll_id: себестоимость} по всем роллам, у которых есть рецепт"""
+    lines = recipe_lines(recipes_df, ingredients_df)
+    if lines.empty:
+        return {}
+    totals = lines.dropna(subset=['roll_id']).groupby('roll_id')['cost'].sum()
+    return {int(roll_id): float(cost) for roll_id, cost in totals.items()}
+
+
+def compute_set_costs(composition_df, roll_costs):
+    """{set_id: себестоимость}: сумма себестоимостей роллов из состава"""
+    if composition_df.empty:
+        return {}
+    composition = composition_df.dropna(subset=['set_id', 'roll_id'])
+    costs = composition['roll_id'].astype(int).map(roll_costs).fillna(0)
+    totals = costs.groupby(composition['set_id'].astype(int)).sum()
+    return {int(set_id): float(cost) for set_id, cost in totals.items()}
+
+
+def set_margin(set_price, cost):
+    """Валовая прибыль и маржа сета, как при редактировании состава"""
+    gross_profit = set_price - cost
+    margin_percent = (gross_profit / cost * 100) if cost > 0 else 0
+    return gross_profit, margin_percent
+
+
+def build_dependents(recipes_df, composition_df):
+    """Обратный индекс: ({ingredient_id: {roll_id}}, {roll_id: {set_id}})"""
+    rolls_by_ingredient = {}
+    recipes = recipes_df[['ingredient_id', 'roll_id']].apply(_numeric).dropna().astype(int)
+    for ingredient_id, roll_id in recipes.itertuples(index=False, name=None):
+        rolls_by_ingredient.setdefault(ingredient_id, set()).add(roll_id)
+    sets_by_roll = {}
+    if not composition_df.empty:
+        composition = composition_df[['roll_id', 'set_id']].apply(_numeric).dropna().astype(int)
+        for roll_id, set_id in composition.itertuples(index=False, name=None):
+            sets_by_roll.setdefault(roll_id, set()).add(set_id)
+    return rolls_by_ingredient, sets_by_roll
+
+
+class CostEngine:
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._roll_key = None
+        self._roll_costs = {}
+        self._set_key = None
+        self._set_costs = {}
+        self._dependents_key = None
+        self._dependents = ({}, {})
+
+    def _versions(self, *tables):
+        return tuple(self.storage.version(t) for t in tables)
+
+    def roll_costs(self):
+        """{roll_id: себестоимость}, пересчёт только при изменении рецептов или ингредиентов"""
+        key = self._versions(ROLL_RECIPES_FILE, INGREDIENTS_FILE)
+        with self._lock:
+            if key == self._roll_key:
+                return self._roll_costs
+        costs = compute_roll_costs(self.storage.read(ROLL_RECIPES_FILE), self.storage.read(INGREDIENTS_FILE))
+        with self._lock:
+            self._roll_key, self._roll_costs = key, costs
+        return costs
+
+    def set_costs(self):
+        """{set_id: себестоимость} по текущему составу сетов"""
+        key = self._versions(ROLL_RECIPES_FILE, INGREDIENTS_FILE, SET_COMPOSITION_FILE)
+        with self._lock:
+            if key == self._set_key:
+                return self._set_costs
+        costs = compute_set_costs(self.storage.read(SET_COMPOSITION_FILE), self.roll_costs())
+        with self._lock:
+            self._set_key, self._set_costs = key, costs
+        return costs
+
+    def roll_cost(self, roll_id):
+        return self.roll_costs().get(int(roll_id), 0.0)
+
+    def dependents(self, ingredient_ids):
+        """(роллы, сеты), себестоимость которых зависит от ингредиентов ingredient_ids"""
+        key = self._versions(ROLL_RECIPES_FILE, SET_COMPOSITION_FILE)
+        with self._lock:
+            index = self._dependents if key == self._dependents_key else None
+        if index is None:
+            index = build_dependents(self.storage.read(ROLL_RECIPES_FILE), self._composition())
+            with self._lock:
+                self._dependents_key, self._dependents = key, index
+        rolls_by_ingredient, sets_by_roll = index
+        roll_ids = set().union(*(rolls_by_ingredient.get(int(i), ()) for i in ingredient_ids))
+        set_ids = set().union(*(sets_by_roll.get(roll_id, ()) for roll_id in roll_ids))
+        return roll_ids, set_ids
+
+    def _composition(self):
+        if not self.storage.exists(SET_COMPOSITION_FILE):
+            return pd.DataFrame(columns=['set_id', 'roll_id'])
+        return self.storage.read(SET_COMPOSITION_FILE)
+
+    def recalculate(self, ingredient_ids, previous_prices=None):
+        """Пересчитать и сохранить себестоимость роллов и сетов после смены цен ингредиентов.
+
+        previous_prices — {id ингредиента: цена до изменения}: роллы и сеты,
+        чья сохранённая себестоимость не совпадала с расчётной по этим ценам,
+        заданы вручную и пропускаются. Возвращает (число обновлённых роллов,
+        число обновлённых сетов, число пропущенных).
+        """
+        roll_ids, set_ids = self.dependents(ingredient_ids)
+        if not roll_ids:
+            return 0, 0, 0
+        composition = self._composition()
+        composition = composition[_numeric(composition['set_id']).isin(set_ids)]
+        # Для сетов нужны и роллы состава, не зависящие от этих ингредиентов
+        needed = roll_ids | set(_numeric(composition['roll_id']).dropna().astype(int))
+        recipes = self.storage.read(ROLL_RECIPES_FILE)
+        recipes = recipes[_numeric(recipes['roll_id']).isin(needed)]
+        ingredients = self.storage.read(INGREDIENTS_FILE)
+        costs = compute_roll_costs(recipes, ingredients)
+        previous_costs = previous_set_costs = None
+        if previous_prices:
+            ingredients = ingredients.copy()
+            changed = _numeric(ingredients['id']).isin(previous_prices)
+            ingredients.loc[changed, 'price_per_unit'] = _numeric(ingredients.loc[changed, 'id']).map(previous_prices)
+            previous_costs = compute_roll_costs(recipes, ingredients)
+            previous_set_costs = compute_set_costs(composition, previous_costs)
+        skipped = 0
+
+        rolls = self.storage.read(ROLLS_FILE)
+        roll_rows = {}
+        if 'cost' in rolls.columns:
+            current = dict(zip(_numeric(rolls['id']), _numeric(rolls['cost'])))
+            for roll_id in roll_ids:
+                cost = round(costs.get(roll_id, 0.0), 2)
+                if roll_id not in current or current[roll_id] == cost:
+                    continue
+                if previous_costs is not None and round(current[roll_id], 2) != round(previous_costs.get(roll_id, 0.0), 2):
+                    skipped += 1
+                    continue
+                roll_rows[roll_id] = {'cost': cost}
+        self.storage.update_many(ROLLS_FILE, roll_rows)
+
+        set_rows = {}
+        if set_ids:
+            sets = self.storage.read(SETS_FILE)
+            sets = sets[_numeric(sets['id']).isin(set_ids)]
+            set_costs = compute_set_costs(composition, costs)
+            for set_row in sets.to_dict(orient='records'):
+                set_id = int(set_row['id'])
+                cost = round(set_costs.get(set_id, 0.0), 2)
+                stored = _scalar(set_row.get('cost_price'))
+                if stored == cost:
+                    continue
+                if previous_set_costs is not None and round(stored, 2) != round(previous_set_costs.get(set_id, 0.0), 2):
+                    skipped += 1
+                    continue
+                set_price = _scalar(set_row.get('set_price'))
+                set_price = 0 if pd.isna(set_price) else set_price
+                gross_profit, margin_percent = set_margin(set_price, cost)
+                set_rows[set_row['id']] = {'cost_price': cost, 'gross_profit': gross_profit,
+                                           'margin_percent': margin_percent}
+            self.storage.update_many(SETS_FILE, set_rows)
+        return len(roll_rows), len(set_rows), skipped
+
+    def composition_cost(self, roll_ids):
+        """Себестоимость произвольного набора роллов (например, нового состава сета)"""
+        costs = self.roll_costs()
+        return sum(costs.get(int(roll_id), 0.0) for roll_id in roll_ids)
+
+
+cost_engine = CostEngine(storage)
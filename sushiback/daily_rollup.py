@@ -0,0 +1,168 @@
+"""Дневные агрегаты по заказам.
+
+daily_sales: (date, item_type, item_id, status) -> orders, quantity, income
+daily_ingredient_usage: (date, ingredient_id, status) -> used_amount
+
+Агрегаты обновляются в момент создания заказа, смены статуса и выполнения
+(см. app.py), а отчёты читают уже сгруппированные строки вместо orders.xlsx
+и order_ingredients.xlsx. Дата — день заказа (order_time); заказы с
+неразобранной датой и при пересчёте, и при обновлениях хранятся с пустой
+датой: в отчёты за период они не попадают, в итоги за всё время — попадают.
+
+Полный пересчёт из заказов (например, после ручной правки файлов):
+    python daily_rollup.py rebuild
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+from models import ORDERS_FILE, ORDER_INGREDIENTS_FILE, DAILY_SALES_FILE, DAILY_USAGE_FILE, TABLE_COLUMNS
+from storage import storage
+from period_index import parse_dates
+
+DONE_STATUS = 'Сделан'
+
+
+def order_day(order_time):
+    """'YYYY-MM-DD' для времени заказа или None, если дату не разобрать"""
+    ts = pd.to_datetime(order_time, errors='coerce')
+    if ts is None or pd.isna(ts):
+        return None
+    return ts.strftime('%Y-%m-%d')
+
+
+def _int_ids(values):
+    """id как int (или None) — ключи совпадают с инкрементальными обновлениями"""
+    return [int(v) if v is not None and not pd.isna(v) else None for v in values]
+
+
+def _order_key(order, status):
+    item_type = order.get('order_type')
+    if not isinstance(item_type, str) or not item_type:
+        item_type = 'roll'
+    item_id = order.get('set_id') if item_type == 'set' else order.get('roll_id')
+    return {
+        'date': order_day(order.get('order_time')),
+        'item_type': item_type,
+        'item_id': int(item_id) if item_id is not None and not pd.isna(item_id) else None,
+        'status': status,
+    }
+
+
+class DailyRollup:
+    def __init__(self, storage):
+        self.storage = storage
+
+    # --- инкрементальные обновления ---
+    def record_order(self, order):
+        """Новый заказ (словарь строки orders)"""
+        key = _order_key(order, order.get('status'))
+        self.storage.accumulate(DAILY_SALES_FILE, [(key, {
+            'orders': 1,
+            'quantity': order.get('quantity') or 0,
+            'income': order.get('total_price') or 0,
+        })])
+
+    def change_status(self, order, new_status):
+        """Перенести агрегаты заказа со старого статуса на новый (вызывать до записи нового расхода)"""
+        old_status = order.get('status')
+        if old_status == new_status:
+            return
+        old_key = _order_key(order, old_status)
+        quantity = order.get('quantity') or 0
+        income = order.get('total_price') or 0
+        self.storage.accumulate(DAILY_SALES_FILE, [
+            (old_key, {'orders': -1, 'quantity': -quantity, 'income': -income}),
+            ({**old_key, 'status': new_status}, {'orders': 1, 'quantity': quantity, 'income': income}),
+        ])
+        # Уже записанный расход ингредиентов по заказу тоже переходит на новый статус
+        usage_df = self.storage.read(ORDER_INGREDIENTS_FILE)
+        usage_df = usage_df[usage_df['order_id'] == order.get('id')]
+        if usage_df.empty:
+            return
+        rows = []
+        for ingredient_id, used in usage_df.groupby('ingredient_id')['used_amount'].sum().items():
+            key = {'date': old_key['date'], 'ingredient_id': int(ingredient_id)}
+            rows.append(({**key, 'status': old_status}, {'used_amount': -used}))
+            rows.append(({**key, 'status': new_status}, {'used_amount': used}))
+        self.storage.accumulate(DAILY_USAGE_FILE, rows)
+
+    def add_usage(self, order, used_rows, status=DONE_STATUS):
+        """Расход ингредиентов по заказу (строки order_ingredients)"""
+        day = order_day(order.get('order_time'))
+        if not used_rows:
+            return
+        totals = {}
+        for row in used_rows:
+            ingredient_id = int(row['ingredient_id'])
+            totals[ingredient_id] = totals.get(ingredient_id, 0) + row['used_amount']
+        self.storage.accumulate(DAILY_USAGE_FILE, [
+            ({'date': day, 'ingredient_id': ingredient_id, 'status': status}, {'used_amount': used})
+            for ingredient_id, used in totals.items()
+        ])
+
+    # --- пересчёт ---
+    def rebuild(self):
+        """Пересчитать обе таблицы агрегатов из orders и order_ingredients"""
+        orders_df = self.storage.read(ORDERS_FILE)
+        if orders_df.empty:
+            sales = pd.DataFrame(columns=TABLE_COLUMNS[DAILY_SALES_FILE])
+            usage = pd.DataFrame(columns=TABLE_COLUMNS[DAILY_USAGE_FILE])
+        else:
+            orders_df = orders_df.copy()
+            orders_df['date'] = parse_dates(orders_df['order_time']).dt.strftime('%Y-%m-%d')
+            if 'order_type' in orders_df.columns:
+                orders_df['item_type'] = orders_df['order_type'].fillna('roll').replace('', 'roll')
+            else:
+                orders_df['item_type'] = 'roll'
+            item_ids = np.where(orders_df['item_type'] == 'set', orders_df['set_id'], orders_df['roll_id'])
+            orders_df['item_id'] = _int_ids(item_ids)
+            # Заказы с неразобранной датой остаются в агрегатах (date пустая), как и при обновлениях
+            sales = (orders_df.groupby(['date', 'item_type', 'item_id', 'status'], dropna=False)
+                     .agg(orders=('id', 'size'), quantity=('quantity', 'sum'), income=('total_price', 'sum'))
+                     .reset_index())
+            usage_df = self.storage.read(ORDER_INGREDIENTS_FILE)
+            usage_df['ingredient_id'] = _int_ids(usage_df['ingredient_id'])
+            usage = (usage_df.merge(orders_df[['id', 'date', 'status']], left_on='order_id', right_on='id')
+                     .groupby(['date', 'ingredient_id', 'status'], dropna=False)['used_amount'].sum()
+                     .reset_index())
+        self.storage.write(DAILY_SALES_FILE, sales[TABLE_COLUMNS[DAILY_SALES_FILE]])
+        self.storage.write(DAILY_USAGE_FILE, usage[TABLE_COLUMNS[DAILY_USAGE_FILE]])
+        return len(sales), len(usage)
+
+    def ensure(self):
+        """Построить агрегаты при первом запуске, если заказы уже есть"""
+        if self.storage.read(DAILY_SALES_FILE).empty and not self.storage.read(ORDERS_FILE).empty:
+            self.rebuild()
+
+    # --- чтение ---
+    @staticmethod
+    def _between(df, date_from, date_to):
+        if date_from is None and date_to is None:
+            return df
+        try:
+            date_from = pd.to_datetime(date_from).strftime('%Y-%m-%d')
+            date_to = pd.to_datetime(date_to).strftime('%Y-%m-%d')
+        except (ValueError, TypeError):
+            return df.iloc[0:0]
+        dates = df['date'].astype(str)
+        return df[df['date'].notna() & (dates >= date_from) & (dates <= date_to)]
+
+    def sales(self, date_from=None, date_to=None):
+        """Агрегаты продаж; с датами — только за период (включительно)"""
+        return self._between(self.storage.read(DAILY_SALES_FILE), date_from, date_to)
+
+    def usage(self, date_from=None, date_to=None):
+        """Агрегаты расхода ингредиентов"""
+        return self._between(self.storage.read(DAILY_USAGE_FILE), date_from, date_to)
+
+
+daily_rollup = DailyRollup(storage)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+        sales_rows, usage_rows = daily_rollup.rebuild()
+        print(f'Агрегаты пересчитаны: продаж {sales_rows}, расхода {usage_rows}')
+    else:
+        print('Использование: python daily_rollup.py rebuild')
@@ -0,0 +1,200 @@
+"""Нормализация названий ингредиентов.
+
+Название приводится к ключу (регистр, ё/е, пробелы) и ищется:
+1. в словаре синонимов ALIASES (синоним -> каноническое название) — хеш-индекс,
+   собирается один раз;
+2. если не нашлось — нечётко, по индексу триграмм (коэффициент Дайса не ниже
+   FUZZY_THRESHOLD): ловит опечатки вроде «сыр творжный».
+
+resolve() сопоставляет название с ингредиентами на складе. Индекс склада
+пересобирается только при изменении таблицы ингредиентов (по версии в
+хранилище), поэтому проверка при добавлении и редактировании ингредиента
+не перечитывает таблицу.
+"""
+import threading
+
+from models import INGREDIENTS_FILE
+from storage import storage
+
+# Опечатка в одну букву даёт не меньше ~0.7; разные продукты с общим словом
+# («соевый соус» / «сырный соус» — 0.61) ниже порога
+FUZZY_THRESHOLD = 0.7
+
+# Каноническое название -> синонимы и частые опечатки
+ALIASES = {
+    'нори': ['нори'],
+    'рис': ['рис'],
+    'сыр творожный': ['сыр твор', 'сыр товр', 'твор сыр', 'сыр творож'],
+    'краб': ['краб'],
+    'огурец': ['огурец', 'огурцы'],
+    'майонез': ['майонез'],
+    'икра масаго': ['масага кр', 'икра масага'],
+    'васаби': ['васаби'],
+    'соевый соус': ['соевый соус'],
+    'имбирь': ['имбир', 'имбирь'],
+    'семга': ['семга'],
+    'лосось': ['лосось', 'капч лосось'],
+    'яйцо': ['яйцо'],
+    'курица': ['курица', 'капчен кур'],
+    'сырный соус': ['сырный соус', 'сырный соус 350', 'сыр соус'],
+    'перец': ['перец'],
+    'сахар': ['сахар'],
+    'соль': ['соль'],
+    'вода': ['вода'],
+    'шоколад': ['шоколад'],
+    'банан': ['банан'],
+    'клубника': ['клубника'],
+    'киви': ['киви'],
+    'чипсы': ['чипсы'],
+    'сухари': ['сухари'],
+    'мука': ['мука'],
+    'сыр пармезан': ['сыр пармизан'],
+    'сыр чеддер': ['сыр чеддер'],
+    'омлет': ['омлет'],
+    'ширачи': ['ширачи'],
+    'мицукан': ['мицукан'],
+    'унаги соус': ['унаги соус'],
+    'сприн тесто': ['сприн тесто'],
+    'угорь': ['угорь'],
+    'кунжут': ['кунжут'],
+}
+
+
+def normalize(name):
+    """Ключ для сравнения: без регистра, ё -> е, одиночные пробелы"""
+    if name is None:
+        return ''
+    return ' '.join(str(name).lower().replace('ё', 'е').split())
+
+
+def display_name(key):
+    """Каноническое название для сохранения: ключи ALIASES в нижнем регистре"""
+    return key[:1].upper() + key[1:]
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм: триграмма -> ключи"""
+
+    def __init__(self, keys=()):
+        self._postings = {}
+        self._sizes = {}
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        if key in self._sizes:
+            return
+        grams = trigrams(key)
+        self._sizes[key] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def similar(self, key, threshold=FUZZY_THRESHOLD):
+        """[(сходство, ключ)] по убыванию сходства; смотрим только ключи с общими триграммами"""
+        grams = trigrams(key)
+        shared = {}
+        for gram in grams:
+            for candidate in self._postings.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        scored = [(2 * common / (len(grams) + self._sizes[candidate]), candidate)
+                  for candidate, common in shared.items()]
+        return sorted((item for item in scored if item[0] >= threshold), key=lambda item: (-item[0], item[1]))
+
+
+class IngredientMatch:
+    def __init__(self, name, canonical, how, existing=None, score=1.0):
+        self.name = name  # название для сохранения
+        self.canonical = canonical  # ключ канонического названия
+        self.how = how  # 'exact' | 'alias' | 'fuzzy' | 'new'
+        self.existing = existing  # строка ингредиента на складе или None
+        self.score = score
+
+    @property
+    def is_duplicate(self):
+        """Точно тот же ингредиент, что уже на складе"""
+        return self.existing is not None and self.how != 'fuzzy'
+
+
+class IngredientNormalizer:
+    def __init__(self, storage, aliases=ALIASES, threshold=FUZZY_THRESHOLD):
+        self.storage = storage
+        self.threshold = threshold
+        self._aliases = {}
+        for canonical, names in aliases.items():
+            key = normalize(canonical)
+            self._aliases[key] = key
+            for name in names:
+                self._aliases[normalize(name)] = key
+        self._vocabulary = TrigramIndex(self._aliases)
+        self._lock = threading.Lock()
+        self._stock_key = None
+        self._stock = {}  # каноническое название -> строка склада (первая по id)
+        self._stock_index = TrigramIndex()
+
+    def canonical(self, name):
+        """(ключ канонического названия, способ: 'exact' | 'alias' | 'fuzzy' | 'new', сходство)"""
+        key = normalize(name)
+        if key in self._aliases:
+            canonical = self._aliases[key]
+            return canonical, 'exact' if canonical == key else 'alias', 1.0
+        if key:
+            similar = self._vocabulary.similar(key, self.threshold)
+            if similar:
+                score, alias = similar[0]
+                return self._aliases[alias], 'fuzzy', score
+        return key, 'new', 1.0
+
+    def _stock_key_for(self, name):
+        """Ключ строки склада: нечёткие совпадения не склеиваем, только синонимы"""
+        canonical, how, _ = self.canonical(name)
+        return normalize(name) if how == 'fuzzy' else canonical
+
+    def _stock_names(self):
+        key = self.storage.version(INGREDIENTS_FILE)
+        with self._lock:
+            if key == self._stock_key:
+                return self._stock, self._stock_index
+        stock = {}
+        df = self.storage.read(INGREDIENTS_FILE)
+        if not df.empty:
+            for row in df.sort_values('id').to_dict(orient='records'):
+                stock.setdefault(self._stock_key_for(row['name']), row)
+        index = TrigramIndex(stock)
+        with self._lock:
+            self._stock_key, self._stock, self._stock_index = key, stock, index
+        return stock, index
+
+    def resolve(self, name, exclude_id=None):
+        """Сопоставить название с ингредиентами склада (exclude_id — редактируемый ингредиент).
+
+        name для сохранения: введённое, если оно совпадает с ключом или это
+        новый ингредиент (регистр пользователя сохраняется); для синонима —
+        название со склада или каноническое с заглавной буквы.
+        """
+        cleaned = ' '.join(str(name).split())
+        canonical, how, score = self.canonical(name)
+        stock, index = self._stock_names()
+        if how == 'fuzzy':
+            existing = stock.get(canonical)
+            if existing is not None and existing['id'] != exclude_id:
+                return IngredientMatch(cleaned, canonical, 'fuzzy', existing, score)
+            canonical, how = normalize(name), 'new'
+        existing = stock.get(canonical)
+        if how == 'alias':
+            stored = existing['name'] if existing is not None else display_name(canonical)
+        else:
+            stored = cleaned
+        if existing is not None and existing['id'] != exclude_id:
+            return IngredientMatch(stored, canonical, 'exact' if how == 'new' else how, existing)
+        for score, key in index.similar(canonical, self.threshold):
+            if key != canonical and stock[key]['id'] != exclude_id:
+                return IngredientMatch(stored, canonical, 'fuzzy', stock[key], score)
+        return IngredientMatch(stored, canonical, how)
+
+
+ingredient_normalizer = IngredientNormalizer(storage)
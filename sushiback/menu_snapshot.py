@@ -0,0 +1,95 @@
+"""Снимок меню для PWA (/api/menu).
+
+JSON меню собирается один раз и пересобирается только когда меняются
+роллы, рецепты или ингредиенты (по версиям таблиц в хранилище). Вместе
+с телом хранятся gzip-версия и ETag (sha256 тела).
+"""
+import gzip
+import json
+import hashlib
+import threading
+import pandas as pd
+
+from models import INGREDIENTS_FILE, ROLLS_FILE, ROLL_RECIPES_FILE
+from storage import storage
+from cost_engine import recipe_lines
+
+# Категории для фронта
+CATEGORIES = [
+    {'id': 'classic', 'name': 'Классические роллы'},
+    {'id': 'baked', 'name': 'Тёплые роллы'},
+    {'id': 'sushi', 'name': 'Суши'},
+    {'id': 'vegan', 'name': 'Вегетарианские'},
+    {'id': 'dessert', 'name': 'Десерты'},
+    {'id': 'sauces', 'name': 'Соусы'}
+]
+
+
+def get_category(roll_name):
+    """Категория на основе названия ролла"""
+    name_lower = roll_name.lower()
+    if 'темпура' in name_lower or 'запеч' in name_lower:
+        return 'baked'
+    elif 'маки' in name_lower and 'курица' in name_lower:
+        return 'sushi'
+    elif 'овощьной' in name_lower or 'вегетарианский' in name_lower:
+        return 'vegan'
+    elif 'сладкий' in name_lower:
+        return 'dessert'
+    elif 'соус' in name_lower:
+        return 'sauces'
+    else:
+        return 'classic'
+
+
+def build_menu(rolls_df, recipes_df, ingredients_df):
+    """Меню одним проходом: состав и вес всех роллов через один join рецептов"""
+    lines = recipe_lines(recipes_df, ingredients_df)
+    lines['name'] = lines['name'].astype(str)
+    grouped = lines.groupby('roll_id', sort=False)
+    names = grouped['name'].agg(', '.join).to_dict()
+    weights = grouped['amount_per_roll'].sum().to_dict()
+    menu = []
+    for roll in rolls_df.to_dict(orient='records'):
+        roll_id = int(roll['id'])
+        name = str(roll['name'])
+        sale_price = roll.get('sale_price')
+        price = int(sale_price) if not pd.isna(sale_price) and str(sale_price).isdigit() else 0
+        menu.append({
+            'id': roll_id,
+            'name': name,
+            'category': get_category(name),
+            'ingredients': names.get(roll_id, ''),
+            'weight': int(weights.get(roll_id, 0)),
+            'price': price,
+            'image': '/client_pwa/image.png'
+        })
+    return {'categories': CATEGORIES, 'rolls': menu}
+
+
+class MenuSnapshot:
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._key = None
+        self._snapshot = None
+
+    def available(self):
+        return all(self.storage.exists(t) for t in (ROLLS_FILE, ROLL_RECIPES_FILE, INGREDIENTS_FILE))
+
+    def get(self):
+        """(body, gzip_body, etag) текущего меню"""
+        key = tuple(self.storage.version(t) for t in (ROLLS_FILE, ROLL_RECIPES_FILE, INGREDIENTS_FILE))
+        with self._lock:
+            if key == self._key:
+                return self._snapshot
+        menu = build_menu(self.storage.read(ROLLS_FILE), self.storage.read(ROLL_RECIPES_FILE),
+                          self.storage.read(INGREDIENTS_FILE))
+        body = json.dumps(menu, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        snapshot = (body, gzip.compress(body, compresslevel=9), hashlib.sha256(body).hexdigest())
+        with self._lock:
+            self._key, self._snapshot = key, snapshot
+        return snapshot
+
+
+menu_snapshot = MenuSnapshot(storage)
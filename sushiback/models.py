@@ -12,6 +12,30 @@ ATTENDANCE_FILE = 'attendance.xlsx'
 STOCK_HISTORY_FILE = 'stock_history.xlsx'
 SETS_FILE = 'sets.xlsx'
 SET_COMPOSITION_FILE = 'set_composition.xlsx'
+ORDER_INGREDIENTS_FILE = 'order_ingredients.xlsx'
+AUDIT_LOG_FILE = 'audit_log.xlsx'
+EXPENSES_FILE = 'accounting_expenses.xlsx'
+# Дневные агрегаты по заказам (см. daily_rollup.py)
+DAILY_SALES_FILE = 'daily_sales.xlsx'
+DAILY_USAGE_FILE = 'daily_ingredient_usage.xlsx'
+
+# Колонки таблиц: по ним создаются пустые Excel-файлы и схема SQLite (см. storage.py)
+TABLE_COLUMNS = {
+    INGREDIENTS_FILE: ['id', 'name', 'quantity', 'unit', 'price_per_unit'],
+    ROLLS_FILE: ['id', 'name', 'sale_price'],
+    ROLL_RECIPES_FILE: ['roll_id', 'ingredient_id', 'amount_per_roll'],
+    ORDERS_FILE: ['id', 'roll_id', 'set_id', 'quantity', 'order_time', 'total_price', 'cost_per_roll', 'status', 'comment', 'order_type'],
+    EMPLOYEES_FILE: ['id', 'name', 'login', 'password', 'role'],
+    ATTENDANCE_FILE: ['employee_id', 'name', 'role', 'date', 'time', 'mark_type'],
+    STOCK_HISTORY_FILE: ['date', 'ingredient_id', 'ingredient_name', 'operation', 'amount', 'comment'],
+    SETS_FILE: ['id', 'name', 'cost_price', 'retail_price', 'set_price', 'discount_percent', 'gross_profit', 'margin_percent'],
+    SET_COMPOSITION_FILE: ['set_id', 'roll_id', 'roll_name'],
+    ORDER_INGREDIENTS_FILE: ['order_id', 'ingredient_id', 'used_amount'],
+    AUDIT_LOG_FILE: ['datetime', 'action', 'object_type', 'object_name', 'details', 'role', 'comment'],
+    EXPENSES_FILE: ['salary', 'rent'],
+    DAILY_SALES_FILE: ['date', 'item_type', 'item_id', 'status', 'orders', 'quantity', 'income'],
+    DAILY_USAGE_FILE: ['date', 'ingredient_id', 'status', 'used_amount'],
+}
 
 # Статусы заказов
 ORDER_STATUSES = [
@@ -24,16 +48,16 @@ ORDER_STATUSES = [
 
 def init_db():
     if not os.path.exists(INGREDIENTS_FILE):
-        df = pd.DataFrame(columns=['id', 'name', 'quantity', 'unit', 'price_per_unit'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[INGREDIENTS_FILE])
         df.to_excel(INGREDIENTS_FILE, index=False)
     if not os.path.exists(ROLLS_FILE):
-        df = pd.DataFrame(columns=['id', 'name', 'sale_price'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[ROLLS_FILE])
         df.to_excel(ROLLS_FILE, index=False)
     if not os.path.exists(ROLL_RECIPES_FILE):
-        df = pd.DataFrame(columns=['roll_id', 'ingredient_id', 'amount_per_roll'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[ROLL_RECIPES_FILE])
         df.to_excel(ROLL_RECIPES_FILE, index=False)
     if not os.path.exists(ORDERS_FILE):
-        df = pd.DataFrame(columns=['id', 'roll_id', 'set_id', 'quantity', 'order_time', 'total_price', 'cost_per_roll', 'status', 'comment', 'order_type'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[ORDERS_FILE])
         df.to_excel(ORDERS_FILE, index=False)
     if not os.path.exists(EMPLOYEES_FILE):
         df = pd.DataFrame([
@@ -44,16 +68,16 @@ def init_db():
         ])
         df.to_excel(EMPLOYEES_FILE, index=False)
     if not os.path.exists(ATTENDANCE_FILE):
-        df = pd.DataFrame(columns=['employee_id', 'name', 'role', 'date', 'time', 'mark_type'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[ATTENDANCE_FILE])
         df.to_excel(ATTENDANCE_FILE, index=False)
     if not os.path.exists(STOCK_HISTORY_FILE):
-        df = pd.DataFrame(columns=['date', 'ingredient_id', 'ingredient_name', 'operation', 'amount', 'comment'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[STOCK_HISTORY_FILE])
         df.to_excel(STOCK_HISTORY_FILE, index=False)
     if not os.path.exists(SETS_FILE):
-        df = pd.DataFrame(columns=['id', 'name', 'cost_price', 'retail_price', 'set_price', 'discount_percent', 'gross_profit', 'margin_percent'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[SETS_FILE])
         df.to_excel(SETS_FILE, index=False)
     if not os.path.exists(SET_COMPOSITION_FILE):
-        df = pd.DataFrame(columns=['set_id', 'roll_id', 'roll_name'])
+        df = pd.DataFrame(columns=TABLE_COLUMNS[SET_COMPOSITION_FILE])
         df.to_excel(SET_COMPOSITION_FILE, index=False)
 
 def fill_test_data():
@@ -284,9 +308,7 @@ def migrate_orders_add_status():
             print("Миграция заказов завершена")
     
     # Создать файл для расхода по заказам, если нет
-    ORDER_INGREDIENTS_FILE = 'order_ingredients.xlsx'
     if not os.path.exists(ORDER_INGREDIENTS_FILE):
-        pd.DataFrame(columns=['order_id', 'ingredient_id', 'used_amount']).to_excel(ORDER_INGREDIENTS_FILE, index=False)
+        pd.DataFrame(columns=TABLE_COLUMNS[ORDER_INGREDIENTS_FILE]).to_excel(ORDER_INGREDIENTS_FILE, index=False)
 
-migrate_orders_add_status()
-ORDER_INGREDIENTS_FILE = 'order_ingredients.xlsx' 
\ No newline at end of file
+migrate_orders_add_status() 
\ No newline at end of file
@@ -1,47 +1,7 @@
 import pandas as pd
 import re
 
-def norm(s):
-    return s.strip().lower().replace('ё','е')
-
-# Маппинг для объединения дублей
-mapping = {
-    'нори': ['нори','нори'],
-    'рис': ['рис','рис'],
-    'сыр творожный': ['сыр твор','сыр товр','твор сыр','сыр творож'],
-    'краб': ['краб'],
-    'огурец': ['огурец','огурцы'],
-    'майонез': ['майонез'],
-    'икра масаго': ['масага кр','икра масага'],
-    'васаби': ['васаби'],
-    'соевый соус': ['соевый соус'],
-    'имбирь': ['имбир','имбирь'],
-    'семга': ['семга'],
-    'лосось': ['лосось','капч лосось'],
-    'яйцо': ['яйцо'],
-    'курица': ['курица','капчен кур'],
-    'сырный соус': ['сырный соус','сырный соус 350'],
-    'перец': ['перец'],
-    'сахар': ['сахар'],
-    'соль': ['соль'],
-    'вода': ['вода'],
-    'шоколад': ['шоколад'],
-    'банан': ['банан'],
-    'клубника': ['клубника'],
-    'киви': ['киви'],
-    'чипсы': ['чипсы'],
-    'сухари': ['сухари'],
-    'мука': ['мука'],
-    'сыр пармезан': ['сыр пармизан'],
-    'сыр чеддер': ['сыр чеддер'],
-    'омлет': ['омлет'],
-    'ширачи': ['ширачи'],
-    'мицукан': ['мицукан'],
-    'унаги соус': ['унаги соус'],
-    'сприн тесто': ['сприн тесто'],
-    'угорь': ['угорь'],
-    'кунжут': ['кунжут'],
-}
+from ingredient_normalizer import ingredient_normalizer, normalize, TrigramIndex
 
 def get_unit(qty):
     qty = str(qty).replace(',', '.').replace('гр', ' г').replace('шт', ' шт').replace(' ', '')
@@ -55,15 +15,12 @@ def main():
         ing = str(row.get('Ингредиент', '')).strip()
         qty = str(row.get('нетто', ''))
         unit = get_unit(qty)
-        ing_n = norm(ing)
-        found = False
-        for k, vals in mapping.items():
-            if any(norm(v) == ing_n for v in vals):
-                ings[k] = unit or ings.get(k, '')
-                found = True
-                break
-        if not found and ing_n:
-            ings[ing_n] = unit or ings.get(ing_n, '')
+        # Синонимы — по индексу ALIASES; нечёткие совпадения без подтверждения не склеиваем
+        key, how, _ = ingredient_normalizer.canonical(ing)
+        if how == 'fuzzy':
+            key = normalize(ing)
+        if key and key != 'nan':
+            ings[key] = unit or ings.get(key, '')
     # Сохраняем ingredients.xlsx
     out = pd.DataFrame([
         {'id': i+1, 'name': k, 'quantity': 0, 'unit': v or '', 'price_per_unit': 0}
@@ -75,7 +32,8 @@ def main():
 def update_rolls_and_recipes():
     # Загрузка нормализованных ингредиентов
     ingredients_df = pd.read_excel('ingredients.xlsx')
-    ing_name_to_id = {str(row['name']).strip().lower(): row['id'] for _, row in ingredients_df.iterrows()}
+    ing_name_to_id = {normalize(row['name']): row['id'] for _, row in ingredients_df.iterrows()}
+    ing_name_index = TrigramIndex(ing_name_to_id)
 
     # Загрузка sushi.xlsx
     df = pd.read_excel('sushi.xlsx')
@@ -97,14 +55,13 @@ def update_rolls_and_recipes():
                 last_roll_name = name
                 roll_id += 1
         if ing and ing.lower() != 'nan' and last_roll_name:
-            ing_norm = ing.strip().lower().replace('ё','е')
-            ing_id = ing_name_to_id.get(ing_norm)
+            ing_norm = normalize(ing)
+            ing_id = ing_name_to_id.get(ing_norm) or ing_name_to_id.get(ingredient_normalizer.canonical(ing)[0])
             if not ing_id:
-                # Попробуем найти по частичному совпадению
-                for k in ing_name_to_id:
-                    if ing_norm in k or k in ing_norm:
-                        ing_id = ing_name_to_id[k]
-                        break
+                # Ближайшее название по триграммам
+                similar = ing_name_index.similar(ing_norm)
+                if similar:
+                    ing_id = ing_name_to_id[similar[0][1]]
             if ing_id:
                 try:
                     amount = float(qty)
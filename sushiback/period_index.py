@@ -0,0 +1,77 @@
+"""Выборки заказов и движения склада за период.
+
+Колонка даты разбирается один раз на версию таблицы, строки сортируются
+по ней, а период отбирается двоичным поиском (searchsorted) по отсортированному
+массиву дат. Строки с неразбираемой датой в периоды не попадают, как и раньше.
+"""
+import threading
+import numpy as np
+import pandas as pd
+
+from storage import storage
+
+
+def parse_dates(series):
+    try:
+        # Даты в файлах бывают в разных форматах: каждое значение разбирается отдельно
+        return pd.to_datetime(series, errors='coerce', format='mixed')
+    except (TypeError, ValueError):  # pandas < 2 без format='mixed'
+        return pd.to_datetime(series, errors='coerce')
+
+
+class PeriodIndex:
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._tables = {}
+
+    def _sorted(self, table, column):
+        """(DataFrame, отсортированный массив дат) для текущей версии таблицы"""
+        version = self.storage.version(table)
+        key = (table, column)
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1], entry[2]
+        df = self.storage.read(table)
+        if column in df.columns:
+            dates = parse_dates(df[column])
+        else:
+            dates = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+        keep = dates.notna()
+        # Стабильная сортировка: заказы с одинаковым временем остаются в порядке файла
+        order = np.argsort(dates[keep].values, kind='stable')
+        df = df[keep].iloc[order].reset_index(drop=True)
+        values = dates[keep].values[order]
+        with self._lock:
+            self._tables[key] = (version, df, values)
+        return df, values
+
+    def between(self, table, column, date_from, date_to):
+        """Строки, у которых дата column попадает в [date_from, date_to] включительно (по дням)"""
+        df, values = self._sorted(table, column)
+        try:
+            start = np.datetime64(pd.to_datetime(date_from).normalize())
+            end = np.datetime64(pd.to_datetime(date_to).normalize() + pd.Timedelta(days=1))
+        except (ValueError, TypeError):
+            return df.iloc[0:0].copy()
+        lo = values.searchsorted(start, side='left')
+        hi = values.searchsorted(end, side='left')
+        return df.iloc[lo:hi].copy()
+
+
+def text_equals(df, column, value):
+    """Маска str(df[column]) == value; без колонки сравнивается с пустой строкой, как row.get(column, '')"""
+    if column not in df.columns:
+        return pd.Series(value == '', index=df.index)
+    return df[column].astype(str) == value
+
+
+def text_contains(df, column, needle):
+    """Маска: needle (в нижнем регистре) входит в str(df[column]).lower()"""
+    if column not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df[column].astype(str).str.lower().str.contains(needle, regex=False)
+
+
+period_index = PeriodIndex(storage)
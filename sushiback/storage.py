@@ -0,0 +1,441 @@
+"""Хранилище данных sushiback.
+
+Таблицы адресуются теми же константами файлов, что и раньше (INGREDIENTS_FILE,
+ORDERS_FILE, ...). Бэкенд выбирается переменной окружения SUSHI_STORAGE:
+
+- ``excel`` (по умолчанию) — данные в .xlsx, как было раньше;
+- ``sqlite`` — данные в одной базе SQLite (WAL), изменения построчные,
+  а .xlsx остаются форматом импорта/экспорта.
+
+Импорт и экспорт:
+    python storage.py import   # .xlsx -> SQLite
+    python storage.py export   # SQLite -> .xlsx
+"""
+import os
+import sys
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from models import TABLE_COLUMNS
+from table_cache import table_cache
+
+STORAGE_BACKEND = os.environ.get('SUSHI_STORAGE', 'excel')
+SQLITE_PATH = os.environ.get('SUSHI_DB', 'sushi.db')
+
+
+def _py(value):
+    """Привести значение pandas/numpy к типу, который понимает sqlite3"""
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _is_null(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _mask(df, where):
+    """Строки, совпадающие с where; пустое значение (None/NaN) совпадает с пустым, как IS в SQLite"""
+    mask = pd.Series(True, index=df.index)
+    for column, value in where.items():
+        if column not in df.columns:
+            return pd.Series(False, index=df.index)
+        mask &= df[column].isna() if _is_null(value) else df[column] == value
+    return mask
+
+
+class ExcelStorage:
+    """Старое поведение: каждая таблица — отдельный .xlsx, запись целиком"""
+
+    name = 'excel'
+
+    def exists(self, table):
+        return os.path.exists(table)
+
+    def read(self, table):
+        if not os.path.exists(table):
+            return pd.DataFrame(columns=TABLE_COLUMNS.get(table, []))
+        return table_cache.read(table)
+
+    def write(self, table, df):
+        table_cache.write(df, table)
+
+    def version(self, table):
+        try:
+            st = os.stat(table)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def append(self, table, row, id_column=None):
+        ids = self.append_many(table, [row], id_column=id_column)
+        return ids[0] if id_column else None
+
+    def append_many(self, table, rows, id_column=None):
+        df = self.read(table)
+        rows = [dict(r) for r in rows]
+        ids = []
+        if id_column:
+            next_id = int(df[id_column].max()) + 1 if not df.empty else 1
+            for row in rows:
+                row[id_column] = next_id
+                ids.append(next_id)
+                next_id += 1
+        if rows:
+            df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
+            self.write(table, df)
+        return ids
+
+    def update(self, table, where, values):
+        df = self.read(table)
+        mask = _mask(df, where)
+        if not mask.any():
+            return 0
+        for column, value in values.items():
+            df.loc[mask, column] = value
+        self.write(table, df)
+        return int(mask.sum())
+
+    def increment(self, table, column, deltas, key='id'):
+        """Прибавить к column значения deltas ({ключ: дельта})"""
+        if not deltas:
+            return
+        df = self.read(table)
+        for key_value, delta in deltas.items():
+            df.loc[df[key] == key_value, column] += delta
+        self.write(table, df)
+
+    def update_many(self, table, rows, key='id'):
+        """Записать значения в несколько строк за одну запись файла (rows — {ключ: {колонка: значение}})"""
+        if not rows:
+            return
+        df = self.read(table)
+        for key_value, values in rows.items():
+            mask = df[key] == key_value
+            for column, value in values.items():
+                df.loc[mask, column] = value
+        self.write(table, df)
+
+    def accumulate(self, table, rows):
+        """Прибавить значения к строкам с составным ключом, создавая недостающие.
+
+        rows — список пар (ключ {колонка: значение}, прибавки {колонка: дельта}).
+        """
+        if not rows:
+            return
+        df = self.read(table)
+        for key, deltas in rows:
+            mask = _mask(df, key)
+            if mask.any():
+                for column, delta in deltas.items():
+                    df.loc[mask, column] = df.loc[mask, column].fillna(0) + delta
+            else:
+                df = pd.concat([df, pd.DataFrame([{**key, **deltas}])], ignore_index=True)
+        self.write(table, df)
+
+    def delete(self, table, where):
+        df = self.read(table)
+        mask = _mask(df, where)
+        if not mask.any():
+            return 0
+        self.write(table, df[~mask])
+        return int(mask.sum())
+
+    def replace(self, table, where, rows):
+        """Заменить строки, подходящие под where, на rows — за одну запись файла"""
+        df = self.read(table)
+        df = df[~_mask(df, where)]
+        rows = [dict(r) for r in rows]
+        if rows:
+            df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
+        self.write(table, df)
+
+
+class SQLiteStorage:
+    """Таблицы в SQLite: вставки и обновления затрагивают только нужные строки"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._columns = {}
+        self.init_schema()
+
+    # --- соединение ---
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self, table):
+        """Транзакция записи; версия таблицы растёт в той же транзакции"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute(
+                'INSERT INTO _table_versions (name, version) VALUES (?, 1) '
+                'ON CONFLICT(name) DO UPDATE SET version = version + 1',
+                (self.table_name(table),)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def table_name(table):
+        return os.path.splitext(os.path.basename(table))[0]
+
+    @staticmethod
+    def _q(identifier):
+        return '"' + str(identifier).replace('"', '""') + '"'
+
+    # --- схема ---
+    def init_schema(self):
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS _table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        for table, columns in TABLE_COLUMNS.items():
+            name = self.table_name(table)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self._q(name)} ({", ".join(self._q(c) for c in columns)})')
+            if 'id' in columns:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {self._q("ix_" + name + "_id")} ON {self._q(name)} ("id")')
+            self._columns[name] = self._load_columns(conn, name)
+
+    def _load_columns(self, conn, name):
+        return [row[1] for row in conn.execute(f'PRAGMA table_info({self._q(name)})')]
+
+    def _ensure_columns(self, conn, table, columns):
+        """Добавить недостающие колонки; вызывается внутри транзакции записи"""
+        name = self.table_name(table)
+        known = self._columns.get(name)
+        if known is None:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self._q(name)} ({", ".join(self._q(c) for c in columns)})')
+            known = self._load_columns(conn, name)
+        elif any(column not in known for column in columns):
+            # Колонку мог добавить другой процесс — кэш устарел, перечитываем схему
+            known = self._load_columns(conn, name)
+        for column in columns:
+            if column not in known:
+                try:
+                    conn.execute(f'ALTER TABLE {self._q(name)} ADD COLUMN {self._q(column)}')
+                except sqlite3.OperationalError as e:
+                    if 'duplicate column name' not in str(e):
+                        raise
+                known.append(column)
+        self._columns[name] = known
+
+    def is_empty(self):
+        conn = self._conn()
+        for table in TABLE_COLUMNS:
+            if conn.execute(f'SELECT 1 FROM {self._q(self.table_name(table))} LIMIT 1').fetchone():
+                return False
+        return True
+
+    # --- чтение ---
+    def exists(self, table):
+        return True
+
+    def read(self, table):
+        name = self.table_name(table)
+        if name not in self._columns:
+            return pd.DataFrame(columns=TABLE_COLUMNS.get(table, []))
+        return pd.read_sql_query(f'SELECT * FROM {self._q(name)} ORDER BY rowid', self._conn())
+
+    def version(self, table):
+        row = self._conn().execute(
+            'SELECT version FROM _table_versions WHERE name = ?', (self.table_name(table),)
+        ).fetchone()
+        return row[0] if row else 0
+
+    # --- запись ---
+    def write(self, table, df):
+        name = self.table_name(table)
+        columns = [str(c) for c in df.columns]
+        with self._write(table) as conn:
+            self._ensure_columns(conn, table, columns)
+            conn.execute(f'DELETE FROM {self._q(name)}')
+            if columns and not df.empty:
+                placeholders = ', '.join('?' for _ in columns)
+                conn.executemany(
+                    f'INSERT INTO {self._q(name)} ({", ".join(self._q(c) for c in columns)}) VALUES ({placeholders})',
+                    ([_py(v) for v in row] for row in df.itertuples(index=False, name=None))
+                )
+
+    def append(self, table, row, id_column=None):
+        ids = self.append_many(table, [row], id_column=id_column)
+        return ids[0] if id_column else None
+
+    def append_many(self, table, rows, id_column=None):
+        name = self.table_name(table)
+        ids = []
+        with self._write(table) as conn:
+            for row in rows:
+                columns = [c for c in row if c != id_column]
+                self._ensure_columns(conn, table, columns + ([id_column] if id_column else []))
+                values = [_py(row[c]) for c in columns]
+                column_sql = ', '.join(self._q(c) for c in columns)
+                if id_column:
+                    # id выдаётся внутри той же транзакции, параллельные воркеры не получат одинаковый
+                    sql = (f'INSERT INTO {self._q(name)} ({self._q(id_column)}{", " if columns else ""}{column_sql}) '
+                           f'VALUES ((SELECT COALESCE(MAX({self._q(id_column)}), 0) + 1 FROM {self._q(name)})'
+                           f'{", " if columns else ""}{", ".join("?" for _ in columns)})')
+                    cursor = conn.execute(sql, values)
+                    ids.append(conn.execute(
+                        f'SELECT {self._q(id_column)} FROM {self._q(name)} WHERE rowid = ?', (cursor.lastrowid,)
+                    ).fetchone()[0])
+                else:
+                    conn.execute(
+                        f'INSERT INTO {self._q(name)} ({column_sql}) VALUES ({", ".join("?" for _ in columns)})',
+                        values
+                    )
+        return ids
+
+    def _where(self, where):
+        # IS, а не =: ключ с NULL (например, item_id заказа без ролла) должен находить свою строку
+        clause = ' AND '.join(f'{self._q(c)} IS ?' for c in where)
+        return clause or '1', [_py(v) for v in where.values()]
+
+    def update(self, table, where, values):
+        name = self.table_name(table)
+        clause, params = self._where(where)
+        with self._write(table) as conn:
+            self._ensure_columns(conn, table, list(values))
+            cursor = conn.execute(
+                f'UPDATE {self._q(name)} SET {", ".join(self._q(c) + " = ?" for c in values)} WHERE {clause}',
+                [_py(v) for v in values.values()] + params
+            )
+            return cursor.rowcount
+
+    def increment(self, table, column, deltas, key='id'):
+        """Атомарно прибавить к column значения deltas ({ключ: дельта})"""
+        if not deltas:
+            return
+        name = self.table_name(table)
+        with self._write(table) as conn:
+            conn.executemany(
+                f'UPDATE {self._q(name)} SET {self._q(column)} = COALESCE({self._q(column)}, 0) + ? WHERE {self._q(key)} = ?',
+                [(_py(delta), _py(key_value)) for key_value, delta in deltas.items()]
+            )
+
+    def update_many(self, table, rows, key='id'):
+        """Обновить несколько строк одной транзакцией (rows — {ключ: {колонка: значение}})"""
+        if not rows:
+            return
+        name = self.table_name(table)
+        groups = {}  # набор колонок -> параметры executemany
+        for key_value, values in rows.items():
+            groups.setdefault(tuple(values), []).append([_py(v) for v in values.values()] + [_py(key_value)])
+        with self._write(table) as conn:
+            self._ensure_columns(conn, table, list(dict.fromkeys(c for columns in groups for c in columns)))
+            for columns, params in groups.items():
+                conn.executemany(
+                    f'UPDATE {self._q(name)} SET {", ".join(self._q(c) + " = ?" for c in columns)} '
+                    f'WHERE {self._q(key)} = ?',
+                    params
+                )
+
+    def accumulate(self, table, rows):
+        """Прибавить значения к строкам с составным ключом, создавая недостающие (атомарно)"""
+        if not rows:
+            return
+        name = self.table_name(table)
+        with self._write(table) as conn:
+            for key, deltas in rows:
+                self._ensure_columns(conn, table, list(key) + list(deltas))
+                clause, params = self._where(key)
+                cursor = conn.execute(
+                    f'UPDATE {self._q(name)} SET '
+                    f'{", ".join(f"{self._q(c)} = COALESCE({self._q(c)}, 0) + ?" for c in deltas)} WHERE {clause}',
+                    [_py(v) for v in deltas.values()] + params
+                )
+                if cursor.rowcount == 0:
+                    row = {**key, **deltas}
+                    conn.execute(
+                        f'INSERT INTO {self._q(name)} ({", ".join(self._q(c) for c in row)}) '
+                        f'VALUES ({", ".join("?" for _ in row)})',
+                        [_py(v) for v in row.values()]
+                    )
+
+    def delete(self, table, where):
+        name = self.table_name(table)
+        clause, params = self._where(where)
+        with self._write(table) as conn:
+            return conn.execute(f'DELETE FROM {self._q(name)} WHERE {clause}', params).rowcount
+
+    def replace(self, table, where, rows):
+        """Заменить строки, подходящие под where, на rows одной транзакцией"""
+        name = self.table_name(table)
+        clause, params = self._where(where)
+        with self._write(table) as conn:
+            conn.execute(f'DELETE FROM {self._q(name)} WHERE {clause}', params)
+            for row in rows:
+                self._ensure_columns(conn, table, list(row))
+                conn.execute(
+                    f'INSERT INTO {self._q(name)} ({", ".join(self._q(c) for c in row)}) '
+                    f'VALUES ({", ".join("?" for _ in row)})',
+                    [_py(v) for v in row.values()]
+                )
+
+
+def import_excel(target, tables=None):
+    """Загрузить таблицы из .xlsx в хранилище"""
+    imported = []
+    for table in tables or TABLE_COLUMNS:
+        if os.path.exists(table):
+            target.write(table, pd.read_excel(table))
+            imported.append(table)
+    return imported
+
+
+def export_excel(source, directory='.', tables=None):
+    """Выгрузить таблицы хранилища в .xlsx"""
+    exported = []
+    for table in tables or TABLE_COLUMNS:
+        path = os.path.join(directory, table)
+        source.read(table).to_excel(path, index=False)
+        exported.append(path)
+    return exported
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    if backend == 'sqlite':
+        fresh = not os.path.exists(SQLITE_PATH)
+        backend_storage = SQLiteStorage(SQLITE_PATH)
+        # Первый запуск на SQLite: переносим текущие данные из Excel
+        if fresh or backend_storage.is_empty():
+            import_excel(backend_storage)
+        return backend_storage
+    return ExcelStorage()
+
+
+storage = create_storage()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    sqlite_storage = storage if isinstance(storage, SQLiteStorage) else SQLiteStorage(SQLITE_PATH)
+    if command == 'import':
+        for table in import_excel(sqlite_storage):
+            print(f'Импортировано: {table}')
+    elif command == 'export':
+        for path in export_excel(sqlite_storage):
+            print(f'Экспортировано: {path}')
+    else:
+        print('Использование: python storage.py import|export')
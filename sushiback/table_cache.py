@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+import pandas as pd
+
+
+class TableCache:
+    """Кэш разобранных Excel-таблиц.
+
+    Таблица перечитывается с диска только если у файла изменились mtime или размер.
+    Наружу отдаются копии DataFrame, поэтому обработчики могут менять их как раньше.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # observer(вид, секунды) — замер чтения/записи файла (см. request_metrics.py)
+        self.observer = None
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def read(self, path):
+        """Вернуть DataFrame для файла, разбирая его только при изменении"""
+        key = self._key(path)
+        signature = self._signature(path)
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1].copy()
+        started = time.perf_counter()
+        df = pd.read_excel(path)
+        self._observe('excel_read', started)
+        with self._lock:
+            self.misses += 1
+            self._tables[key] = (signature, df)
+        return df.copy()
+
+    def write(self, df, path):
+        """Записать таблицу в файл и сбросить её кэш"""
+        started = time.perf_counter()
+        df.to_excel(path, index=False)
+        self._observe('excel_write', started)
+        self.invalidate(path)
+
+    def _observe(self, kind, started):
+        if self.observer is not None:
+            self.observer(kind, time.perf_counter() - started)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(self._key(path), None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'tables': sorted(os.path.basename(k) for k in self._tables),
+            }
+
+
+# Общий кэш процесса (один на gunicorn-воркер)
+table_cache = TableCache()
+
+
+def read_table(path):
+    return table_cache.read(path)
+
+
+def write_table(df, path):
+    table_cache.write(df, path)